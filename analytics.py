@@ -0,0 +1,342 @@
+import os
+import time
+import zipfile
+from itertools import islice
+from typing import NamedTuple, Optional
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed for analytics; the rest of the application runs without it
+    np = None
+
+from repository import (InvoiceRepository, ClientTotals, MonthTotals, DB_PATH, DEFAULT_PROFILE, MISSING_DAY)
+
+# Columnar copy of the invoices and their lines for ad-hoc analysis: one contiguous NumPy array
+# per column, with dates as day numbers, money as integer cents and clients and statuses as
+# small integer codes. It is kept current incrementally (new rows by id, changed and deleted
+# invoices from the change log) and saved to an uncompressed .npz whose arrays are memory-mapped
+# when it is opened again, so a later session starts without reading the database.
+
+SNAPSHOT_PATH = "analytics.npz"
+
+# Changed whenever the arrays saved in the snapshot change; older snapshots are rebuilt
+SNAPSHOT_VERSION = 1
+
+# Reports of the analytics command, one per AnalyticsSnapshot method
+ANALYTICS_REPORTS = ("months", "clients", "items", "payments")
+
+# Change log watermark kept by the snapshot (see InvoiceRepository.invoice_changes_since). It does
+# not hold the log, so a snapshot that is no longer refreshed never keeps entries from being
+# dropped; one that fell behind is rebuilt.
+ANALYTICS_SYNC = "analytics"
+
+# Rows converted to arrays at a time while loading
+LOAD_CHUNK_SIZE = 100000
+
+# Column names and dtypes, in the order of analytics_invoice_rows() and analytics_line_rows()
+INVOICE_COLUMNS = (("id", "i8"), ("client_id", "i8"), ("date", "i4"), ("paid", "i1"), ("subtotal_cents", "i8"),
+                   ("tax_cents", "i8"), ("total_cents", "i8"), ("paid_date", "i4"))
+LINE_COLUMNS = (("id", "i8"), ("invoice_id", "i8"), ("line_item_id", "i8"), ("qty", "f8"),
+                ("unit_price_cents", "i8"), ("total_cents", "i8"))
+
+
+class ItemTotals(NamedTuple):
+    line_item_id: int
+    name: Optional[str]
+    line_count: int
+    qty: float
+    total_cents: int
+
+
+class PaymentDelay(NamedTuple):
+    client_id: int
+    client_name: Optional[str]
+    paid_count: int
+    average_days: float
+    max_days: int
+
+
+def require_numpy():
+    if np is None:
+        raise ImportError("Analytics needs NumPy; install it with: pip install numpy")
+
+
+def _empty(columns):
+    return {name: np.empty(0, dtype) for name, dtype in columns}
+
+
+# Arrays of the given columns from an iterable of row tuples, LOAD_CHUNK_SIZE rows at a time
+def _load_columns(rows, columns):
+    rows = iter(rows)
+    chunks = []
+    while True:
+        chunk = list(islice(rows, LOAD_CHUNK_SIZE))
+        if not chunk:
+            break
+        chunks.append({name: np.array(values, dtype) for (name, dtype), values in zip(columns, zip(*chunk))})
+    if not chunks:
+        return _empty(columns)
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) for name, dtype in columns}
+
+
+# Rows of the arrays not selected by drop, followed by the new rows, ordered by id
+def _merge(arrays, drop, new, columns):
+    keep = ~drop
+    merged = {name: np.concatenate([arrays[name][keep], new[name]]) for name, dtype in columns}
+    order = np.argsort(merged["id"], kind="stable")
+    return {name: values[order] for name, values in merged.items()}
+
+
+# Sum of values per code. Integer values (cents) are added as int64, so totals stay exact;
+# np.bincount would add them as float64.
+def _sum_by(codes, values, size):
+    if values.dtype.kind in "iu":
+        sums = np.zeros(size, np.int64)
+        np.add.at(sums, codes, values)
+        return sums
+    return np.bincount(codes, weights=values, minlength=size)
+
+
+# Arrays of an uncompressed .npz file memory-mapped in place, instead of read by np.load()
+def _mmap_npz(path):
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path} is compressed and cannot be memory-mapped")
+            # The member data follows its 30-byte local header, file name and extra field
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = np.frombuffer(f.read(4), "<u2")
+            f.seek(info.header_offset + 30 + int(name_length) + int(extra_length))
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            name = info.filename[:-len(".npy")] if info.filename.endswith(".npy") else info.filename
+            if dtype.hasobject:
+                raise ValueError(f"{path} holds Python objects and cannot be memory-mapped")
+            if 0 in shape:
+                arrays[name] = np.empty(shape, dtype)
+            else:
+                arrays[name] = np.memmap(path, dtype, "r", f.tell(), shape, "F" if fortran_order else "C")
+    return arrays
+
+
+class AnalyticsSnapshot:
+    def __init__(self, source, invoices, lines, clients, items, seq=0):
+        require_numpy()
+        self.source = source
+        self.invoices = invoices
+        self.lines = lines
+        # (ids, names) of the clients and catalog items, for labelling results
+        self.clients = clients
+        self.items = items
+        self.seq = seq
+        self._codes = None
+
+    @classmethod
+    def empty(cls, source):
+        return cls(source, _empty(INVOICE_COLUMNS), _empty(LINE_COLUMNS),
+                   (np.empty(0, "i8"), np.empty(0, "U1")), (np.empty(0, "i8"), np.empty(0, "U1")))
+
+    def __len__(self):
+        return len(self.invoices["id"])
+
+    # Rebuild from the database, reading the archive too when there is one. With watermark=False
+    # the change log watermark is left as it is (the benchmarks load this way), so the next
+    # refresh() loads again.
+    def load(self, repository, watermark=True):
+        upto, _ = repository.invoice_changes_since(ANALYTICS_SYNC)
+        include_archived = repository.has_archive()
+        self.invoices = _load_columns(repository.analytics_invoice_rows(include_archived=include_archived),
+                                      INVOICE_COLUMNS)
+        self.lines = _load_columns(repository.analytics_line_rows(include_archived=include_archived), LINE_COLUMNS)
+        self._finish_refresh(repository, upto, watermark)
+
+    # Bring the arrays up to date: rows with ids past the newest loaded are appended, and invoices
+    # changed or deleted since the last refresh (per the change log) are dropped and read again.
+    # Falls back to load() when the change log cannot say what happened since. Archived invoices
+    # stay in the snapshot, as they are not deleted. Returns the number of invoices read.
+    def refresh(self, repository):
+        since = repository.get_watermark(ANALYTICS_SYNC)
+        upto, changes = repository.invoice_changes_since(ANALYTICS_SYNC)
+        if changes is None or since != self.seq or self.source != os.path.abspath(repository.path):
+            self.load(repository)
+            return len(self)
+
+        last_invoice = int(self.invoices["id"][-1]) if len(self) else 0
+        last_line = int(self.lines["id"][-1]) if len(self.lines["id"]) else 0
+        changed = [invoice_id for invoice_id in changes if invoice_id <= last_invoice]
+        include_archived = repository.has_archive()
+        new_invoices = _load_columns(repository.analytics_invoice_rows(last_invoice, changed, include_archived),
+                                     INVOICE_COLUMNS)
+        new_lines = _load_columns(repository.analytics_line_rows(last_line, changed, include_archived), LINE_COLUMNS)
+        if changed or len(new_invoices["id"]) or len(new_lines["id"]):
+            changed = np.array(changed, "i8")
+            self.invoices = _merge(self.invoices, np.isin(self.invoices["id"], changed), new_invoices, INVOICE_COLUMNS)
+            self.lines = _merge(self.lines, np.isin(self.lines["invoice_id"], changed), new_lines, LINE_COLUMNS)
+        self._finish_refresh(repository, upto)
+        return len(new_invoices["id"])
+
+    def _finish_refresh(self, repository, upto, watermark=True):
+        clients = repository.list_clients()
+        items = repository.list_line_items()
+        self.clients = (np.array([client.id for client in clients], "i8"), np.array([client.name or "" for client in clients]))
+        self.items = (np.array([item.id for item in items], "i8"), np.array([item.name or "" for item in items]))
+        self.source = os.path.abspath(repository.path)
+        # -1 matches no watermark, so a snapshot loaded without one is loaded again on refresh
+        self.seq = upto if watermark else -1
+        self._codes = None
+        if watermark:
+            repository.set_watermark(ANALYTICS_SYNC, upto, holds_log=False)
+
+    # Saved uncompressed (and atomically) so load_snapshot() can memory-map every array
+    def save(self, path=SNAPSHOT_PATH):
+        arrays = {f"invoices.{name}": values for name, values in self.invoices.items()}
+        arrays.update({f"lines.{name}": values for name, values in self.lines.items()})
+        arrays.update({"clients.id": self.clients[0], "clients.name": self.clients[1],
+                       "items.id": self.items[0], "items.name": self.items[1],
+                       "meta": np.array([SNAPSHOT_VERSION, self.seq], "i8"), "source": np.array(self.source)})
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            np.savez(f, **arrays)
+        del arrays
+        # Arrays still memory-mapped from the file being replaced would keep reading the old file,
+        # and Windows refuses to replace a mapped file at all: drop them (which unmaps them) and
+        # map the new file in their place
+        mapped = self._mapped_from(path)
+        if mapped:
+            self.invoices = self.lines = self.clients = self.items = None
+        try:
+            os.replace(temp_path, path)
+        finally:
+            if mapped:
+                self.invoices, self.lines, self.clients, self.items = _snapshot_arrays(_mmap_npz(path))
+
+    # Whether any of the arrays is memory-mapped from the file at path
+    def _mapped_from(self, path):
+        path = os.path.abspath(path)
+        arrays = [*self.invoices.values(), *self.lines.values(), *self.clients, *self.items]
+        return any(isinstance(values, np.memmap) and values.filename == path for values in arrays)
+
+    # Grouping codes, computed once per refresh: client codes index the distinct client ids, and
+    # month codes those of the invoices with a date ("dated"); the others are in no month
+    def codes(self):
+        if self._codes is None:
+            client_ids, client_codes = np.unique(self.invoices["client_id"], return_inverse=True)
+            dated = self.invoices["date"] != MISSING_DAY
+            months = self.invoices["date"][dated].astype("datetime64[D]").astype("datetime64[M]")
+            month_values, month_codes = np.unique(months, return_inverse=True)
+            self._codes = {"client_ids": client_ids, "client": client_codes.astype(np.int32),
+                           "dated": dated, "months": month_values, "month": month_codes.astype(np.int32)}
+        return self._codes
+
+    def _names(self, table, ids):
+        known_ids, names = table
+        order = np.argsort(known_ids)
+        positions = np.searchsorted(known_ids, ids, sorter=order)
+        positions = order[np.minimum(positions, len(order) - 1)] if len(order) else positions
+        return [str(names[position]) if len(order) and known_ids[position] == value else None
+                for position, value in zip(positions.tolist(), ids.tolist())]
+
+    # Revenue by month, newest first, like InvoiceRepository.revenue_by_month()
+    def month_totals(self):
+        codes = self.codes()
+        invoices = {name: values[codes["dated"]] for name, values in self.invoices.items()}
+        size = len(codes["months"])
+        paid = invoices["paid"].astype(bool)
+        total = invoices["total_cents"]
+        columns = [np.bincount(codes["month"], minlength=size)]
+        columns += [_sum_by(codes["month"], invoices[name], size) for name in ("subtotal_cents", "tax_cents", "total_cents")]
+        columns += [_sum_by(codes["month"], np.where(paid, total, 0), size),
+                    _sum_by(codes["month"], np.where(paid, 0, total), size)]
+        months = codes["months"].astype(str)
+        return [MonthTotals(str(months[index]), *(int(column[index]) for column in columns))
+                for index in range(size - 1, -1, -1)]
+
+    # Revenue by client, largest total first, like InvoiceRepository.revenue_by_client()
+    def client_totals(self, limit=100):
+        codes = self.codes()
+        invoices, size = self.invoices, len(codes["client_ids"])
+        paid = invoices["paid"].astype(bool)
+        total = invoices["total_cents"]
+        columns = [np.bincount(codes["client"], minlength=size)]
+        columns += [_sum_by(codes["client"], invoices[name], size) for name in ("subtotal_cents", "tax_cents", "total_cents")]
+        columns += [_sum_by(codes["client"], np.where(paid, total, 0), size),
+                    _sum_by(codes["client"], np.where(paid, 0, total), size)]
+        top = np.argsort(-columns[3], kind="stable")[:limit]
+        names = self._names(self.clients, codes["client_ids"][top])
+        return [ClientTotals(int(codes["client_ids"][index]), name, *(int(column[index]) for column in columns))
+                for index, name in zip(top.tolist(), names)]
+
+    # Days from invoice date to being marked paid, per client (most paid invoices first) plus
+    # overall as client_id 0. Only invoices marked paid in the application have a paid date.
+    def payment_delays(self, limit=100):
+        invoices = self.invoices
+        known = (invoices["paid"] == 1) & (invoices["paid_date"] != MISSING_DAY) & (invoices["date"] != MISSING_DAY)
+        days = (invoices["paid_date"][known] - invoices["date"][known]).astype(np.int64)
+        client_ids, client_codes = np.unique(invoices["client_id"][known], return_inverse=True)
+        counts = np.bincount(client_codes, minlength=len(client_ids))
+        sums = np.bincount(client_codes, weights=days, minlength=len(client_ids))
+        maxima = np.full(len(client_ids), np.iinfo(np.int64).min)
+        np.maximum.at(maxima, client_codes, days)
+        delays = [PaymentDelay(0, None, len(days), float(days.mean()) if len(days) else 0.0,
+                               int(days.max()) if len(days) else 0)]
+        top = np.argsort(-counts, kind="stable")[:limit]
+        names = self._names(self.clients, client_ids[top])
+        delays += [PaymentDelay(int(client_ids[index]), name, int(counts[index]), float(sums[index] / counts[index]),
+                                int(maxima[index]))
+                   for index, name in zip(top.tolist(), names)]
+        return delays
+
+    # Catalog items by revenue from their invoice lines; lines typed in without an item are left out
+    def item_totals(self, limit=10):
+        lines = self.lines
+        catalog = lines["line_item_id"] >= 0
+        item_ids, item_codes = np.unique(lines["line_item_id"][catalog], return_inverse=True)
+        size = len(item_ids)
+        counts = np.bincount(item_codes, minlength=size)
+        qty = np.bincount(item_codes, weights=lines["qty"][catalog], minlength=size)
+        totals = _sum_by(item_codes, lines["total_cents"][catalog], size)
+        top = np.argsort(-totals, kind="stable")[:limit]
+        names = self._names(self.items, item_ids[top])
+        return [ItemTotals(int(item_ids[index]), name, int(counts[index]), float(qty[index]), int(totals[index]))
+                for index, name in zip(top.tolist(), names)]
+
+
+# The snapshot saved at path, memory-mapped, or None if there is none or it is from another version
+def load_snapshot(path=SNAPSHOT_PATH):
+    require_numpy()
+    if not os.path.exists(path):
+        return None
+    try:
+        arrays = _mmap_npz(path)
+        version, seq = (int(value) for value in arrays["meta"])
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        return None
+    if version != SNAPSHOT_VERSION:
+        return None
+    return AnalyticsSnapshot(str(arrays["source"]), *_snapshot_arrays(arrays), seq)
+
+
+# (invoices, lines, clients, items) of a saved snapshot's arrays, as AnalyticsSnapshot holds them
+def _snapshot_arrays(arrays):
+    invoices = {name: arrays[f"invoices.{name}"] for name, dtype in INVOICE_COLUMNS}
+    lines = {name: arrays[f"lines.{name}"] for name, dtype in LINE_COLUMNS}
+    return invoices, lines, (arrays["clients.id"], arrays["clients.name"]), (arrays["items.id"], arrays["items.name"])
+
+
+# The saved snapshot brought up to date with the database (built from scratch the first time),
+# and saved again if anything changed. Returns (snapshot, invoices read, seconds taken).
+def open_snapshot(db_path=DB_PATH, path=SNAPSHOT_PATH, profile=DEFAULT_PROFILE):
+    start = time.perf_counter()
+    snapshot = load_snapshot(path)
+    if snapshot is None:
+        snapshot = AnalyticsSnapshot.empty(None)
+    seq = snapshot.seq
+    with InvoiceRepository(db_path, profile) as repository:
+        loaded = snapshot.refresh(repository)
+    if loaded or snapshot.seq != seq or not os.path.exists(path):
+        snapshot.save(path)
+    return snapshot, loaded, time.perf_counter() - start
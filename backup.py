@@ -0,0 +1,122 @@
+import math
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime
+from typing import NamedTuple
+
+from repository import ConnectionFactory, DB_PATH, DEFAULT_PROFILE, archive_path
+
+# Backups go into this directory as <name>-YYYYMMDD-HHMMSS.db, e.g. invoices-20240601-170000.db
+BACKUP_DIR = "backups"
+
+# Newest backups kept per database; older ones are deleted after each successful backup
+BACKUP_KEEP = 7
+
+# Pages copied per backup step (16 MiB at SQLite's default 4 KiB page size). The source is only
+# locked while a step runs, so the application keeps working during a long backup.
+BACKUP_PAGES_PER_STEP = 4096
+
+# Pause between steps, giving other connections a turn at the database
+BACKUP_STEP_PAUSE = 0.01
+
+BACKUP_TIMESTAMP = "%Y%m%d-%H%M%S"
+
+
+class BackupResult(NamedTuple):
+    source: str
+    path: str
+    pages: int
+    seconds: float
+
+
+def backup_pattern(db_path):
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    return re.compile(rf"{re.escape(stem)}-\d{{8}}-\d{{6}}\.db$")
+
+
+# Backups of a database in a directory, newest first (the timestamp in the name sorts by age)
+def list_backups(db_path, directory=BACKUP_DIR):
+    if not os.path.isdir(directory):
+        return []
+    pattern = backup_pattern(db_path)
+    return [os.path.join(directory, name)
+            for name in sorted((name for name in os.listdir(directory) if pattern.match(name)), reverse=True)]
+
+
+# Copy one database with the SQLite online backup API, pages_per_step at a time, into a temporary
+# file that is checked with PRAGMA quick_check before it takes its final name.
+# In WAL mode the copy holds one read transaction throughout, so every step reads the same
+# snapshot while other connections go on writing. Otherwise SQLite restarts the copy whenever
+# another connection writes between steps; either way the backup is consistent.
+# progress(copied pages, total pages) is called after each step.
+def backup_file(db_path, path, pages_per_step=BACKUP_PAGES_PER_STEP, progress=None, profile=DEFAULT_PROFILE):
+    start = time.perf_counter()
+    temp_path = path + ".partial"
+    source = ConnectionFactory(db_path, profile).connect()
+    target = sqlite3.connect(temp_path)
+    try:
+        if source.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+            source.execute("BEGIN")
+            source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+
+        def on_step(status, remaining, total):
+            if progress:
+                progress(total - remaining, total)
+            time.sleep(BACKUP_STEP_PAUSE)
+
+        source.backup(target, pages=pages_per_step, progress=on_step)
+        pages = target.execute("PRAGMA page_count").fetchone()[0]
+        # A backup is a single self-contained file, whatever journal mode the source uses
+        target.execute("PRAGMA journal_mode = DELETE")
+        result = target.execute("PRAGMA quick_check").fetchone()[0]
+        if result != "ok":
+            raise sqlite3.DatabaseError(f"Backup of {db_path} failed its integrity check: {result}")
+    except BaseException:
+        target.close()
+        os.remove(temp_path)
+        raise
+    finally:
+        source.close()
+    target.close()
+    os.replace(temp_path, path)
+    return BackupResult(db_path, path, pages, time.perf_counter() - start)
+
+
+# Back up the database, and its archive database if there is one, into directory, then delete all
+# but the newest keep backups of each. Safe to run off the Tk thread and while the application
+# has the database open. progress(database path, copied pages, total pages) follows each step.
+def backup_database(db_path=DB_PATH, directory=BACKUP_DIR, keep=BACKUP_KEEP, pages_per_step=BACKUP_PAGES_PER_STEP,
+                    progress=None, profile=DEFAULT_PROFILE):
+    os.makedirs(directory, exist_ok=True)
+    timestamp = datetime.now().strftime(BACKUP_TIMESTAMP)
+    sources = [db_path] + [path for path in [archive_path(db_path)] if os.path.exists(path)]
+    results = []
+    for source in sources:
+        stem = os.path.splitext(os.path.basename(source))[0]
+        path = os.path.join(directory, f"{stem}-{timestamp}.db")
+        step_progress = (lambda done, total, source=source: progress(source, done, total)) if progress else None
+        results.append(backup_file(source, path, pages_per_step, step_progress, profile))
+    for source in sources:
+        for old in list_backups(source, directory)[max(1, keep):]:
+            os.remove(old)
+    return results
+
+
+# Time of the newest backup of a database, or None if there is none
+def last_backup_time(db_path=DB_PATH, directory=BACKUP_DIR):
+    backups = list_backups(db_path, directory)
+    if not backups:
+        return None
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    return datetime.strptime(os.path.basename(backups[0])[len(stem) + 1:-len(".db")], BACKUP_TIMESTAMP)
+
+
+# Hours between scheduled backups from the "backup_interval_hours" preference; 0 means off
+def backup_interval_from_preferences(preferences):
+    try:
+        hours = float(preferences.get("backup_interval_hours") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+    return hours if math.isfinite(hours) and hours > 0 else 0.0
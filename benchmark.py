@@ -0,0 +1,303 @@
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import analytics
+from export import export_invoices_csv
+from money import DEFAULT_TAX_RATE, line_total_cents, tax_cents
+from rendering import render_invoice_html, render_invoice_batch
+from repository import (InvoiceRepository, InvoiceFilter, InvoiceLine, InvoiceSort, INVOICE_SORT_KEYS, PROFILES,
+                        DEFAULT_PROFILE)
+
+# Headless benchmarks of the repository, export and rendering paths the GUI uses, run against a
+# seeded synthetic database. Results are written as JSON and can be compared with a saved baseline:
+#
+#   python benchmark.py --invoices 1000000 --save-baseline baseline.json
+#   python benchmark.py --invoices 1000000 --baseline baseline.json
+
+BENCHMARK_DB = "benchmark.db"
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "invoice.html")
+
+# Regressions are judged on the fastest run, which is far less noisy than the median.
+# A benchmark regresses when it is this much slower than the baseline...
+DEFAULT_TOLERANCE = 0.25
+# ...and at least this many milliseconds slower, so sub-millisecond jitter is ignored
+MIN_REGRESSION_MS = 0.5
+
+# Pages fetched per load_invoices run, like scrolling a little way down the list
+PAGES_PER_LOAD = 5
+
+NAME_WORDS = ("Acme", "Northern", "Pacific", "Summit", "Maple", "Harbour", "Prairie", "Cedar", "Granite", "Aurora",
+              "River", "Valley", "Coastal", "Metro", "Union", "Pioneer", "Silver", "Golden", "Eagle", "Bluewater")
+NAME_SUFFIXES = ("Ltd", "Inc", "Co", "Services", "Holdings", "Group", "Supply", "Logistics", "Consulting", "Foods")
+ITEM_WORDS = ("Service", "Call", "Repair", "Install", "Cleaning", "Inspection", "Parts", "Labour", "Delivery",
+              "Consult", "Filter", "Valve", "Panel", "Cable", "Pump", "Sensor", "Fitting", "Bracket", "Seal", "Kit")
+
+PREFERENCES = {"company_name": "Benchmark Co", "company_address": "1 Main St", "company_city": "Calgary",
+               "company_state": "AB", "company_postal": "T2P 1A1", "gst_number": "123456789"}
+
+
+def _generation_params(args):
+    return {"clients": args.clients, "items": args.items, "invoices": args.invoices,
+            "max_lines": args.max_lines, "seed": args.seed}
+
+
+# Build a database of the given size from a seeded generator, through the same bulk-write
+# paths as the importer. Dates span the five years before 2024-01-01.
+def generate_database(path, clients, items, invoices, max_lines=5, seed=0, profile=DEFAULT_PROFILE):
+    rng = random.Random(seed)
+    first_day = date(2019, 1, 1)
+    days = (date(2024, 1, 1) - first_day).days
+
+    with InvoiceRepository(path, profile) as repository:
+        with repository.deferred_maintenance():
+            repository.add_clients([
+                (f"{rng.choice(NAME_WORDS)} {rng.choice(NAME_WORDS)} {rng.choice(NAME_SUFFIXES)}",
+                 f"{rng.randint(1, 9999)} {rng.choice(NAME_WORDS)} Ave", f"Contact {number}",
+                 f"555-{rng.randint(0, 9999):04d}", f"billing{number}@example.com")
+                for number in range(clients)])
+            catalog = [(f"{rng.choice(ITEM_WORDS)} {rng.choice(ITEM_WORDS)} {number}", rng.randint(100, 50000))
+                       for number in range(items)]
+            repository.add_line_items(catalog)
+            item_ids = [row[0] for row in repository.conn.execute("SELECT id FROM line_items ORDER BY id")]
+            client_ids = [row[0] for row in repository.conn.execute("SELECT id FROM clients ORDER BY id")]
+
+            batch = []
+            for number in range(invoices):
+                lines = []
+                for _ in range(rng.randint(1, max_lines)):
+                    position = rng.randrange(items)
+                    name, price = catalog[position]
+                    qty = float(rng.randint(1, 10))
+                    lines.append(InvoiceLine(item_ids[position], name, qty, price, line_total_cents(qty, price)))
+                subtotal = sum(line.total_cents for line in lines)
+                tax = tax_cents(subtotal, DEFAULT_TAX_RATE)
+                invoice_date = (first_day + timedelta(days=rng.randrange(days))).isoformat()
+                status = "paid" if rng.random() < 0.7 else "unpaid"
+                batch.append((rng.choice(client_ids), invoice_date, status, subtotal, tax, subtotal + tax, lines))
+                if len(batch) == 10000:
+                    repository.add_invoices(batch)
+                    batch = []
+            repository.add_invoices(batch)
+        repository.conn.execute("ANALYZE")
+
+
+# Reuse the benchmark database when it was generated with the same parameters
+def prepare_database(path, params, regenerate=False, profile=DEFAULT_PROFILE):
+    params_path = path + ".params.json"
+    if not regenerate and os.path.exists(path) and os.path.exists(params_path):
+        with open(params_path) as f:
+            if json.load(f) == params:
+                return False
+    for stale in (path, path + "-wal", path + "-shm", params_path):
+        if os.path.exists(stale):
+            os.remove(stale)
+    generate_database(path, profile=profile, **params)
+    with open(params_path, "w") as f:
+        json.dump(params, f)
+    return True
+
+
+def measure(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return {"runs": repeat, "median_ms": round(statistics.median(times), 3), "min_ms": round(min(times), 3)}
+
+
+# First PAGES_PER_LOAD pages of the invoice list, keyset-paged the way the GUI scrolls
+def load_invoices(repository, invoice_filter, sort=InvoiceSort()):
+    after = None
+    for _ in range(PAGES_PER_LOAD):
+        rows = repository.list_invoices(invoice_filter, after=after, sort=sort)
+        if not rows:
+            break
+        after = sort.key(rows[-1])
+
+
+def _filter_name(invoice_filter):
+    parts = [f"status={invoice_filter.status}"]
+    if invoice_filter.from_date or invoice_filter.to_date:
+        parts.append("dates")
+    if invoice_filter.search:
+        parts.append(f"search={invoice_filter.search}")
+    return ",".join(parts)
+
+
+# (name, fn, repeat) for every benchmark; fn takes no arguments
+def benchmarks(repository, db_path, profile, rng, repeat, scratch_dir):
+    invoice_ids = [row[0] for row in repository.conn.execute("SELECT id FROM invoices")]
+    sample_ids = rng.sample(invoice_ids, min(len(invoice_ids), 200))
+    search_word = rng.choice(NAME_WORDS).lower()
+    cases = []
+
+    for status in ("All", "Paid", "Unpaid"):
+        for from_date, to_date in (("", ""), ("2022-01-01", "2022-12-31")):
+            for search in ("", search_word):
+                invoice_filter = InvoiceFilter(status, from_date, to_date, search)
+                cases.append((f"load_invoices[{_filter_name(invoice_filter)}]",
+                              lambda f=invoice_filter: load_invoices(repository, f), repeat))
+
+    for column in INVOICE_SORT_KEYS:
+        for descending in (False, True):
+            sort = InvoiceSort(column, descending)
+            cases.append((f"sort_invoices[{column} {'desc' if descending else 'asc'}]",
+                          lambda s=sort: load_invoices(repository, InvoiceFilter(), s), repeat))
+
+    cases.append((f"search_invoices[{search_word}]",
+                  lambda: repository.search_invoices(InvoiceFilter(search=search_word)), repeat))
+
+    # What selecting an invoice in the list loads
+    cases.append(("load_line_items[x100]",
+                  lambda: [repository.get_invoice_lines(invoice_id) for invoice_id in sample_ids[:100]], repeat))
+
+    cases.append(("generate_html_invoice[x50]",
+                  lambda: [render_invoice_html(repository.get_invoice(invoice_id), PREFERENCES, TEMPLATE_PATH)
+                           for invoice_id in sample_ids[:50]], repeat))
+
+    cases.append(("render_invoice_batch[200 combined]",
+                  lambda: render_invoice_batch(repository, InvoiceFilter(), PREFERENCES, invoice_ids=sample_ids,
+                                               combined_path=os.path.join(scratch_dir, "batch.html"),
+                                               template_path=TEMPLATE_PATH),
+                  max(1, repeat // 3)))
+
+    export_filter = InvoiceFilter(from_date="2023-01-01", to_date="2023-03-31")
+    for include_lines in (False, True):
+        cases.append((f"export_csv[one quarter{', lines' if include_lines else ''}]",
+                      lambda lines=include_lines: export_invoices_csv(
+                          db_path, os.path.join(scratch_dir, "export.csv"), export_filter, lines, profile=profile),
+                      max(1, repeat // 3)))
+
+    def client_round_trip():
+        for number in range(20):
+            client_id = repository.add_client(f"Benchmark Client {number}", "1 Test Rd", "Tester", "555-0000",
+                                              "test@example.com")
+            repository.update_client(client_id, f"Benchmark Client {number} Renamed", "2 Test Rd", "Tester",
+                                     "555-0001", "test@example.com")
+            repository.delete_client(client_id)
+
+    cases.append(("client_create_update_delete[x20]", client_round_trip, repeat))
+
+    cases.append(("reports", lambda: (repository.revenue_by_month(), repository.revenue_by_client(),
+                                      repository.receivables_aging(date(2024, 1, 1).isoformat())), repeat))
+
+    # The same reports from the columnar snapshot, when NumPy is installed. The snapshot is only
+    # loaded once a case runs, and without moving the analytics watermark of the database.
+    if analytics.np is not None:
+        loaded = []
+
+        def load_snapshot():
+            snapshot = analytics.AnalyticsSnapshot.empty(None)
+            snapshot.load(repository, watermark=False)
+            return snapshot
+
+        def snapshot_reports():
+            if not loaded:
+                loaded.append(load_snapshot())
+            snapshot = loaded[0]
+            return snapshot.month_totals(), snapshot.client_totals(), snapshot.item_totals()
+
+        cases.append(("analytics_load", load_snapshot, max(1, repeat // 3)))
+        cases.append(("analytics_reports", snapshot_reports, repeat))
+    return cases
+
+
+def run_benchmarks(db_path, profile, repeat=5, pattern="*", seed=0):
+    results = {}
+    with tempfile.TemporaryDirectory() as scratch_dir, InvoiceRepository(db_path, profile) as repository:
+        for name, fn, runs in benchmarks(repository, db_path, profile, random.Random(seed), repeat, scratch_dir):
+            if not fnmatch.fnmatch(name, pattern):
+                continue
+            fn()  # Warm the page cache and the template cache
+            results[name] = measure(fn, runs)
+            print(f"{name:<60} {results[name]['median_ms']:>10.2f} ms", file=sys.stderr)
+    return results
+
+
+# [(name, baseline ms, current ms)] for benchmarks whose fastest run got slower than tolerance allows
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None:
+            continue
+        before, after = previous["min_ms"], result["min_ms"]
+        if after > before * (1 + tolerance) and after - before >= MIN_REGRESSION_MS:
+            regressions.append((name, before, after))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the invoice database, export and rendering paths")
+    parser.add_argument("--db", default=BENCHMARK_DB, help="Benchmark database, generated if missing (default: %(default)s)")
+    parser.add_argument("--db-profile", choices=sorted(PROFILES), default="default")
+    parser.add_argument("--clients", type=int, default=10000)
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--invoices", type=int, default=100000)
+    parser.add_argument("--max-lines", type=int, default=5, help="Most lines per generated invoice (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--regenerate", action="store_true", help="Rebuild the database even if it matches")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark (default: %(default)s)")
+    parser.add_argument("--only", default="*", help="Only run benchmarks matching this glob, e.g. 'load_invoices*'")
+    parser.add_argument("--output", help="Write the results JSON here (default: stdout)")
+    parser.add_argument("--save-baseline", help="Also write the results JSON here as the new baseline")
+    parser.add_argument("--baseline", help="Compare with this baseline and exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed slowdown as a fraction of the baseline's fastest run (default: %(default)s)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    profile = PROFILES[args.db_profile]
+    params = _generation_params(args)
+
+    start = time.perf_counter()
+    if prepare_database(args.db, params, args.regenerate, profile):
+        print(f"Generated {args.db} in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    report = {
+        "meta": {"generated": params, "repeat": args.repeat, "db_profile": args.db_profile,
+                 "python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                 "platform": platform.platform(), "timestamp": datetime.now().isoformat(timespec="seconds")},
+        "results": run_benchmarks(args.db, profile, args.repeat, args.only, args.seed),
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            f.write(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("generated") != params:
+            print("Warning: the baseline was measured on a database generated with different parameters",
+                  file=sys.stderr)
+        regressions = compare(report["results"], baseline, args.tolerance)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: {before:.2f} ms -> {after:.2f} ms ({after / before - 1:+.0%})", file=sys.stderr)
+        print(f"{len(regressions)} regression(s) against {args.baseline}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
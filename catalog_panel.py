@@ -0,0 +1,162 @@
+import tkinter as tk
+from tkinter import ttk
+
+from money import format_cents
+
+
+# Scrollable, filterable catalog with a quantity entry per item. Only the rows that fit
+# on screen exist as widgets; scrolling rebinds that fixed pool of rows to other items.
+# Quantities live in a sparse {line_item_id: text} dict holding only nonzero entries.
+class CatalogPanel(tk.Frame):
+    def __init__(self, parent, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.items = []
+        self.items_by_id = {}
+        self.positions = {}
+        self.visible_items = []
+        self.quantities = {}
+        self.first = 0
+        self.rows = []
+        self.visible_rows = 0
+        self.row_height = None
+        self._binding = False
+
+        filter_frame = tk.Frame(self)
+        filter_frame.pack(side=tk.TOP, fill=tk.X, padx=5, pady=(5, 0))
+        tk.Label(filter_frame, text="Filter:").pack(side=tk.LEFT)
+        self.filter_var = tk.StringVar()
+        self.filter_var.trace_add("write", lambda *args: self.apply_filter())
+        tk.Entry(filter_frame, textvariable=self.filter_var).pack(side=tk.LEFT, fill=tk.X, expand=True)
+
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.on_scroll)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        # The body takes whatever height it is given rather than growing with the row pool
+        self.body = tk.Frame(self, height=200)
+        self.body.grid_propagate(False)
+        self.body.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.body.columnconfigure(0, weight=3)  # Item name column
+        self.body.columnconfigure(1, weight=2)  # Unit price column
+        self.body.columnconfigure(2, weight=1)  # Quantity entry column
+
+        tk.Label(self.body, text="Item", font=('Arial', 10, 'bold'), anchor='w').grid(row=0, column=0, sticky='ew', padx=5, pady=5)
+        tk.Label(self.body, text="Unit Price", font=('Arial', 10, 'bold'), anchor='w').grid(row=0, column=1, sticky='ew', padx=5, pady=5)
+        tk.Label(self.body, text="Quantity", font=('Arial', 10, 'bold'), anchor='w').grid(row=0, column=2, sticky='ew', padx=5, pady=5)
+
+        self.body.bind("<Configure>", self.on_resize)
+        for widget in (self.body, self.scrollbar):
+            widget.bind("<MouseWheel>", self.on_mousewheel)
+            widget.bind("<Button-4>", self.on_mousewheel)
+            widget.bind("<Button-5>", self.on_mousewheel)
+
+    # Replace the catalog, keeping quantities already entered for items that still exist
+    def set_items(self, items):
+        self.items = list(items)
+        self.items_by_id = {item.id: item for item in self.items}
+        self.positions = {item.id: position for position, item in enumerate(self.items)}
+        self.quantities = {item_id: qty for item_id, qty in self.quantities.items() if item_id in self.items_by_id}
+        self.apply_filter()
+
+    def apply_filter(self):
+        text = self.filter_var.get().strip().casefold()
+        if text:
+            self.visible_items = [item for item in self.items if text in item.name.casefold()]
+        else:
+            self.visible_items = self.items
+        self.first = 0
+        self.redraw()
+
+    def clear(self):
+        self.quantities = {}
+        self.redraw()
+
+    # Entered (item, quantity text) pairs in catalog order
+    def entered_quantities(self):
+        return [(self.items_by_id[item_id], self.quantities[item_id])
+                for item_id in sorted(self.quantities, key=self.positions.get)]
+
+    def _add_row(self):
+        index = len(self.rows)
+        qty_var = tk.StringVar(value="0")
+        name_label = tk.Label(self.body, anchor='w')
+        price_label = tk.Label(self.body, anchor='w')
+        qty_entry = tk.Entry(self.body, textvariable=qty_var, width=10, justify='left')
+        name_label.grid(row=index + 1, column=0, sticky='ew', padx=5, pady=2)
+        price_label.grid(row=index + 1, column=1, sticky='ew', padx=5, pady=2)
+        qty_entry.grid(row=index + 1, column=2, sticky='w', padx=5, pady=2)
+        for widget in (name_label, price_label, qty_entry):
+            widget.bind("<MouseWheel>", self.on_mousewheel)
+            widget.bind("<Button-4>", self.on_mousewheel)
+            widget.bind("<Button-5>", self.on_mousewheel)
+        row = {"widgets": (name_label, price_label, qty_entry), "qty_var": qty_var, "item_id": None}
+        qty_var.trace_add("write", lambda *args: self.on_qty_changed(row))
+        self.rows.append(row)
+        if self.row_height is None:
+            self.row_height = qty_entry.winfo_reqheight() + 4
+        return row
+
+    # Grow the row pool to fill the visible height
+    def on_resize(self, event):
+        if not self.rows:
+            self._add_row()
+        # One row's worth of height goes to the column headers
+        wanted = max(1, event.height // self.row_height - 1)
+        while len(self.rows) < wanted:
+            self._add_row()
+        self.visible_rows = wanted
+        self.redraw()
+
+    # Bind the row pool to visible_items[first:first + visible rows]
+    def redraw(self):
+        count = min(self.visible_rows, len(self.rows))
+        self.first = max(0, min(self.first, len(self.visible_items) - count))
+        self._binding = True
+        try:
+            for offset, row in enumerate(self.rows):
+                index = self.first + offset
+                if offset < count and index < len(self.visible_items):
+                    item = self.visible_items[index]
+                    name_label, price_label, qty_entry = row["widgets"]
+                    name_label.config(text=item.name)
+                    price_label.config(text=f"${format_cents(item.unit_price_cents)}")
+                    row["item_id"] = item.id
+                    row["qty_var"].set(self.quantities.get(item.id, "0"))
+                    for widget in row["widgets"]:
+                        widget.grid()
+                else:
+                    row["item_id"] = None
+                    for widget in row["widgets"]:
+                        widget.grid_remove()
+        finally:
+            self._binding = False
+
+        total = len(self.visible_items)
+        if total:
+            self.scrollbar.set(self.first / total, min(1.0, (self.first + count) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def on_qty_changed(self, row):
+        if self._binding or row["item_id"] is None:
+            return
+        text = row["qty_var"].get().strip()
+        if text in ("", "0"):
+            self.quantities.pop(row["item_id"], None)
+        else:
+            self.quantities[row["item_id"]] = text
+
+    def on_scroll(self, action, amount, unit=None):
+        if action == "moveto":
+            self.first = int(float(amount) * len(self.visible_items))
+        elif unit == "pages":
+            self.first += int(amount) * max(1, self.visible_rows)
+        else:
+            self.first += int(amount)
+        self.redraw()
+
+    def on_mousewheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.on_scroll("scroll", -1, "units")
+        else:
+            self.on_scroll("scroll", 1, "units")
+        return "break"
@@ -0,0 +1,71 @@
+import unicodedata
+from bisect import bisect_left, insort
+
+
+# Case- and whitespace-insensitive form of a client name used for lookups
+def normalize_name(name):
+    return " ".join(unicodedata.normalize("NFKC", name or "").casefold().split())
+
+
+# In-memory lookup of clients by id, by normalized name and by name prefix.
+# Prefix search walks a sorted list of (normalized name, id) with bisect.
+class ClientIndex:
+    def __init__(self, clients=()):
+        self.rebuild(clients)
+
+    def rebuild(self, clients):
+        self.by_id = {}
+        self.by_name = {}
+        self._sorted = []
+        for client in clients:
+            key = normalize_name(client.name)
+            self.by_id[client.id] = client
+            self.by_name.setdefault(key, []).append(client.id)
+            self._sorted.append((key, client.id))
+        self._sorted.sort()
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def add(self, client):
+        self.remove(client.id)
+        key = normalize_name(client.name)
+        self.by_id[client.id] = client
+        self.by_name.setdefault(key, []).append(client.id)
+        insort(self._sorted, (key, client.id))
+
+    def remove(self, client_id):
+        client = self.by_id.pop(client_id, None)
+        if client is None:
+            return
+        key = normalize_name(client.name)
+        ids = self.by_name[key]
+        ids.remove(client_id)
+        if not ids:
+            del self.by_name[key]
+        del self._sorted[bisect_left(self._sorted, (key, client_id))]
+
+    def get(self, client_id):
+        return self.by_id.get(client_id)
+
+    def find_by_name(self, name):
+        return [self.by_id[client_id] for client_id in self.by_name.get(normalize_name(name), [])]
+
+    # Up to limit clients whose normalized name starts with prefix, in name order
+    def prefix_matches(self, prefix, limit=20):
+        prefix = normalize_name(prefix)
+        matches = []
+        position = bisect_left(self._sorted, (prefix,))
+        while position < len(self._sorted) and len(matches) < limit:
+            key, client_id = self._sorted[position]
+            if not key.startswith(prefix):
+                break
+            matches.append(self.by_id[client_id])
+            position += 1
+        return matches
+
+    # Display label; clients sharing a name are told apart by their id
+    def label(self, client):
+        if len(self.by_name.get(normalize_name(client.name), ())) > 1:
+            return f"{client.name} (#{client.id})"
+        return client.name
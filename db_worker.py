@@ -0,0 +1,100 @@
+import queue
+import sqlite3
+import threading
+
+
+# A unit of database work submitted to the DatabaseWorker
+class Job:
+    def __init__(self, fn, callback=None, errback=None, key=None):
+        self.fn = fn
+        self.callback = callback
+        self.errback = errback
+        self.key = key
+        self.cancelled = False
+
+
+# Runs database work on one dedicated thread that owns its own repository connection.
+# Results are queued and handed back through process_results(), which the GUI calls from
+# its event loop, so callbacks always run on the thread that owns the widgets.
+class DatabaseWorker:
+    def __init__(self, repository_factory):
+        self.repository_factory = repository_factory
+        self.repository = None
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._latest = {}
+        self._current = None
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="db-worker", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    # Queue fn(repository) for the worker thread. A job submitted with a key supersedes
+    # any earlier job with the same key: pending ones are dropped and a running one is
+    # interrupted with Connection.interrupt().
+    def submit(self, fn, callback=None, errback=None, key=None):
+        job = Job(fn, callback, errback, key)
+        if key is not None:
+            previous = self._latest.get(key)
+            if previous is not None:
+                self.cancel(previous)
+            self._latest[key] = job
+        self._jobs.put(job)
+        return job
+
+    def cancel(self, job):
+        with self._lock:
+            job.cancelled = True
+            if self._current is job and self.repository is not None and self.repository.conn is not None:
+                self.repository.conn.interrupt()
+
+    # Deliver finished jobs to their callbacks; call from the GUI thread
+    def process_results(self):
+        while True:
+            try:
+                job, result, error = self._results.get_nowait()
+            except queue.Empty:
+                return
+            if job.key is not None and self._latest.get(job.key) is job:
+                del self._latest[job.key]
+            if job.cancelled:
+                continue
+            if error is None:
+                if job.callback:
+                    job.callback(result)
+            elif job.errback:
+                job.errback(error)
+            else:
+                raise error
+
+    def stop(self):
+        self._jobs.put(None)
+        self._thread.join()
+
+    def _run(self):
+        self.repository = self.repository_factory().open()
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    break
+                with self._lock:
+                    if job.cancelled:
+                        continue
+                    self._current = job
+                result = error = None
+                try:
+                    result = job.fn(self.repository)
+                except sqlite3.OperationalError as e:
+                    # An interrupted statement of a superseded job is expected
+                    if not job.cancelled:
+                        error = e
+                except Exception as e:
+                    error = e
+                with self._lock:
+                    self._current = None
+                self._results.put((job, result, error))
+        finally:
+            self.repository.close()
@@ -0,0 +1,95 @@
+import csv
+import os
+
+from repository import InvoiceFilter, InvoiceRepository, DEFAULT_PROFILE
+
+# Rows fetched from the cursor per write during CSV export
+EXPORT_CHUNK_SIZE = 1000
+
+INVOICE_HEADER = ['Invoice ID', 'Client Name', 'Subtotal', 'Tax', 'Total', 'Date', 'Status']
+LINE_HEADER = ['Item', 'Quantity', 'Unit Price', 'Line Total']
+
+
+# Stream the invoices matching a filter to CSV on a dedicated connection, fetchmany() chunk at a time.
+# Safe to run off the Tk thread; returns the number of data rows written, or None if cancelled.
+def export_invoices_csv(db_path, file_path, invoice_filter, include_lines=False, progress=None,
+                        cancel_event=None, chunk_size=EXPORT_CHUNK_SIZE, profile=DEFAULT_PROFILE):
+    with InvoiceRepository(db_path, profile) as repository:
+        rows, total = repository.export_rows(invoice_filter, include_lines)
+
+        written = 0
+        with open(file_path, 'w', newline='') as csvfile:
+            csv_writer = csv.writer(csvfile)
+            csv_writer.writerow(INVOICE_HEADER + (LINE_HEADER if include_lines else []))
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                chunk = rows.fetchmany(chunk_size)
+                if not chunk:
+                    break
+                csv_writer.writerows(chunk)
+                written += len(chunk)
+                if progress:
+                    progress(written, total)
+
+    if cancel_event is not None and cancel_event.is_set():
+        os.remove(file_path)
+        return None
+    return written
+
+
+# Name of the watermark used when the caller does not give one
+DEFAULT_SYNC = "default"
+
+CHANGE_HEADER = ['Change']
+
+# Counts of invoices written by export_invoice_changes_csv, by change
+CHANGE_KINDS = ("created", "updated", "deleted")
+
+
+# Incremental export: the invoices created, updated or deleted since the sync's previous export,
+# each row prefixed with its change. Deleted invoices are tombstones carrying only the id. The
+# first export of a sync (or after reset_watermark) writes every invoice as created. The file is
+# written under a temporary name and the watermark only advanced once it is in place, so a
+# failed export is simply retried by the next one. Archived invoices are still invoices to the
+# other side, so they are read from the archive too. Returns {change: invoice count}.
+def export_invoice_changes_csv(db_path, file_path, sync=DEFAULT_SYNC, include_lines=False,
+                               chunk_size=EXPORT_CHUNK_SIZE, profile=DEFAULT_PROFILE):
+    counts = dict.fromkeys(CHANGE_KINDS, 0)
+    with InvoiceRepository(db_path, profile) as repository:
+        upto, changes = repository.invoice_changes_since(sync)
+        include_archived = repository.has_archive()
+        if changes is None:
+            cursor, total = repository.export_rows(InvoiceFilter(include_archived=include_archived), include_lines)
+            rows = (row for chunk in iter(lambda: cursor.fetchmany(chunk_size), []) for row in chunk)
+        else:
+            rows = repository.export_rows_for_ids(
+                [invoice_id for invoice_id, change in changes.items() if change != "delete"], include_lines,
+                include_archived)
+
+        header = INVOICE_HEADER + (LINE_HEADER if include_lines else [])
+        temp_path = file_path + ".tmp"
+        try:
+            with open(temp_path, 'w', newline='') as csvfile:
+                csv_writer = csv.writer(csvfile)
+                csv_writer.writerow(CHANGE_HEADER + header)
+                seen = set()
+                for row in rows:
+                    invoice_id = row[0]
+                    change = "updated" if changes and changes[invoice_id] != "insert" else "created"
+                    if invoice_id not in seen:
+                        seen.add(invoice_id)
+                        counts[change] += 1
+                    csv_writer.writerow((change,) + tuple(row))
+                # Invoices both created and deleted since the last export never reach the other side
+                for invoice_id, change in (changes or {}).items():
+                    if invoice_id not in seen and change != "insert":
+                        counts["deleted"] += 1
+                        csv_writer.writerow(["deleted", invoice_id] + [""] * (len(header) - 1))
+            os.replace(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        repository.set_watermark(sync, upto)
+    return counts
@@ -0,0 +1,1405 @@
+import tkinter as tk
+from tkinter import ttk, messagebox, simpledialog, filedialog
+import math
+import webbrowser
+import os
+import threading
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from backup import backup_database, backup_interval_from_preferences, last_backup_time
+from export import export_invoices_csv, export_invoice_changes_csv, CHANGE_KINDS
+from importer import import_file, IMPORT_KINDS
+import instrumentation
+from preferences import load_preferences, save_preferences
+from rendering import RenderCache, render_invoice_batch
+from db_worker import DatabaseWorker
+from client_index import ClientIndex
+from catalog_panel import CatalogPanel
+from money import format_cents, line_total_cents, tax_rate_from_preferences, to_cents
+from repository import (InvoiceFilter, InvoiceLine, InvoiceRepository, InvoiceSort, ARCHIVE_AFTER_DAYS, INVOICE_PAGE_SIZE,
+                        DEFAULT_PROFILE)
+
+INVOICE_COLUMNS = ("id", "client_name", "subtotal", "tax", "total", "date", "status")
+INVOICE_HEADINGS = {"id": "ID", "client_name": "Client Name", "subtotal": "Subtotal", "tax": "Tax", "total": "Total",
+                    "date": "Date", "status": "Status"}
+
+# How often the GUI collects finished database work (milliseconds)
+DB_POLL_INTERVAL = 20
+
+# How many matching clients the client Combobox offers while typing
+CLIENT_SUGGESTIONS = 20
+
+# Bulk actions on more invoices than this reload the list instead of refreshing rows one by one
+BULK_REFRESH_LIMIT = 1000
+
+# How often the GUI checks whether a scheduled backup is due (milliseconds)
+BACKUP_CHECK_INTERVAL = 10 * 60 * 1000
+
+# InvoiceApp methods timed when instrumentation is on
+INSTRUMENTED_HANDLERS = (
+    "load_invoices", "load_more_invoices", "on_invoice_page", "on_invoice_search_results", "apply_invoice_row",
+    "refresh_invoice_row", "apply_filters", "sort_invoices", "on_invoice_select", "show_line_items",
+    "print_invoice", "generate_html_invoice", "print_invoices_batch", "create_invoice", "update_invoice",
+    "mark_as_paid", "mark_as_unpaid", "delete_invoice", "run_bulk_invoice_action", "calculate_subtotal", "display_line_items",
+    "update_client_dropdown", "update_client_suggestions", "clear_fields", "export_to_csv", "import_data",
+    "open_reports", "open_preferences", "manage_clients", "manage_line_items",
+)
+
+class ClientDialog(tk.Toplevel):
+    def __init__(self, parent, title, client=None):
+        super().__init__(parent)
+        self.title(title)
+        self.client = client
+        self.result = None
+
+        # Create and set up variables
+        self.name_var = tk.StringVar(value=client.name if client else "")
+        self.billing_address_var = tk.StringVar(value=client.billing_address if client else "")
+        self.contact_name_var = tk.StringVar(value=client.contact_name if client else "")
+        self.phone_number_var = tk.StringVar(value=client.phone_number if client else "")
+        self.email_var = tk.StringVar(value=client.email if client else "")
+
+        # Create and place widgets
+        tk.Label(self, text="Name:").grid(row=0, column=0, sticky="e", padx=5, pady=5)
+        tk.Entry(self, textvariable=self.name_var, width=30).grid(row=0, column=1, padx=5, pady=5)
+
+        tk.Label(self, text="Billing Address:").grid(row=1, column=0, sticky="e", padx=5, pady=5)
+        tk.Entry(self, textvariable=self.billing_address_var, width=30).grid(row=1, column=1, padx=5, pady=5)
+
+        tk.Label(self, text="Contact Name:").grid(row=2, column=0, sticky="e", padx=5, pady=5)
+        tk.Entry(self, textvariable=self.contact_name_var, width=30).grid(row=2, column=1, padx=5, pady=5)
+
+        tk.Label(self, text="Phone Number:").grid(row=3, column=0, sticky="e", padx=5, pady=5)
+        tk.Entry(self, textvariable=self.phone_number_var, width=30).grid(row=3, column=1, padx=5, pady=5)
+
+        tk.Label(self, text="Email:").grid(row=4, column=0, sticky="e", padx=5, pady=5)
+        tk.Entry(self, textvariable=self.email_var, width=30).grid(row=4, column=1, padx=5, pady=5)
+
+        # Add OK and Cancel buttons
+        tk.Button(self, text="OK", command=self.on_ok).grid(row=5, column=0, padx=5, pady=5)
+        tk.Button(self, text="Cancel", command=self.on_cancel).grid(row=5, column=1, padx=5, pady=5)
+
+        self.grab_set()  # Make the dialog modal
+        self.protocol("WM_DELETE_WINDOW", self.on_cancel)  # Handle window close button
+
+    def on_ok(self):
+        self.result = (
+            self.name_var.get(),
+            self.billing_address_var.get(),
+            self.contact_name_var.get(),
+            self.phone_number_var.get(),
+            self.email_var.get()
+        )
+        self.destroy()
+
+    def on_cancel(self):
+        self.result = None
+        self.destroy()
+
+# Main application
+class InvoiceApp(tk.Tk):
+    def __init__(self, db_path, db_profile=DEFAULT_PROFILE):
+        super().__init__()
+        self.db_path = db_path
+        self.db_profile = db_profile
+        self.title("Invoice Generator")
+
+        # All database work runs on a dedicated worker thread with its own connection
+        self.db = DatabaseWorker(lambda: InvoiceRepository(db_path, db_profile)).start()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.poll_db_results()
+        self.geometry("1000x800")
+
+        # Load preferences
+        self.preferences = self.load_preferences()
+
+        # Printed invoices are served from here when nothing they show has changed
+        self.render_cache = RenderCache()
+
+        # Scheduled backups run when the newest backup is older than the preference allows
+        self.backup_running = False
+        self.after_idle(self.check_scheduled_backup)
+
+        # Create menu bar
+        self.create_menu_bar()
+
+        self.line_items = []
+        self.clients = []
+        self.client_index = ClientIndex()
+        # Combobox label -> client id for the suggestions currently offered
+        self.client_choices = {}
+
+        # Create form fields
+        self.client_var = tk.StringVar()
+
+        tk.Label(self, text="Client").grid(row=0, column=0)
+        self.client_dropdown = ttk.Combobox(self, textvariable=self.client_var)
+        self.client_dropdown.grid(row=0, column=1)
+        self.client_dropdown.bind("<KeyRelease>", self.update_client_suggestions)
+
+        # Catalog items with a quantity entry each; quantities are kept per line item id
+        self.catalog_panel = CatalogPanel(self, relief=tk.SUNKEN, borderwidth=1)
+        self.catalog_panel.grid(row=1, column=0, columnspan=3, sticky='nsew', padx=10, pady=10)
+
+        # Configure grid weights
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_columnconfigure(1, weight=1)
+        self.grid_columnconfigure(2, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+                    
+        # Display line items for quantity entry once the catalog has loaded
+        self.db.submit(self.fetch_catalog, callback=self.on_catalog_loaded)
+
+        # Buttons
+        self.create_button = tk.Button(self, text="Create Invoice", command=self.create_invoice)
+        self.create_button.grid(row=8, column=0, pady=10)
+
+        self.update_button = tk.Button(self, text="Update Invoice", command=self.update_invoice)
+        self.update_button.grid(row=8, column=1, pady=10)
+
+        self.delete_button = tk.Button(self, text="Delete Invoice", command=self.delete_invoice)
+        self.delete_button.grid(row=8, column=2, pady=10)
+
+        self.delete_button = tk.Button(self, text="Mark as Paid", command=self.mark_as_paid)
+        self.delete_button.grid(row=9, column=0, pady=10)
+
+        self.delete_button = tk.Button(self, text="Mark as Unpaid", command=self.mark_as_unpaid)
+        self.delete_button.grid(row=9, column=1, pady=10)
+
+        self.print_button = tk.Button(self, text="Print Invoice", command=self.print_invoice)
+        self.print_button.grid(row=9, column=2, pady=10)
+
+        self.manage_items_button = tk.Button(self, text="Manage Line Items", command=self.manage_line_items)
+        self.manage_items_button.grid(row=10, column=0, pady=10)
+
+        self.manage_clients_button = tk.Button(self, text="Manage Clients", command=self.manage_clients)
+        self.manage_clients_button.grid(row=10, column=1, pady=10)
+
+        # Add filter options
+        filter_frame = tk.Frame(self)
+        filter_frame.grid(row=11, column=0, columnspan=3, pady=10)
+
+        tk.Label(filter_frame, text="Status:").pack(side=tk.LEFT)
+        self.status_var = tk.StringVar(value="All")
+        status_options = ["All", "Paid", "Unpaid"]
+        status_menu = tk.OptionMenu(filter_frame, self.status_var, *status_options, command=self.apply_filters)
+        status_menu.pack(side=tk.LEFT)
+
+        tk.Label(filter_frame, text="From:").pack(side=tk.LEFT)
+        self.from_date = tk.Entry(filter_frame, width=10)
+        self.from_date.pack(side=tk.LEFT)
+
+        tk.Label(filter_frame, text="To:").pack(side=tk.LEFT)
+        self.to_date = tk.Entry(filter_frame, width=10)
+        self.to_date.pack(side=tk.LEFT)
+
+        tk.Button(filter_frame, text="Apply Date Filter", command=self.apply_filters).pack(side=tk.LEFT)
+
+        tk.Label(filter_frame, text="Search:").pack(side=tk.LEFT, padx=(10, 0))
+        self.search_var = tk.StringVar()
+        search_entry = tk.Entry(filter_frame, textvariable=self.search_var, width=25)
+        search_entry.pack(side=tk.LEFT)
+        search_entry.bind("<Return>", self.apply_filters)
+        tk.Button(filter_frame, text="Search", command=self.apply_filters).pack(side=tk.LEFT)
+
+        # Archived invoices are only read (from the attached archive database) when asked for
+        self.include_archived_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(filter_frame, text="Include archived", variable=self.include_archived_var,
+                       command=self.apply_filters).pack(side=tk.LEFT, padx=(10, 0))
+
+
+        # Invoice list
+        self.invoice_list = ttk.Treeview(self, columns=INVOICE_COLUMNS, show="headings", selectmode="extended")
+        for column in INVOICE_COLUMNS:
+            self.invoice_list.heading(column, text=INVOICE_HEADINGS[column],
+                                      command=lambda column=column: self.sort_invoices(column))
+        self.invoice_list.grid(row=12, column=0, columnspan=3, sticky="nsew")
+
+        # Add a scrollbar to the invoice list
+        self.invoice_scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.invoice_list.yview)
+        self.invoice_scrollbar.grid(row=12, column=4, sticky="ns")
+        self.invoice_list.configure(yscrollcommand=self.on_invoice_scroll)
+        self.loading_invoices = False
+
+        # Python-side view of the list: invoice_id -> (iid, sort key), plus the keys in display order
+        self.invoice_rows = {}
+        self.invoice_keys = []
+        # Column order chosen from the headings; None shows search results by relevance, other lists newest first
+        self.invoice_sort = None
+        # Position of each search result while results are shown by relevance
+        self.invoice_search_ranks = {}
+
+        # Configure grid weights to make the treeviews expandable
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_columnconfigure(3, weight=1)
+        self.grid_rowconfigure(13, weight=1)
+
+        # Add the line items treeview
+        self.line_items_tree = ttk.Treeview(self, columns=("item", "quantity", "price", "total"), show="headings")
+        self.line_items_tree.heading("item", text="Item")
+        self.line_items_tree.heading("quantity", text="Quantity")
+        self.line_items_tree.heading("price", text="Unit Price")
+        self.line_items_tree.heading("total", text="Total")
+        self.line_items_tree.grid(row=13, column=0, columnspan=3, sticky="nsew")
+
+        # Add a scrollbar to the line items treeview
+        line_items_scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.line_items_tree.yview)
+        line_items_scrollbar.grid(row=13, column=4, sticky="ns")
+        self.line_items_tree.configure(yscrollcommand=line_items_scrollbar.set)
+
+        # Configure grid weights to make the treeviews expandable
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_columnconfigure(3, weight=1)
+        self.grid_rowconfigure(12, weight=1)
+
+        # Bind the selection event of the invoice list to update line items
+        self.invoice_list.bind("<<TreeviewSelect>>", self.on_invoice_select)
+
+        self.load_invoices()
+
+    def poll_db_results(self):
+        self.db.process_results()
+        self.after(DB_POLL_INTERVAL, self.poll_db_results)
+
+    def on_db_error(self, error):
+        messagebox.showerror("Database Error", str(error))
+
+    # Run fn(repository) on the database thread and pass the result to callback on this thread
+    def run_db(self, fn, callback=None, key=None):
+        return self.db.submit(fn, callback=callback, errback=self.on_db_error, key=key)
+
+    def on_close(self):
+        self.db.stop()
+        self.destroy()
+
+    @staticmethod
+    def fetch_catalog(repository):
+        line_items = repository.list_line_items()
+        if not line_items:
+            repository.add_default_line_items()
+            line_items = repository.list_line_items()
+        return line_items, repository.list_clients()
+
+    def on_catalog_loaded(self, result):
+        self.line_items, self.clients = result
+        self.display_line_items()
+        self.update_client_dropdown()
+
+    def create_menu_bar(self):
+        menubar = tk.Menu(self)
+        self.config(menu=menubar)
+
+        # File menu
+        file_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="File", menu=file_menu)
+        file_menu.add_command(label="Import...", command=self.import_data)
+        file_menu.add_command(label="Export Invoices to CSV", command=self.export_to_csv)
+        file_menu.add_command(label="Export Changes Since Last Export...", command=self.export_changes_to_csv)
+        file_menu.add_command(label="Print Selected Invoices...", command=self.print_invoices_batch)
+        file_menu.add_command(label="Archive Old Paid Invoices...", command=self.archive_invoices)
+        file_menu.add_command(label="Back Up Now", command=self.backup_now)
+        file_menu.add_separator()
+        file_menu.add_command(label="Exit", command=self.quit)
+
+        # Edit menu
+        edit_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Edit", menu=edit_menu)
+        edit_menu.add_command(label="Preferences", command=self.open_preferences)
+
+        # Reports menu
+        reports_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Reports", menu=reports_menu)
+        reports_menu.add_command(label="Revenue and Receivables", command=self.open_reports)
+
+        # Help menu
+        help_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Help", menu=help_menu)
+        help_menu.add_command(label="Diagnostics", command=self.open_diagnostics)
+
+    def export_to_csv(self):
+        # Ask user for save location
+        file_path = filedialog.asksaveasfilename(defaultextension=".csv")
+        if not file_path:
+            return
+        include_lines = messagebox.askyesno("Export Invoices", "Include line item detail rows?")
+        invoice_filter = self.invoice_filter
+
+        progress_window = tk.Toplevel(self)
+        progress_window.title("Exporting Invoices")
+        progress_window.transient(self)
+        status_label = tk.Label(progress_window, text="Exporting...", width=40)
+        status_label.pack(padx=10, pady=5)
+        progress_bar = ttk.Progressbar(progress_window, length=300, mode="determinate")
+        progress_bar.pack(padx=10, pady=5)
+
+        # Shared with the export thread; only the main thread touches Tk
+        state = {"done": 0, "total": 0, "count": None, "error": None}
+        cancel_event = threading.Event()
+        tk.Button(progress_window, text="Cancel", command=cancel_event.set).pack(pady=5)
+
+        def on_progress(done, total):
+            state["done"], state["total"] = done, total
+
+        def run_export():
+            try:
+                state["count"] = export_invoices_csv(self.db_path, file_path, invoice_filter, include_lines,
+                                                     progress=on_progress, cancel_event=cancel_event,
+                                                     profile=self.db_profile)
+            except Exception as e:
+                state["error"] = e
+
+        def poll():
+            if state["total"]:
+                progress_bar["maximum"] = state["total"]
+                progress_bar["value"] = state["done"]
+                status_label.config(text=f"Exported {state['done']:,} of {state['total']:,} rows")
+            if export_thread.is_alive():
+                self.after(100, poll)
+                return
+            progress_window.destroy()
+            if state["error"]:
+                messagebox.showerror("Export Failed", str(state["error"]))
+            elif state["count"] is not None:
+                messagebox.showinfo("Export Successful", f"{state['count']:,} rows exported to {file_path}")
+
+        export_thread = threading.Thread(target=run_export, daemon=True)
+        export_thread.start()
+        poll()
+
+    # Incremental export of what changed since the last one, in the background like export_to_csv
+    def export_changes_to_csv(self):
+        file_path = filedialog.asksaveasfilename(defaultextension=".csv")
+        if not file_path:
+            return
+        include_lines = messagebox.askyesno("Export Changes", "Include line item detail rows?")
+
+        progress_window = tk.Toplevel(self)
+        progress_window.title("Exporting Changes")
+        progress_window.transient(self)
+        tk.Label(progress_window, text="Exporting changes...", width=40).pack(padx=10, pady=10)
+
+        # Shared with the export thread; only the main thread touches Tk
+        state = {"counts": None, "error": None}
+
+        def run_export():
+            try:
+                state["counts"] = export_invoice_changes_csv(self.db_path, file_path, include_lines=include_lines,
+                                                             profile=self.db_profile)
+            except Exception as e:
+                state["error"] = e
+
+        def poll():
+            if export_thread.is_alive():
+                self.after(100, poll)
+                return
+            progress_window.destroy()
+            if state["error"]:
+                messagebox.showerror("Export Failed", str(state["error"]))
+            else:
+                counts = ", ".join(f"{state['counts'][change]:,} {change}" for change in CHANGE_KINDS)
+                messagebox.showinfo("Export Successful", f"Invoices {counts}; written to {file_path}")
+
+        export_thread = threading.Thread(target=run_export, daemon=True)
+        export_thread.start()
+        poll()
+
+    # Bulk import from CSV/JSON on its own thread and connection, like the CSV export
+    def import_data(self):
+        import_window = tk.Toplevel(self)
+        import_window.title("Import")
+        import_window.transient(self)
+
+        tk.Label(import_window, text="Import:").grid(row=0, column=0, padx=5, pady=5, sticky='w')
+        kind_var = tk.StringVar(value=IMPORT_KINDS[0])
+        tk.OptionMenu(import_window, kind_var, *IMPORT_KINDS).grid(row=0, column=1, padx=5, pady=5, sticky='w')
+        status_label = tk.Label(import_window, text="Choose a .csv, .json or .jsonl file", width=50, justify='left')
+        status_label.grid(row=1, column=0, columnspan=2, padx=10, pady=5)
+
+        # Shared with the import thread; only the main thread touches Tk
+        state = {"imported": 0, "rejected": 0, "result": None, "error": None}
+
+        def on_progress(imported, rejected):
+            state["imported"], state["rejected"] = imported, rejected
+
+        def start():
+            file_path = filedialog.askopenfilename(parent=import_window, filetypes=[
+                ("CSV or JSON", "*.csv *.json *.jsonl"), ("All files", "*.*")])
+            if not file_path:
+                return
+            kind = kind_var.get()
+            tax_rate = tax_rate_from_preferences(self.preferences)
+            choose_button.config(state=tk.DISABLED)
+
+            def run_import():
+                try:
+                    state["result"] = import_file(self.db_path, kind, file_path, tax_rate=tax_rate,
+                                                  progress=on_progress, profile=self.db_profile)
+                except Exception as e:
+                    state["error"] = e
+
+            def poll():
+                if import_thread.is_alive():
+                    status_label.config(text=f"Imported {state['imported']:,}, rejected {state['rejected']:,}")
+                    self.after(100, poll)
+                    return
+                import_window.destroy()
+                if state["error"]:
+                    messagebox.showerror("Import Failed", str(state["error"]))
+                    return
+                result = state["result"]
+                message = (f"Imported {result.imported:,} {result.kind} record(s) in {result.seconds:.1f}s "
+                           f"({result.rows_per_second:,.0f} rows/s).")
+                if result.rejects_path:
+                    message += f"\n\n{result.rejected:,} record(s) were rejected; see {result.rejects_path}"
+                self.refresh_clients()
+                self.refresh_line_items()
+                self.load_invoices()
+                messagebox.showinfo("Import Finished", message)
+
+            import_thread = threading.Thread(target=run_import, daemon=True)
+            import_thread.start()
+            poll()
+
+        choose_button = tk.Button(import_window, text="Choose File...", command=start)
+        choose_button.grid(row=2, column=0, columnspan=2, pady=10)
+
+    # Move old paid invoices to the archive database on their own thread and connection
+    def archive_invoices(self):
+        days = simpledialog.askinteger("Archive Paid Invoices", "Archive paid invoices older than how many days?",
+                                       initialvalue=ARCHIVE_AFTER_DAYS, minvalue=0, parent=self)
+        if days is None:
+            return
+
+        progress_window = tk.Toplevel(self)
+        progress_window.title("Archiving Invoices")
+        progress_window.transient(self)
+        status_label = tk.Label(progress_window, text="Archiving...", width=40)
+        status_label.pack(padx=10, pady=10)
+
+        # Shared with the archive thread; only the main thread touches Tk
+        state = {"archived": 0, "count": None, "error": None}
+
+        def on_progress(archived):
+            state["archived"] = archived
+
+        def run_archive():
+            try:
+                with InvoiceRepository(self.db_path, self.db_profile) as repository:
+                    state["count"] = repository.archive_invoices(days, progress=on_progress)
+            except Exception as e:
+                state["error"] = e
+
+        def poll():
+            if archive_thread.is_alive():
+                status_label.config(text=f"Archived {state['archived']:,} invoices")
+                self.after(100, poll)
+                return
+            progress_window.destroy()
+            if state["error"]:
+                messagebox.showerror("Archive Failed", str(state["error"]))
+                return
+            self.load_invoices()
+            messagebox.showinfo("Archive Finished", f"{state['count']:,} paid invoice(s) moved to the archive.")
+
+        archive_thread = threading.Thread(target=run_archive, daemon=True)
+        archive_thread.start()
+        poll()
+
+    def backup_now(self):
+        self.run_backup(show_progress=True)
+
+    # Back up the database on its own thread with SQLite's online backup, so the application stays
+    # usable. Scheduled backups run without a window and only report failures.
+    def run_backup(self, show_progress):
+        if self.backup_running:
+            if show_progress:
+                messagebox.showinfo("Backup", "A backup is already running.")
+            return
+        self.backup_running = True
+
+        progress_window = status_label = progress_bar = None
+        if show_progress:
+            progress_window = tk.Toplevel(self)
+            progress_window.title("Backing Up")
+            progress_window.transient(self)
+            status_label = tk.Label(progress_window, text="Backing up...", width=50)
+            status_label.pack(padx=10, pady=5)
+            progress_bar = ttk.Progressbar(progress_window, length=300, mode="determinate")
+            progress_bar.pack(padx=10, pady=5)
+
+        # Shared with the backup thread; only the main thread touches Tk
+        state = {"source": None, "done": 0, "total": 0, "results": None, "error": None}
+
+        def on_progress(source, done, total):
+            state["source"], state["done"], state["total"] = source, done, total
+
+        def run_backup():
+            try:
+                state["results"] = backup_database(self.db_path, progress=on_progress, profile=self.db_profile)
+            except Exception as e:
+                state["error"] = e
+
+        def poll():
+            if progress_window is not None and state["total"]:
+                progress_bar["maximum"] = state["total"]
+                progress_bar["value"] = state["done"]
+                status_label.config(text=f"Backing up {os.path.basename(state['source'])}: "
+                                         f"{state['done']:,} of {state['total']:,} pages")
+            if backup_thread.is_alive():
+                self.after(100, poll)
+                return
+            self.backup_running = False
+            if progress_window is not None:
+                progress_window.destroy()
+            if state["error"]:
+                messagebox.showerror("Backup Failed", str(state["error"]))
+            elif show_progress:
+                messagebox.showinfo("Backup Finished", "Backed up and verified:\n" +
+                                    "\n".join(result.path for result in state["results"]))
+
+        backup_thread = threading.Thread(target=run_backup, daemon=True)
+        backup_thread.start()
+        poll()
+
+    def check_scheduled_backup(self):
+        hours = backup_interval_from_preferences(self.preferences)
+        if hours:
+            last = last_backup_time(self.db_path)
+            if last is None or datetime.now() - last >= timedelta(hours=hours):
+                self.run_backup(show_progress=False)
+        self.after(BACKUP_CHECK_INTERVAL, self.check_scheduled_backup)
+
+    # Revenue by month and client plus receivables aging, read from the summary tables
+    def open_reports(self):
+        reports_window = tk.Toplevel(self)
+        reports_window.title("Revenue and Receivables")
+        reports_window.geometry("800x600")
+
+        notebook = ttk.Notebook(reports_window)
+        notebook.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        amount_columns = (("invoices", "Invoices"), ("subtotal", "Revenue"), ("tax", "Tax"), ("total", "Total"),
+                          ("paid", "Paid"), ("unpaid", "Outstanding"))
+
+        def add_tree(title, columns):
+            frame = tk.Frame(notebook)
+            notebook.add(frame, text=title)
+            tree = ttk.Treeview(frame, columns=[column for column, heading in columns], show="headings")
+            for column, heading in columns:
+                tree.heading(column, text=heading)
+                tree.column(column, width=100, anchor="e" if column != columns[0][0] else "w")
+            scrollbar = ttk.Scrollbar(frame, orient="vertical", command=tree.yview)
+            tree.configure(yscrollcommand=scrollbar.set)
+            tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+            return tree
+
+        month_tree = add_tree("Revenue by Month", (("month", "Month"),) + amount_columns)
+        client_tree = add_tree("Top Clients", (("client", "Client"),) + amount_columns)
+        aging_tree = add_tree("Receivables Aging", (("age", "Age"), ("invoices", "Invoices"), ("unpaid", "Outstanding")))
+
+        def fetch(repository):
+            return repository.revenue_by_month(), repository.revenue_by_client(), repository.receivables_aging()
+
+        def show(result):
+            if not reports_window.winfo_exists():
+                return
+            months, clients, aging = result
+            for tree in (month_tree, client_tree, aging_tree):
+                tree.delete(*tree.get_children())
+            for row in months:
+                month_tree.insert("", "end", values=(row.month, row.invoice_count, format_cents(row.subtotal_cents),
+                                                     format_cents(row.tax_cents), format_cents(row.total_cents),
+                                                     format_cents(row.paid_cents), format_cents(row.unpaid_cents)))
+            for row in clients:
+                client_tree.insert("", "end", values=(row.client_name, row.invoice_count, format_cents(row.subtotal_cents),
+                                                      format_cents(row.tax_cents), format_cents(row.total_cents),
+                                                      format_cents(row.paid_cents), format_cents(row.unpaid_cents)))
+            for bucket in aging:
+                aging_tree.insert("", "end", values=(bucket.label, bucket.invoice_count, format_cents(bucket.unpaid_cents)))
+            total = sum(bucket.unpaid_cents for bucket in aging)
+            aging_tree.insert("", "end", values=("Total", sum(bucket.invoice_count for bucket in aging), format_cents(total)))
+
+        def refresh():
+            self.run_db(fetch, show, key="reports")
+
+        tk.Button(reports_window, text="Refresh", command=refresh).pack(pady=5)
+        refresh()
+
+    # Aggregated SQL, handler and Tk statistics collected by the instrumentation mode
+    def open_diagnostics(self):
+        diagnostics_window = tk.Toplevel(self)
+        diagnostics_window.title("Diagnostics")
+        diagnostics_window.geometry("900x500")
+
+        stats = instrumentation.active()
+        if stats is None:
+            tk.Label(diagnostics_window, justify='left', text=(
+                "Instrumentation is off.\n\nStart the application with --instrument, or set "
+                f"{instrumentation.INSTRUMENT_ENV}=1, to record SQL timings, handler wall times and Tk widget counts."
+            )).pack(padx=10, pady=10, anchor='w')
+            return
+
+        notebook = ttk.Notebook(diagnostics_window)
+        notebook.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        def add_tree(title, columns):
+            frame = tk.Frame(notebook)
+            notebook.add(frame, text=title)
+            tree = ttk.Treeview(frame, columns=[column for column, heading, width in columns], show="headings")
+            for column, heading, width in columns:
+                tree.heading(column, text=heading)
+                tree.column(column, width=width, anchor="w" if column in ("category", "name") else "e",
+                            stretch=column == "name")
+            scrollbar = ttk.Scrollbar(frame, orient="vertical", command=tree.yview)
+            tree.configure(yscrollcommand=scrollbar.set)
+            tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+            return tree
+
+        timing_tree = add_tree("Timings", (("category", "Category", 80), ("name", "Name", 420), ("count", "Calls", 60),
+                                           ("p50", "p50 ms", 70), ("p95", "p95 ms", 70), ("max", "Max ms", 70),
+                                           ("total", "Total ms", 80)))
+        counter_tree = add_tree("Counters", (("category", "Category", 120), ("name", "Name", 400),
+                                             ("count", "Count", 80)))
+        status_label = tk.Label(diagnostics_window, anchor='w')
+        status_label.pack(fill=tk.X, padx=5)
+
+        def refresh():
+            snapshot = stats.snapshot()
+            timing_tree.delete(*timing_tree.get_children())
+            counter_tree.delete(*counter_tree.get_children())
+            timings = [(category, name, summary) for category, metrics in snapshot["timings"].items()
+                       for name, summary in metrics.items()]
+            # Where the time went first
+            for category, name, summary in sorted(timings, key=lambda timing: -timing[2]["total_ms"]):
+                timing_tree.insert("", "end", values=(category, name, summary["count"], f"{summary['p50_ms']:.2f}",
+                                                      f"{summary['p95_ms']:.2f}", f"{summary['max_ms']:.2f}",
+                                                      f"{summary['total_ms']:.1f}"))
+            for category, counters in sorted(snapshot["counters"].items()):
+                for name, count in sorted(counters.items(), key=lambda counter: -counter[1]):
+                    counter_tree.insert("", "end", values=(category, name, count))
+            status_label.config(text=f"Recording since {snapshot['started']}; written to {stats.path} on exit")
+
+        def save():
+            path = filedialog.asksaveasfilename(parent=diagnostics_window, defaultextension=".json",
+                                                initialfile=os.path.basename(stats.path))
+            if path:
+                stats.save(path)
+                status_label.config(text=f"Saved to {path}")
+
+        button_frame = tk.Frame(diagnostics_window)
+        button_frame.pack(pady=5)
+        tk.Button(button_frame, text="Refresh", command=refresh).pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Save As...", command=save).pack(side=tk.LEFT, padx=5)
+        refresh()
+
+    def open_preferences(self):
+        preferences_window = tk.Toplevel(self)
+        preferences_window.title("Preferences")
+        preferences_window.geometry("400x480")
+
+        # Existing fields
+        tk.Label(preferences_window, text="Company Name:").grid(row=0, column=0, padx=5, pady=5)
+        company_name_entry = tk.Entry(preferences_window, width=30)
+        company_name_entry.grid(row=0, column=1, padx=5, pady=5)
+        company_name_entry.insert(0, self.preferences.get('company_name', ''))
+
+        tk.Label(preferences_window, text="Company Address:").grid(row=1, column=0, padx=5, pady=5)
+        company_address_entry = tk.Entry(preferences_window, width=30)
+        company_address_entry.grid(row=1, column=1, padx=5, pady=5)
+        company_address_entry.insert(0, self.preferences.get('company_address', ''))
+
+        # New fields for city, state/province, and postal code
+        tk.Label(preferences_window, text="City:").grid(row=2, column=0, padx=5, pady=5)
+        company_city_entry = tk.Entry(preferences_window, width=30)
+        company_city_entry.grid(row=2, column=1, padx=5, pady=5)
+        company_city_entry.insert(0, self.preferences.get('company_city', ''))
+
+        tk.Label(preferences_window, text="State/Province:").grid(row=3, column=0, padx=5, pady=5)
+        company_state_entry = tk.Entry(preferences_window, width=30)
+        company_state_entry.grid(row=3, column=1, padx=5, pady=5)
+        company_state_entry.insert(0, self.preferences.get('company_state', ''))
+
+        tk.Label(preferences_window, text="Postal Code:").grid(row=4, column=0, padx=5, pady=5)
+        company_postal_entry = tk.Entry(preferences_window, width=30)
+        company_postal_entry.grid(row=4, column=1, padx=5, pady=5)
+        company_postal_entry.insert(0, self.preferences.get('company_postal', ''))
+
+        # GST Number
+        tk.Label(preferences_window, text="GST Number:").grid(row=5, column=0, padx=5, pady=5)
+        gst_number_entry = tk.Entry(preferences_window, width=30)
+        gst_number_entry.grid(row=5, column=1, padx=5, pady=5)
+        gst_number_entry.insert(0, self.preferences.get('gst_number', ''))
+
+        # Company Phone
+        tk.Label(preferences_window, text="Company Phone:").grid(row=6, column=0, padx=5, pady=5)
+        company_phone_entry = tk.Entry(preferences_window, width=30)
+        company_phone_entry.grid(row=6, column=1, padx=5, pady=5)
+        company_phone_entry.insert(0, self.preferences.get('company_phone', ''))
+
+        # Company Email
+        tk.Label(preferences_window, text="Company Email:").grid(row=7, column=0, padx=5, pady=5)
+        company_email_entry = tk.Entry(preferences_window, width=30)
+        company_email_entry.grid(row=7, column=1, padx=5, pady=5)
+        company_email_entry.insert(0, self.preferences.get('company_email', ''))
+
+        # Company Website
+        tk.Label(preferences_window, text="Company Website:").grid(row=8, column=0, padx=5, pady=5)
+        company_website_entry = tk.Entry(preferences_window, width=30)
+        company_website_entry.grid(row=8, column=1, padx=5, pady=5)
+        company_website_entry.insert(0, self.preferences.get('company_website', ''))
+
+        # Tax rate applied to new and edited invoices
+        tax_rate_var = tk.StringVar(value=f"{(tax_rate_from_preferences(self.preferences) * 100).normalize():f}")
+        tk.Label(preferences_window, text="Tax Rate (%):").grid(row=9, column=0, padx=5, pady=5)
+        tk.Entry(preferences_window, textvariable=tax_rate_var, width=30).grid(row=9, column=1, padx=5, pady=5)
+
+        # Scheduled backups; 0 turns them off
+        backup_interval_var = tk.StringVar(value=f"{backup_interval_from_preferences(self.preferences):g}")
+        tk.Label(preferences_window, text="Back Up Every (hours):").grid(row=10, column=0, padx=5, pady=5)
+        tk.Entry(preferences_window, textvariable=backup_interval_var, width=30).grid(row=10, column=1, padx=5, pady=5)
+
+        def save_preferences():
+            try:
+                tax_rate = Decimal(tax_rate_var.get().strip().rstrip('%'))
+            except InvalidOperation:
+                tax_rate = None
+            if tax_rate is None or not tax_rate.is_finite() or tax_rate < 0:
+                messagebox.showwarning("Error", "Please enter the tax rate as a percentage, e.g. 5.", parent=preferences_window)
+                return
+            try:
+                backup_interval = float(backup_interval_var.get().strip() or 0)
+            except ValueError:
+                backup_interval = -1
+            if not (math.isfinite(backup_interval) and backup_interval >= 0):
+                messagebox.showwarning("Error", "Please enter the backup interval in hours, or 0 for no scheduled backups.",
+                                       parent=preferences_window)
+                return
+            self.preferences['company_name'] = company_name_entry.get()
+            self.preferences['company_address'] = company_address_entry.get()
+            self.preferences['company_city'] = company_city_entry.get()
+            self.preferences['company_state'] = company_state_entry.get()
+            self.preferences['company_postal'] = company_postal_entry.get()
+            self.preferences['gst_number'] = gst_number_entry.get()
+            self.preferences['company_phone'] = company_phone_entry.get()
+            self.preferences['company_email'] = company_email_entry.get()
+            self.preferences['company_website'] = company_website_entry.get()
+            self.preferences['tax_rate'] = str(tax_rate)
+            self.preferences['backup_interval_hours'] = backup_interval
+            self.save_preferences()
+            preferences_window.destroy()
+
+        save_button = tk.Button(preferences_window, text="Save", command=save_preferences)
+        save_button.grid(row=11, column=0, columnspan=2, pady=10)
+
+    def load_preferences(self):
+        return load_preferences()
+
+    def save_preferences(self):
+        save_preferences(self.preferences)
+
+    # Sort by a column in the database and reload from the first page; clicking the
+    # sorted column again reverses the order
+    def sort_invoices(self, column):
+        sort = self.invoice_sort or InvoiceSort()
+        if sort.column == column:
+            self.invoice_sort = sort._replace(descending=not sort.descending)
+        else:
+            self.invoice_sort = InvoiceSort(column, descending=False)
+
+        for heading in INVOICE_COLUMNS:
+            arrow = ""
+            if heading == column:
+                arrow = " \u25bc" if self.invoice_sort.descending else " \u25b2"
+            self.invoice_list.heading(heading, text=INVOICE_HEADINGS[heading] + arrow)
+        self.load_invoices()
+
+    # Sort key of a row under the current ordering of the invoice list
+    def invoice_sort_key(self, row):
+        if self.invoice_search_ranks:
+            # Rows that were not among the search results go last
+            return (self.invoice_search_ranks.get(row.id, len(self.invoice_search_ranks)), row.id)
+        return (self.invoice_sort or InvoiceSort()).key(row)
+
+    def invoice_order_descending(self):
+        return not self.invoice_search_ranks and (self.invoice_sort or InvoiceSort()).descending
+
+    # Treeview values of an invoice list row, with amounts in dollars
+    @staticmethod
+    def invoice_row_values(row):
+        return (row.id, row.client_name, format_cents(row.subtotal_cents), format_cents(row.tax_cents),
+                format_cents(row.total_cents), row.date, row.status)
+
+    # Position of a sort key among the displayed rows (binary search)
+    def invoice_insert_index(self, key):
+        lo, hi = 0, len(self.invoice_keys)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if (self.invoice_keys[mid] > key) if self.invoice_order_descending() else (self.invoice_keys[mid] < key):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def place_invoice_row(self, row):
+        key = self.invoice_sort_key(row)
+        index = self.invoice_insert_index(key)
+        iid = self.invoice_list.insert("", index, values=self.invoice_row_values(row))
+        self.invoice_keys.insert(index, key)
+        self.invoice_rows[row.id] = (iid, key)
+
+    def remove_invoice_row(self, invoice_id):
+        entry = self.invoice_rows.pop(invoice_id, None)
+        if entry:
+            iid, key = entry
+            del self.invoice_keys[self.invoice_insert_index(key)]
+            self.invoice_list.delete(iid)
+
+    # Re-query a single invoice under the current filter and update its row
+    def refresh_invoice_row(self, invoice_id):
+        self.run_db_and_refresh(lambda repository: None, invoice_id)
+
+    # Run a mutation on the database thread, then update only the affected invoice row
+    def run_db_and_refresh(self, fn, invoice_id, callback=None):
+        invoice_filter = self.invoice_filter
+
+        def mutate(repository):
+            result = fn(repository)
+            return result, repository.get_invoice_summary(invoice_id, invoice_filter)
+
+        def done(result):
+            result, row = result
+            # A reload for a newer filter will pick the change up
+            if invoice_filter == self.invoice_filter:
+                self.apply_invoice_row(invoice_id, row)
+            if callback:
+                callback(result)
+
+        self.run_db(mutate, done)
+
+    # Insert, update or remove a single invoice row without reloading the list
+    def apply_invoice_row(self, invoice_id, row):
+        entry = self.invoice_rows.get(invoice_id)
+
+        if row is None:
+            self.remove_invoice_row(invoice_id)
+            return
+
+        key = self.invoice_sort_key(row)
+        if entry and entry[1] == key:
+            self.invoice_list.item(entry[0], values=self.invoice_row_values(row))
+            return
+
+        self.remove_invoice_row(invoice_id)
+        # Rows past the end of the loaded pages will arrive with a later page
+        if not self.invoices_exhausted and self.invoice_insert_index(key) == len(self.invoice_keys):
+            return
+        self.place_invoice_row(row)
+
+    def load_invoices(self):
+        self.invoice_list.delete(*self.invoice_list.get_children())
+        self.invoice_rows = {}
+        self.invoice_keys = []
+        self.invoice_search_ranks = {}
+
+        self.invoice_filter = InvoiceFilter(self.status_var.get(), self.from_date.get(), self.to_date.get(),
+                                            self.search_var.get(), self.include_archived_var.get())
+        self.last_invoice_key = None
+        self.invoices_exhausted = False
+        self.loading_invoices = True
+        self.load_more_invoices()
+
+    # Fetch the next page of invoices after the sort key of the last row shown; a new
+    # filter or order supersedes (and interrupts) any page still being fetched
+    def load_more_invoices(self):
+        if self.invoices_exhausted:
+            self.loading_invoices = False
+            return
+
+        invoice_filter, after = self.invoice_filter, self.last_invoice_key
+        if invoice_filter.match_expression() and self.invoice_sort is None:
+            # Searches show one page of the best matches, ranked by relevance
+            self.run_db(lambda repository: repository.search_invoices(invoice_filter),
+                        self.on_invoice_search_results, key="invoices")
+            return
+        sort = self.invoice_sort or InvoiceSort()
+        self.run_db(lambda repository: repository.list_invoices(invoice_filter, after, sort=sort),
+                    lambda rows: self.on_invoice_page(rows, sort), key="invoices")
+
+    def on_invoice_search_results(self, rows):
+        self.invoice_search_ranks = {row.id: rank for rank, row in enumerate(rows)}
+        self.invoices_exhausted = True
+        self.on_invoice_page(rows)
+
+    def on_invoice_page(self, rows, sort=None):
+        self.loading_invoices = False
+        for row in rows:
+            if row.id not in self.invoice_rows:
+                self.place_invoice_row(row)
+
+        if rows and sort is not None:
+            self.last_invoice_key = sort.key(rows[-1])
+        if len(rows) < INVOICE_PAGE_SIZE:
+            self.invoices_exhausted = True
+
+    def on_invoice_scroll(self, first, last):
+        self.invoice_scrollbar.set(first, last)
+        # Fetch the next page once the view nears the end of the loaded rows
+        if float(last) >= 0.9 and not self.invoices_exhausted and not self.loading_invoices:
+            self.loading_invoices = True
+            self.after_idle(self.load_more_invoices)
+
+    def apply_filters(self, *args):
+        self.load_invoices()
+
+    def on_invoice_select(self, event):
+        selected_items = self.invoice_list.selection()
+        if selected_items:
+            invoice_id = self.invoice_list.item(selected_items[0])['values'][0]
+            self.load_line_items(invoice_id)
+
+    def load_line_items(self, invoice_id):
+        # Fetch line items for the selected invoice; a newer selection supersedes this one
+        include_archived = self.invoice_filter.include_archived
+        self.run_db(lambda repository: repository.get_invoice_lines(invoice_id, include_archived),
+                    self.show_line_items, key="line_items")
+
+    def show_line_items(self, lines):
+        # Clear existing items
+        self.line_items_tree.delete(*self.line_items_tree.get_children())
+
+        for line in lines:
+            self.line_items_tree.insert("", "end", values=(line.description, f"{line.qty:g}", format_cents(line.unit_price_cents),
+                                                            format_cents(line.total_cents)))
+
+
+    def manage_clients(self):
+        manage_window = tk.Toplevel(self)
+        manage_window.title("Manage Clients")
+        manage_window.geometry("600x400")
+
+        # Create a frame for the clients list
+        list_frame = tk.Frame(manage_window)
+        list_frame.pack(pady=10, padx=10, fill=tk.BOTH, expand=True)
+
+        # Create a scrollbar
+        scrollbar = tk.Scrollbar(list_frame)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        # Create a listbox for clients
+        self.clients_listbox = tk.Listbox(list_frame, yscrollcommand=scrollbar.set)
+        self.clients_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        scrollbar.config(command=self.clients_listbox.yview)
+
+        # Populate the listbox
+        for client in self.clients:
+            self.clients_listbox.insert(tk.END, f"{client.name} - {client.contact_name}")
+
+        # Create buttons for managing clients
+        add_button = tk.Button(manage_window, text="Add Client", command=self.add_client)
+        add_button.pack(pady=5)
+
+        edit_button = tk.Button(manage_window, text="Edit Client", command=self.edit_client)
+        edit_button.pack(pady=5)
+
+        delete_button = tk.Button(manage_window, text="Delete Client", command=self.delete_client)
+        delete_button.pack(pady=5)
+
+    def add_client(self):
+        dialog = ClientDialog(self, "Add Client")
+        self.wait_window(dialog)
+        if dialog.result:
+            name, billing_address, contact_name, phone_number, email = dialog.result
+
+            def added(result):
+                self.clients_listbox.insert(tk.END, f"{name} - {contact_name}")
+
+            self.run_db(lambda repository: repository.add_client(*dialog.result), lambda result: self.refresh_clients(added))
+
+    def edit_client(self):
+        selected = self.clients_listbox.curselection()
+        if selected:
+            index = selected[0]
+            client = self.clients[index]
+            dialog = ClientDialog(self, "Edit Client", client)
+            self.wait_window(dialog)
+            if dialog.result:
+                name, billing_address, contact_name, phone_number, email = dialog.result
+
+                def updated(result):
+                    self.clients_listbox.delete(index)
+                    self.clients_listbox.insert(index, f"{name} - {contact_name}")
+
+                self.run_db(lambda repository: repository.update_client(client.id, *dialog.result),
+                            lambda result: self.refresh_clients(updated))
+
+    def delete_client(self):
+        selected = self.clients_listbox.curselection()
+        if selected:
+            index = selected[0]
+            client = self.clients[index]
+            
+            def deleted(result):
+                self.clients_listbox.delete(index)
+                messagebox.showinfo("Success", f"{client.name} has been deleted.")
+
+            # Check if there are any invoices for this client
+            def counted(invoice_count):
+                if invoice_count > 0:
+                    messagebox.showerror("Cannot Delete", f"Cannot delete {client.name}. There are {invoice_count} invoice(s) associated with this client.")
+                else:
+                    if messagebox.askyesno("Delete Client", f"Are you sure you want to delete {client.name}?"):
+                        self.run_db(lambda repository: repository.delete_client(client.id),
+                                    lambda result: self.refresh_clients(deleted))
+
+            self.run_db(lambda repository: repository.count_client_invoices(client.id), counted)
+
+    def refresh_clients(self, callback=None):
+        def loaded(clients):
+            self.clients = clients
+            self.update_client_dropdown()
+            if callback:
+                callback(clients)
+
+        self.run_db(lambda repository: repository.list_clients(), loaded)
+
+
+    def manage_line_items(self):
+        manage_window = tk.Toplevel(self)
+        manage_window.title("Manage Line Items")
+        manage_window.geometry("500x400")
+
+        # Create a frame for the line items list
+        list_frame = tk.Frame(manage_window)
+        list_frame.pack(pady=10, padx=10, fill=tk.BOTH, expand=True)
+
+        # Create a scrollbar
+        scrollbar = tk.Scrollbar(list_frame)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        # Create a listbox for line items
+        self.items_listbox = tk.Listbox(list_frame, yscrollcommand=scrollbar.set)
+        self.items_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        scrollbar.config(command=self.items_listbox.yview)
+
+        # Populate the listbox
+        for item in self.line_items:
+            self.items_listbox.insert(tk.END, f"{item.name} - ${format_cents(item.unit_price_cents)}")
+
+        # Create buttons for managing line items
+        add_button = tk.Button(manage_window, text="Add Item", command=self.add_line_item)
+        add_button.pack(pady=5)
+
+        edit_button = tk.Button(manage_window, text="Edit Item", command=self.edit_line_item)
+        edit_button.pack(pady=5)
+
+        delete_button = tk.Button(manage_window, text="Delete Item", command=self.delete_line_item)
+        delete_button.pack(pady=5)
+
+    def add_line_item(self):
+        name = simpledialog.askstring("Add Line Item", "Enter item name:")
+        if name:
+            price = simpledialog.askfloat("Add Line Item", f"Enter unit price for {name}:")
+            if price is not None:
+                self.run_db(lambda repository: repository.add_line_item(name, to_cents(price)),
+                            lambda result: self.refresh_line_items(
+                                lambda items: self.items_listbox.insert(tk.END, f"{name} - ${price:.2f}")))
+
+    def edit_line_item(self):
+        selected = self.items_listbox.curselection()
+        if selected:
+            index = selected[0]
+            item = self.line_items[index]
+            name = simpledialog.askstring("Edit Line Item", "Enter new item name:", initialvalue=item.name)
+            if name:
+                price = simpledialog.askfloat("Edit Line Item", f"Enter new unit price for {name}:", initialvalue=float(format_cents(item.unit_price_cents)))
+                if price is not None:
+                    def updated(items):
+                        self.items_listbox.delete(index)
+                        self.items_listbox.insert(index, f"{name} - ${price:.2f}")
+
+                    self.run_db(lambda repository: repository.update_line_item(item.id, name, to_cents(price)),
+                                lambda result: self.refresh_line_items(updated))
+
+    def delete_line_item(self):
+        selected = self.items_listbox.curselection()
+        if selected:
+            index = selected[0]
+            item = self.line_items[index]
+            if messagebox.askyesno("Delete Line Item", f"Are you sure you want to delete {item.name}?"):
+                self.run_db(lambda repository: repository.delete_line_item(item.id),
+                            lambda result: self.refresh_line_items(lambda items: self.items_listbox.delete(index)))
+
+    def display_line_items(self):
+        self.catalog_panel.set_items(self.line_items)
+
+    def refresh_line_items(self, callback=None):
+        def loaded(line_items):
+            self.line_items = line_items
+            self.display_line_items()
+            if callback:
+                callback(line_items)
+
+        self.run_db(lambda repository: repository.list_line_items(), loaded)
+
+    def update_client_dropdown(self):
+        self.client_index.rebuild(self.clients)
+        self.update_client_suggestions()
+
+    # Offer the first CLIENT_SUGGESTIONS clients whose name starts with the typed text
+    def update_client_suggestions(self, event=None):
+        if event is not None and event.keysym in ("Up", "Down", "Return", "Escape", "Tab"):
+            return
+        text = self.client_var.get()
+        choices = {}
+        current_id = self.client_choices.get(text)
+        if current_id is not None and self.client_index.get(current_id) is not None:
+            choices[text] = current_id
+        for client in self.client_index.prefix_matches(text, CLIENT_SUGGESTIONS):
+            choices[self.client_index.label(client)] = client.id
+        self.client_choices = choices
+        self.client_dropdown['values'] = list(choices)
+
+    # Id of the client in the Combobox: a picked suggestion, or a name that matches exactly one client
+    def selected_client_id(self):
+        text = self.client_var.get()
+        if text in self.client_choices:
+            return self.client_choices[text]
+        matches = self.client_index.find_by_name(text)
+        if len(matches) > 1:
+            messagebox.showwarning("Error", f"Several clients are named {text}. Please pick one from the list.")
+        elif not matches:
+            messagebox.showwarning("Error", "Please select a valid client.")
+        else:
+            return matches[0].id
+        return None
+
+
+    # Create a new invoice
+    def create_invoice(self):
+        client_name = self.client_var.get()
+        lines, subtotal = self.calculate_subtotal()
+        if lines is None:
+            return
+
+        if client_name and lines and subtotal > 0:
+            client_id = self.selected_client_id()
+            if client_id is None:
+                return
+
+            def created(invoice_id):
+                self.refresh_invoice_row(invoice_id)
+                self.clear_fields()
+                messagebox.showinfo("Success", "Invoice created successfully!")
+
+            tax_rate = tax_rate_from_preferences(self.preferences)
+            self.run_db(lambda repository: repository.create_invoice(client_id, lines, tax_rate=tax_rate), created)
+        else:
+            messagebox.showwarning("Error", "Please fill in all fields.")
+
+    # Calculate subtotal (in cents) from the quantities entered; only items with a quantity are visited
+    def calculate_subtotal(self):
+        lines = []
+        subtotal = 0
+
+        for item, qty_text in self.catalog_panel.entered_quantities():
+            try:
+                qty = float(qty_text)
+            except ValueError:
+                messagebox.showwarning("Error", f"Quantity for {item.name} must be a number.")
+                return None, 0
+            if qty:
+                total = line_total_cents(qty, item.unit_price_cents)
+                subtotal += total
+                lines.append(InvoiceLine(item.id, item.name, qty, item.unit_price_cents, total))
+
+        return lines, subtotal
+
+    # Update an existing invoice
+    def update_invoice(self):
+        selected_item = self.invoice_list.selection()
+        if selected_item:
+            invoice_id = self.invoice_list.item(selected_item[0])['values'][0]
+            client_name = self.client_var.get()
+            lines, subtotal = self.calculate_subtotal()
+            if lines is None:
+                return
+
+            if client_name and lines and subtotal > 0:
+                client_id = self.selected_client_id()
+                if client_id is None:
+                    return
+
+                def updated(result):
+                    self.load_line_items(invoice_id)
+                    self.clear_fields()
+                    messagebox.showinfo("Success", "Invoice updated successfully!")
+
+                tax_rate = tax_rate_from_preferences(self.preferences)
+                self.run_db_and_refresh(lambda repository: repository.update_invoice(invoice_id, client_id, lines,
+                                                                                     tax_rate=tax_rate),
+                                        invoice_id, updated)
+            else:
+                messagebox.showwarning("Error", "Please fill in all fields.")
+        else:
+            messagebox.showwarning("Error", "Please select an invoice to update.")
+    
+    # Mark the selected invoices as unpaid
+    def mark_as_unpaid(self):
+        self.set_invoices_status("unpaid")
+
+    # Mark the selected invoices as paid
+    def mark_as_paid(self):
+        self.set_invoices_status("paid")
+
+    def set_invoices_status(self, status):
+        def summary(requested, changed):
+            message = f"Marked {changed:,} invoice(s) as {status}."
+            if changed < requested:
+                message += f" {requested - changed:,} already were."
+            return message
+
+        self.run_bulk_invoice_action(f"mark as {status}",
+                                     lambda repository, invoice_ids: repository.set_invoices_status(invoice_ids, status),
+                                     summary)
+
+    # Delete the selected invoices
+    def delete_invoice(self):
+        def deleted(requested, changed):
+            self.line_items_tree.delete(*self.line_items_tree.get_children())
+            return f"Deleted {changed:,} invoice(s)."
+
+        self.run_bulk_invoice_action("delete", lambda repository, invoice_ids: repository.delete_invoices(invoice_ids),
+                                     deleted, confirm_selected=True)
+
+    def selected_invoice_ids(self):
+        return [self.invoice_list.item(iid)['values'][0] for iid in self.invoice_list.selection()]
+
+    # Apply fn(repository, invoice_ids) -> number changed to the selected invoices or, with nothing
+    # selected and after confirming, to every invoice matching the current filter. Archived invoices
+    # cannot be changed, so they are left out up front and reported separately. It runs as one
+    # transaction; the affected rows are then refreshed in place (or the list reloaded once if
+    # there are many) and summary(requested, changed) is shown in a single message.
+    def run_bulk_invoice_action(self, verb, fn, summary, confirm_selected=False):
+        invoice_filter = self.invoice_filter
+        selected_ids = self.selected_invoice_ids()
+
+        def run(invoice_ids, archived):
+            def mutate(repository):
+                changed = fn(repository, invoice_ids)
+                if len(invoice_ids) > BULK_REFRESH_LIMIT:
+                    return changed, None
+                return changed, repository.get_invoice_summaries(invoice_ids, invoice_filter)
+
+            def done(result):
+                changed, rows = result
+                # A reload for a newer filter will pick the changes up
+                if invoice_filter == self.invoice_filter:
+                    if rows is None:
+                        self.load_invoices()
+                    else:
+                        for invoice_id in invoice_ids:
+                            self.apply_invoice_row(invoice_id, rows.get(invoice_id))
+                message = summary(len(invoice_ids), changed)
+                if archived:
+                    message += f" {archived:,} archived invoice(s) were left unchanged."
+                messagebox.showinfo("Success", message)
+
+            self.run_db(mutate, done)
+
+        def lookup(repository):
+            invoice_ids = selected_ids or repository.invoice_ids(invoice_filter)
+            return invoice_ids, repository.current_invoice_ids(invoice_ids)
+
+        def confirm(result):
+            invoice_ids, current_ids = result
+            archived = len(invoice_ids) - len(current_ids)
+            skipped = f"\n\n{archived:,} archived invoice(s) cannot be changed and will be skipped." if archived else ""
+            if not invoice_ids:
+                messagebox.showwarning("Error", "No invoices match the current filter.")
+            elif not current_ids:
+                messagebox.showwarning("Error", "Archived invoices cannot be edited, marked or deleted.")
+            elif selected_ids:
+                if not (confirm_selected or archived) or messagebox.askyesno(
+                        "Confirm", f"Are you sure you want to {verb} {len(current_ids):,} selected invoice(s)?{skipped}"):
+                    run(current_ids, archived)
+            elif messagebox.askyesno("Confirm", f"No invoices are selected. {verb.capitalize()} all "
+                                                f"{len(current_ids):,} invoice(s) matching the current filter?{skipped}"):
+                run(current_ids, archived)
+
+        self.run_db(lookup, confirm)
+
+    # Generate HTML invoice and open it in browser
+    def print_invoice(self):
+        selected_item = self.invoice_list.selection()
+        if selected_item:
+            invoice_id = self.invoice_list.item(selected_item[0])['values'][0]
+            include_archived = self.invoice_filter.include_archived
+            self.run_db(lambda repository: repository.get_invoice(invoice_id, include_archived),
+                        lambda invoice: invoice and self.generate_html_invoice(invoice))
+        else:
+            messagebox.showwarning("Error", "Please select an invoice to print.")
+
+    # Render the invoice (or reuse its cached render) and open it in the browser
+    def generate_html_invoice(self, invoice):
+        path = self.render_cache.render(invoice, self.preferences)
+        webbrowser.open(f"file://{os.path.realpath(path)}")
+
+    # Render the selected invoices (or every invoice matching the filter) into one printable document
+    def print_invoices_batch(self):
+        invoice_ids = [self.invoice_list.item(iid)['values'][0] for iid in self.invoice_list.selection()]
+        file_path = filedialog.asksaveasfilename(defaultextension=".html", initialfile="invoices.html",
+                                                 filetypes=[("HTML files", "*.html")])
+        if not file_path:
+            return
+
+        invoice_filter, preferences = self.invoice_filter, dict(self.preferences)
+
+        progress_window = tk.Toplevel(self)
+        progress_window.title("Printing Invoices")
+        progress_window.transient(self)
+        status_label = tk.Label(progress_window, text="Rendering...", width=40)
+        status_label.pack(padx=10, pady=10)
+
+        # Shared with the render thread; only the main thread touches Tk
+        state = {"rendered": 0, "count": None, "error": None}
+
+        def on_progress(rendered):
+            state["rendered"] = rendered
+
+        # On its own thread and connection, like the exports, so a large batch does not hold up
+        # the list and form work queued on the database worker
+        def run_render():
+            try:
+                with InvoiceRepository(self.db_path, self.db_profile) as repository:
+                    state["count"] = render_invoice_batch(repository, invoice_filter, preferences,
+                                                          invoice_ids=invoice_ids or None, combined_path=file_path,
+                                                          cache=self.render_cache, progress=on_progress)
+            except Exception as e:
+                state["error"] = e
+
+        def poll():
+            if render_thread.is_alive():
+                status_label.config(text=f"Rendered {state['rendered']:,} invoices")
+                self.after(100, poll)
+                return
+            progress_window.destroy()
+            if state["error"]:
+                messagebox.showerror("Print Failed", str(state["error"]))
+            elif state["count"]:
+                webbrowser.open(f"file://{os.path.realpath(file_path)}")
+            else:
+                messagebox.showwarning("Error", "No invoices to print.")
+
+        render_thread = threading.Thread(target=run_render, daemon=True)
+        render_thread.start()
+        poll()
+
+    # Clear form fields
+    def clear_fields(self):
+        self.client_var.set("")
+        self.update_client_suggestions()
+        self.catalog_panel.clear()
@@ -0,0 +1,409 @@
+import csv
+import json
+import math
+import os
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import groupby, islice
+from typing import NamedTuple, Optional
+
+from client_index import ClientIndex, normalize_name
+from money import DEFAULT_TAX_RATE, line_total_cents, tax_cents, to_cents
+from repository import InvoiceRepository, InvoiceLine, DEFAULT_PROFILE
+
+# Input rows validated and written per transaction
+IMPORT_CHUNK_SIZE = 5000
+
+IMPORT_KINDS = ("clients", "items", "invoices")
+
+CLIENT_FIELDS = ("name", "billing_address", "contact_name", "phone_number", "email")
+
+
+class ImportResult(NamedTuple):
+    kind: str
+    imported: int
+    rejected: int
+    seconds: float
+    rejects_path: Optional[str]
+
+    @property
+    def rows_per_second(self):
+        return (self.imported + self.rejected) / self.seconds if self.seconds else 0.0
+
+
+# Header names are matched loosely: "Unit Price" and "unit_price" are the same column
+def _field_name(name):
+    return "_".join(str(name).strip().lower().split())
+
+
+def _text(record, field):
+    value = record.get(field)
+    return "" if value is None else str(value).strip()
+
+
+# Key of the reason on records that could not be read; they are rejected as they are
+INVALID = "_invalid"
+
+
+def _parse_json_line(line):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return {INVALID: f"invalid JSON: {e}", "value": line.strip()}
+
+
+# Characters read at a time from a .json file
+JSON_READ_SIZE = 1 << 16
+
+# Longest record read from a .json file; a longer one is rejected and skipped
+JSON_MAX_RECORD_SIZE = 1 << 24
+
+# Characters of a record that could not be parsed kept as its "value" in the rejects file
+JSON_REJECT_EXCERPT = 200
+
+_json_decoder = json.JSONDecoder()
+
+
+# Whether decoding stopped at the end of the text read so far, so more of the file may complete
+# the record: at the very end, in a literal cut short ("tru") or in an unterminated string
+def _json_truncated(error):
+    return error.pos >= len(error.doc) - len("Infinity") or error.msg.startswith("Unterminated string")
+
+
+# (element number, value) pairs of the top-level array of a .json file, parsed one element at a
+# time so only the element being read is held in memory. An element that is not valid JSON is
+# returned as an INVALID record and skipped up to the next top-level ',' or ']'; if the file
+# ends first, the elements read so far are all there is.
+def _iter_json_array(jsonfile):
+    buffer, position, eof = "", 0, False
+
+    # Next non-space character, reading more of the file as needed ("" at the end of the file)
+    def peek():
+        nonlocal buffer, position, eof
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer) or eof:
+                return buffer[position:position + 1]
+            buffer, position = jsonfile.read(JSON_READ_SIZE), 0
+            eof = not buffer
+
+    # Move past the element starting at position to the ',' or ']' ending it (or to the end of the
+    # file), reading on without keeping what was skipped
+    def skip_element():
+        nonlocal buffer, position, eof
+        depth, in_string, escaped = 0, False, False
+        while True:
+            for index in range(position, len(buffer)):
+                char = buffer[index]
+                if in_string:
+                    if escaped:
+                        escaped = False
+                    elif char == "\\":
+                        escaped = True
+                    elif char == '"':
+                        in_string = False
+                elif char == '"':
+                    in_string = True
+                elif char in "[{":
+                    depth += 1
+                elif depth == 0 and char in ",]":
+                    position = index
+                    return
+                elif char in "]}":
+                    depth = max(depth - 1, 0)
+            if eof:
+                position = len(buffer)
+                return
+            buffer, position = jsonfile.read(JSON_READ_SIZE), 0
+            eof = not buffer
+
+    def rejected(reason):
+        nonlocal skipped
+        skipped = True
+        excerpt = buffer[position:position + JSON_REJECT_EXCERPT]
+        skip_element()
+        return {INVALID: reason, "value": excerpt}
+
+    if peek() != "[":
+        raise ValueError("a .json import file must hold an array of records")
+    position += 1
+    number, skipped = 0, False
+    while True:
+        separator = peek()
+        if separator == "]":
+            position += 1
+            if peek():
+                yield number + 1, {INVALID: "unexpected data after the array",
+                                   "value": buffer[position:position + JSON_REJECT_EXCERPT]}
+            return
+        if not separator:
+            # Unless the last element already ran to the end of the file and was rejected
+            if number and not skipped:
+                yield number + 1, {INVALID: "the file ends before the array is closed", "value": ""}
+            return
+        number, skipped = number + 1, False
+        if number > 1:
+            if separator != ",":
+                yield number, rejected(f"invalid JSON after record {number - 1}: expected ',' or ']'")
+                continue
+            position += 1
+            peek()
+        while True:
+            try:
+                value, end = _json_decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as e:
+                if eof or not _json_truncated(e):
+                    value = rejected(f"invalid JSON: {e}")
+                    break
+            else:
+                # Complete once followed by a delimiter: "2" may be the start of "2.5"
+                if eof or (end < len(buffer) and (buffer[end] in ",]" or buffer[end].isspace())):
+                    position = end
+                    break
+            if len(buffer) - position > JSON_MAX_RECORD_SIZE:
+                value = rejected(f"record is longer than {JSON_MAX_RECORD_SIZE:,} characters")
+                break
+            more = jsonfile.read(JSON_READ_SIZE)
+            eof = not more
+            buffer, position = buffer[position:] + more, 0
+        yield number, value
+
+
+# (line number, record dict) pairs from a .csv, .json (an array of objects) or .jsonl file,
+# read as a stream; for .json the number is the record's position in the array.
+# A JSON invoice with a "lines" list is flattened into one record per line, the invoice
+# fields repeated on each, so it is validated the same way as CSV input.
+def read_records(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        with open(path, newline='', encoding='utf-8-sig') as csvfile:
+            reader = csv.DictReader(csvfile)
+            for record in reader:
+                yield reader.line_num, {_field_name(key): value for key, value in record.items() if key is not None}
+    elif extension in (".json", ".jsonl"):
+        with open(path, encoding='utf-8') as jsonfile:
+            if extension == ".json":
+                numbered = _iter_json_array(jsonfile)
+            else:
+                numbered = ((number, _parse_json_line(line)) for number, line in enumerate(jsonfile, start=1)
+                            if line.strip())
+            for number, record in numbered:
+                if not isinstance(record, dict):
+                    yield number, {INVALID: "not a JSON object", "value": record}
+                    continue
+                record = {_field_name(key): value for key, value in record.items()}
+                lines = record.pop("lines", None)
+                if isinstance(lines, list) and lines:
+                    for line in lines:
+                        if isinstance(line, dict):
+                            yield number, {**record, **{_field_name(key): value for key, value in line.items()}}
+                        else:
+                            # Rejects the whole invoice, as its lines share the record number
+                            yield number, {**record, INVALID: "invoice line is not a JSON object", "value": line}
+                else:
+                    yield number, record
+    else:
+        raise ValueError(f"Unsupported import file type: {extension or path}")
+
+
+# Rejected records with the reason, written next to the input in its own format. The file is
+# only created once the first record is rejected.
+class RejectsWriter:
+    def __init__(self, path, json_format):
+        self.path = path
+        self.json_format = json_format
+        self.count = 0
+        self._file = None
+        self._writer = None
+
+    def write(self, line_number, record, error):
+        record = {key: value for key, value in record.items() if key != INVALID}
+        if self._file is None:
+            self._file = open(self.path, 'w', newline='', encoding='utf-8')
+            if not self.json_format:
+                fieldnames = ["line", "error"] + [key for key in record if key not in ("line", "error")]
+                self._writer = csv.DictWriter(self._file, fieldnames, restval="", extrasaction="ignore")
+                self._writer.writeheader()
+        if self.json_format:
+            self._file.write(json.dumps({"_line": line_number, "_error": error, **record}, default=str) + "\n")
+        else:
+            self._writer.writerow({**record, "line": line_number, "error": error})
+        self.count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def default_rejects_path(path):
+    stem, extension = os.path.splitext(path)
+    return f"{stem}.rejects.{'csv' if extension.lower() == '.csv' else 'jsonl'}"
+
+
+def _amount_cents(text, field):
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f"{field} must be a number, got {text!r}")
+    if not amount.is_finite() or amount < 0:
+        raise ValueError(f"{field} must be a non-negative amount, got {text!r}")
+    return to_cents(amount)
+
+
+def validate_client(record):
+    row = tuple(_text(record, field) for field in CLIENT_FIELDS)
+    if not row[0]:
+        raise ValueError("name is required")
+    return row
+
+
+def validate_item(record):
+    name = _text(record, "name")
+    if not name:
+        raise ValueError("name is required")
+    return name, _amount_cents(_text(record, "unit_price"), "unit_price")
+
+
+# Resolves client names and catalog item names against what is already in the database
+class InvoiceValidator:
+    def __init__(self, repository, tax_rate):
+        self.clients = ClientIndex(repository.list_clients())
+        self.items = {}
+        for item in repository.list_line_items():
+            self.items.setdefault(normalize_name(item.name), item)
+        self.tax_rate = tax_rate
+
+    def client_id(self, record):
+        client_id = _text(record, "client_id")
+        if client_id:
+            if not client_id.isdigit() or self.clients.get(int(client_id)) is None:
+                raise ValueError(f"unknown client_id {client_id!r}")
+            return int(client_id)
+        name = _text(record, "client")
+        if not name:
+            raise ValueError("client or client_id is required")
+        matches = self.clients.find_by_name(name)
+        if not matches:
+            raise ValueError(f"unknown client {name!r}")
+        if len(matches) > 1:
+            raise ValueError(f"client name {name!r} is shared by {len(matches)} clients; use client_id")
+        return matches[0].id
+
+    def line(self, record):
+        item = None
+        item_name = _text(record, "item")
+        if item_name:
+            item = self.items.get(normalize_name(item_name))
+            if item is None:
+                raise ValueError(f"unknown catalog item {item_name!r}")
+        description = _text(record, "description") or (item.name if item else "")
+        if not description:
+            raise ValueError("item or description is required")
+        try:
+            qty = float(_text(record, "qty"))
+        except ValueError:
+            raise ValueError(f"qty must be a number, got {_text(record, 'qty')!r}")
+        if not math.isfinite(qty) or qty <= 0:
+            raise ValueError("qty must be greater than zero")
+        price_text = _text(record, "unit_price")
+        if price_text:
+            unit_price = _amount_cents(price_text, "unit_price")
+        elif item is not None:
+            unit_price = item.unit_price_cents
+        else:
+            raise ValueError("unit_price is required for lines without a catalog item")
+        return InvoiceLine(item.id if item else None, description, qty, unit_price, line_total_cents(qty, unit_price))
+
+    # One invoice from its group of line records; any bad line rejects the whole invoice
+    def invoice(self, records):
+        first = records[0]
+        client_id = self.client_id(first)
+        date = _text(first, "date")
+        try:
+            datetime.strptime(date, "%Y-%m-%d")
+        except ValueError:
+            raise ValueError(f"date must be YYYY-MM-DD, got {date!r}")
+        status = _text(first, "status").lower() or "unpaid"
+        if status not in ("paid", "unpaid"):
+            raise ValueError(f"status must be paid or unpaid, got {status!r}")
+        lines = [self.line(record) for record in records]
+        subtotal = sum(line.total_cents for line in lines)
+        # Historical invoices keep the tax they were issued with when the file has it
+        tax_text = _text(first, "tax")
+        tax = _amount_cents(tax_text, "tax") if tax_text else tax_cents(subtotal, self.tax_rate)
+        return client_id, date, status, subtotal, tax, subtotal + tax, lines
+
+
+# Adjacent records sharing an "invoice" reference are lines of one invoice; records
+# without a reference are single-line invoices
+def _group_invoices(records):
+    groups = groupby(records, key=lambda numbered: _text(numbered[1], "invoice") or ("line", numbered[0]))
+    for reference, group in groups:
+        yield list(group)
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Import clients, catalog items or invoices from a CSV/JSON file on a dedicated connection.
+# Records are validated and written chunk_size at a time, each chunk with executemany in one
+# transaction; invalid records go to a rejects file instead of stopping the import. Counts are
+# of input records, so an invoice counts once per line.
+# With defer_indexes the indexes and triggers are dropped for the load and rebuilt once at the end.
+# Safe to run off the Tk thread; progress(imported, rejected) is called after each chunk.
+def import_file(db_path, kind, path, rejects_path=None, chunk_size=IMPORT_CHUNK_SIZE, tax_rate=DEFAULT_TAX_RATE,
+                defer_indexes=False, progress=None, profile=DEFAULT_PROFILE):
+    if kind not in IMPORT_KINDS:
+        raise ValueError(f"Unknown import kind: {kind}")
+    rejects_path = rejects_path or default_rejects_path(path)
+    rejects = RejectsWriter(rejects_path, not path.lower().endswith(".csv"))
+    imported = 0
+    start = time.perf_counter()
+
+    with InvoiceRepository(db_path, profile) as repository:
+        records = read_records(path)
+        if kind == "clients":
+            validate, write, batches = validate_client, repository.add_clients, _chunks(records, chunk_size)
+        elif kind == "items":
+            validate, write, batches = validate_item, repository.add_line_items, _chunks(records, chunk_size)
+        else:
+            validator = InvoiceValidator(repository, tax_rate)
+            # Chunks hold whole invoices; at a few lines each that is roughly chunk_size records
+            validate, write = validator.invoice, repository.add_invoices
+            batches = _chunks(_group_invoices(records), max(1, chunk_size // 4))
+
+        try:
+            with (repository.deferred_maintenance() if defer_indexes else nullcontext()):
+                for batch in batches:
+                    rows = []
+                    for entry in batch:
+                        # Invoices are validated as a group of line records, the rest one record at a time
+                        numbered = entry if kind == "invoices" else [entry]
+                        try:
+                            for number, record in numbered:
+                                if INVALID in record:
+                                    raise ValueError(record[INVALID])
+                            rows.append(validate([record for number, record in numbered] if kind == "invoices"
+                                                 else entry[1]))
+                        except ValueError as e:
+                            for number, record in numbered:
+                                rejects.write(number, record, str(e))
+                        else:
+                            imported += len(numbered)
+                    write(rows)
+                    if progress:
+                        progress(imported, rejects.count)
+        finally:
+            rejects.close()
+
+    return ImportResult(kind, imported, rejects.count, time.perf_counter() - start,
+                        rejects_path if rejects.count else None)
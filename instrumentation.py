@@ -0,0 +1,265 @@
+import atexit
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+# Opt-in profiling: per-statement SQL timings, wall time of GUI handlers and Tk widget counts,
+# aggregated in memory and written to a JSON file on exit. Turned on with --instrument or by
+# setting PYINV_INSTRUMENT (to 1, or to the path of the stats file).
+
+INSTRUMENT_ENV = "PYINV_INSTRUMENT"
+STATS_PATH = "instrumentation.json"
+
+# Samples kept per metric for the percentiles; count, total and max are always exact
+SAMPLES_KEPT = 2000
+
+# SQL is labelled by its text with whitespace collapsed, cut to this length
+SQL_LABEL_LENGTH = 300
+
+
+def sql_label(sql):
+    label = " ".join(sql.split())
+    return label if len(label) <= SQL_LABEL_LENGTH else label[:SQL_LABEL_LENGTH - 3] + "..."
+
+
+# Nearest-rank percentile of sorted samples
+def _percentile(samples, fraction):
+    return samples[min(len(samples) - 1, max(0, round(fraction * len(samples)) - 1))]
+
+
+class Metric:
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.samples = deque(maxlen=SAMPLES_KEPT)
+
+    def add(self, ms):
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.samples.append(ms)
+
+    def summary(self):
+        samples = sorted(self.samples)
+        return {"count": self.count, "total_ms": round(self.total_ms, 3),
+                "p50_ms": round(_percentile(samples, 0.5), 3), "p95_ms": round(_percentile(samples, 0.95), 3),
+                "max_ms": round(self.max_ms, 3)}
+
+
+# Timings and counters by category ("sql", "handler", "tk.widgets", ...) and name; safe to
+# update from the database worker and the Tk thread at once
+class Instrumentation:
+    def __init__(self, path=STATS_PATH):
+        self.path = path
+        self.started = datetime.now().isoformat(timespec="seconds")
+        self._timings = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def record(self, category, name, ms):
+        with self._lock:
+            metric = self._timings.setdefault(category, {}).get(name)
+            if metric is None:
+                metric = self._timings[category][name] = Metric()
+            metric.add(ms)
+
+    def count(self, category, name, amount=1):
+        with self._lock:
+            counters = self._counters.setdefault(category, {})
+            counters[name] = counters.get(name, 0) + amount
+
+    @contextmanager
+    def timed(self, category, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(category, name, (time.perf_counter() - start) * 1000)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "started": self.started,
+                "saved": datetime.now().isoformat(timespec="seconds"),
+                "timings": {category: {name: metric.summary() for name, metric in metrics.items()}
+                            for category, metrics in self._timings.items()},
+                "counters": {category: dict(counters) for category, counters in self._counters.items()},
+            }
+
+    def save(self, path=None):
+        path = path or self.path
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        return path
+
+    # Replace methods of cls with wrappers timing each call under "handler"; done before the
+    # class is instantiated so Tk commands and bindings pick up the wrappers
+    def wrap_methods(self, cls, names):
+        for name in names:
+            setattr(cls, name, self._timed_method(f"{cls.__name__}.{name}", getattr(cls, name)))
+
+    def _timed_method(self, label, method):
+        @functools.wraps(method)
+        def timed_method(*args, **kwargs):
+            with self.timed("handler", label):
+                return method(*args, **kwargs)
+        return timed_method
+
+    # Count widget creations by class and Treeview row inserts, moves and deletes
+    def instrument_tk(self):
+        import tkinter
+        from tkinter import ttk
+
+        widget_init = tkinter.BaseWidget.__init__
+
+        def counted_init(widget, *args, **kwargs):
+            self.count("tk.widgets", type(widget).__name__)
+            widget_init(widget, *args, **kwargs)
+
+        tkinter.BaseWidget.__init__ = counted_init
+
+        for operation in ("insert", "move", "delete"):
+            setattr(ttk.Treeview, operation, self._counted_operation(operation, getattr(ttk.Treeview, operation)))
+
+    def _counted_operation(self, operation, original):
+        @functools.wraps(original)
+        def counted(tree, *args, **kwargs):
+            # delete() takes any number of items; the others act on one
+            self.count("tk.treeview", operation, len(args) if operation == "delete" else 1)
+            return original(tree, *args, **kwargs)
+        return counted
+
+
+# Cursor that times execute plus the fetches that finish reading its rows, recording one
+# sample per statement once the rows are exhausted or the cursor is re-executed or dropped.
+# It also counts the statements SQLite ran for it, which includes the bodies of any triggers.
+class InstrumentedCursor(sqlite3.Cursor):
+    _label = None
+    _elapsed = 0.0
+    _traced = 0
+
+    def _start(self, sql):
+        self._flush()
+        self._label = sql_label(sql)
+        self._traced = self.connection.traced
+
+    def _flush(self):
+        if self._label is not None and _active is not None:
+            _active.record("sql", self._label, self._elapsed * 1000)
+            _active.count("sql.statements", self._label, self.connection.traced - self._traced)
+        self._label = None
+        self._elapsed = 0.0
+
+    def _timed(self, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self._elapsed += time.perf_counter() - start
+
+    def execute(self, sql, parameters=()):
+        self._start(sql)
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._start(sql)
+        result = self._timed(super().executemany, sql, seq_of_parameters)
+        self._flush()
+        return result
+
+    def executescript(self, sql_script):
+        self._start(sql_script)
+        result = self._timed(super().executescript, sql_script)
+        self._flush()
+        return result
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._flush()
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, self.arraysize if size is None else size)
+        if not rows:
+            self._flush()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self._flush()
+        return rows
+
+    def __next__(self):
+        try:
+            return self._timed(super().__next__)
+        except StopIteration:
+            self._flush()
+            raise
+
+    def close(self):
+        self._flush()
+        super().close()
+
+    def __del__(self):
+        self._flush()
+
+
+# Connection whose cursors, including those made by Connection.execute, are instrumented. The
+# trace callback counts every statement SQLite runs, including each statement of a trigger.
+class InstrumentedConnection(sqlite3.Connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.traced = 0
+        self.set_trace_callback(self._trace)
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # The built-in shortcuts make a plain cursor, so route them through cursor()
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def _trace(self, statement):
+        self.traced += 1
+
+
+_active = None
+
+
+def active():
+    return _active
+
+
+def enable(path=STATS_PATH):
+    global _active
+    if _active is None:
+        _active = Instrumentation(path)
+        atexit.register(_active.save)
+    return _active
+
+
+# PYINV_INSTRUMENT=1 writes to STATS_PATH; any other value is taken as the stats file path
+def enable_from_environment():
+    value = os.environ.get(INSTRUMENT_ENV, "").strip()
+    if value and value.lower() not in ("0", "false", "no", "off"):
+        return enable(STATS_PATH if value.lower() in ("1", "true", "yes", "on") else value)
+    return None
+
+
+# sqlite3.connect(factory=...) for new connections: instrumented only while enabled
+def connection_factory():
+    return InstrumentedConnection if _active is not None else sqlite3.Connection
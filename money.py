@@ -0,0 +1,42 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# Amounts are stored and summed as integer cents; Decimal is only used at the edges
+# (user input, tax rates, display) so no float rounding reaches the database.
+
+# GST rate applied when no tax rate is set in the preferences
+DEFAULT_TAX_RATE = Decimal("0.05")
+
+
+# Round a Decimal to a whole number of cents, halves away from zero
+def _round_cents(amount):
+    return int(amount.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+# Dollars (str, int, float or Decimal) to integer cents
+def to_cents(amount):
+    return _round_cents(Decimal(str(amount)) * 100)
+
+
+def from_cents(cents):
+    return Decimal(cents) / 100
+
+
+# "1234.50" for 123450
+def format_cents(cents):
+    return f"{from_cents(cents):.2f}"
+
+
+def line_total_cents(qty, unit_price_cents):
+    return _round_cents(Decimal(str(qty)) * unit_price_cents)
+
+
+def tax_cents(subtotal_cents, tax_rate):
+    return _round_cents(subtotal_cents * Decimal(tax_rate))
+
+
+# The tax rate is kept in the preferences as a percentage, e.g. "5" for 5%
+def tax_rate_from_preferences(preferences):
+    try:
+        return Decimal(str(preferences['tax_rate'])) / 100
+    except (KeyError, InvalidOperation):
+        return DEFAULT_TAX_RATE
@@ -0,0 +1,16 @@
+import json
+import os
+
+PREFERENCES_PATH = "preferences.json"
+
+
+def load_preferences(path=PREFERENCES_PATH):
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return {}
+
+
+def save_preferences(preferences, path=PREFERENCES_PATH):
+    with open(path, 'w') as f:
+        json.dump(preferences, f)
@@ -0,0 +1,410 @@
+import hashlib
+import html
+import json
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+from itertools import islice
+
+from money import format_cents
+
+# {{name}} placeholders in the invoice template
+PLACEHOLDER_PATTERN = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+
+# Files referenced by invoice.html that must sit next to rendered output
+INVOICE_ASSETS = ("invoice.css", "heart.png")
+
+# Bump when render_invoice_html changes its output, so cached renders are not reused
+RENDER_VERSION = 1
+
+# Preferences that appear on a rendered invoice
+RENDER_PREFERENCES = ("company_name", "company_address", "company_city", "company_state", "company_postal",
+                      "gst_number", "company_phone", "company_email", "company_website")
+
+# Rendered invoices are cached here, bounded to RENDER_CACHE_MAX_BYTES by evicting the least recently used
+RENDER_CACHE_DIR = "rendered"
+RENDER_CACHE_MAX_BYTES = 64 * 1024 * 1024
+CACHE_FILE_PATTERN = re.compile(r"invoice_(\d+)_[0-9a-f]+\.html$")
+
+# Batches of fewer cache misses than this are rendered in-process rather than starting a process pool
+INLINE_RENDER_LIMIT = 8
+
+# Invoices looked up in the cache and rendered at a time, so a cached batch is streamed, not held whole
+RENDER_CHUNK_SIZE = 1024
+
+PAGE_BREAK_STYLE = """<style>
+        .invoice-page { break-after: page; page-break-after: always; }
+        .invoice-page:last-child { break-after: auto; page-break-after: auto; }
+    </style>
+"""
+
+
+# Already-rendered HTML that must not be escaped again
+class Markup(str):
+    pass
+
+
+# Shared by the Tk thread and the database worker, so a reload happens under a lock
+class InvoiceTemplate:
+    def __init__(self, path):
+        self.path = path
+        self.mtime = None
+        self.segments = []
+        self.version = None
+        self._lock = threading.Lock()
+
+    # Split the source into alternating literal and placeholder segments
+    @staticmethod
+    def compile(source):
+        return PLACEHOLDER_PATTERN.split(source)
+
+    # Recompile only when the file changed on disk since the last load. Returns the segments
+    # and version as one consistent pair.
+    def reload_if_changed(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        with self._lock:
+            if mtime != self.mtime:
+                with open(self.path, 'r') as file:
+                    source = file.read()
+                self.segments = self.compile(source)
+                self.version = hashlib.sha256(source.encode()).hexdigest()
+                self.mtime = mtime
+            return self.segments, self.version
+
+    # Render the whole document in one pass, escaping every value that is not Markup
+    def render(self, context):
+        segments = self.reload_if_changed()[0]
+        parts = list(segments)
+        for i in range(1, len(parts), 2):
+            value = context.get(parts[i])
+            if value is None:
+                parts[i] = ""
+            elif isinstance(value, Markup):
+                parts[i] = value
+            else:
+                parts[i] = html.escape(str(value))
+        return "".join(parts)
+
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+# Compiled templates are cached per path for the life of the process
+def get_template(path="invoice.html"):
+    with _templates_lock:
+        template = _templates.get(path)
+        if template is None:
+            template = _templates[path] = InvoiceTemplate(path)
+        return template
+
+
+def render_line_items(lines):
+    rows = []
+    for line in lines:
+        rows.append(
+            "<tr>"
+            f"<td>{line.qty:g}</td>"
+            f"<td>{html.escape(str(line.description))}</td>"
+            f"<td class=\"right\">${format_cents(line.unit_price_cents)}</td>"
+            f"<td class=\"right\">${format_cents(line.total_cents)}</td>"
+            "</tr>"
+        )
+    return Markup("\n".join(rows))
+
+
+# Render an Invoice (with its client and lines) to HTML
+def render_invoice_html(invoice, preferences, template_path="invoice.html"):
+    invoice_date = datetime.strptime(invoice.date, "%Y-%m-%d")
+    due_date = invoice_date + timedelta(days=30)
+
+    context = {
+        "invoice_number": invoice.id,
+        "invoice_date": invoice_date.strftime("%B %d, %Y"),
+        "due_date": due_date.strftime("%B %d, %Y"),
+        "client_name": invoice.client.name,
+        "client_address": invoice.client.billing_address,
+        "client_contact": invoice.client.contact_name,
+        "client_phone": invoice.client.phone_number,
+        "client_email": invoice.client.email,
+        "company_name": preferences.get('company_name', 'Your Company Name'),
+        "company_address": preferences.get('company_address', 'Your Company Address'),
+        "company_city": preferences.get('company_city', ''),
+        "company_state": preferences.get('company_state', ''),
+        "company_postal": preferences.get('company_postal', ''),
+        "gst_number": preferences.get('gst_number', ''),
+        "company_phone": preferences.get('company_phone', ''),
+        "company_email": preferences.get('company_email', ''),
+        "company_website": preferences.get('company_website', ''),
+        "line_items": render_line_items(invoice.lines),
+        "subtotal": f"${format_cents(invoice.subtotal_cents)}",
+        "tax": f"${format_cents(invoice.tax_cents)}",
+        "total": f"${format_cents(invoice.total_cents)}"
+    }
+
+    return get_template(template_path).render(context)
+
+
+# Content-addressed cache of rendered invoices in a directory of invoice_<id>_<digest>.html files.
+# The digest hashes everything the output depends on, so a changed invoice, client, preference or
+# template simply misses; the superseded file of that invoice is removed when the new one is stored.
+# File mtimes record last use, so the least recently used files are evicted first across runs.
+class RenderCache:
+    def __init__(self, directory=RENDER_CACHE_DIR, max_bytes=RENDER_CACHE_MAX_BYTES, template_path="invoice.html"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.template_path = template_path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        copy_invoice_assets(directory, template_path)
+
+        # File name -> size, least recently used first, and the current file of each invoice
+        self._entries = OrderedDict()
+        self._by_invoice = {}
+        self._total_bytes = 0
+        files = []
+        for entry in os.scandir(directory):
+            match = CACHE_FILE_PATTERN.match(entry.name)
+            if match:
+                stat = entry.stat()
+                files.append((stat.st_mtime_ns, entry.name, stat.st_size, int(match.group(1))))
+        with self._lock:
+            for mtime, name, size, invoice_id in sorted(files):
+                self._add(invoice_id, name, size)
+            self._evict()
+
+    def key(self, invoice, preferences):
+        version = get_template(self.template_path).reload_if_changed()[1]
+        inputs = [RENDER_VERSION, version, invoice, [preferences.get(name) for name in RENDER_PREFERENCES]]
+        return hashlib.sha256(json.dumps(inputs, default=str).encode()).hexdigest()[:32]
+
+    def path(self, invoice_id, key):
+        return os.path.join(self.directory, f"invoice_{invoice_id}_{key}.html")
+
+    # Path of the cached render, marking it as just used, or None on a miss
+    def lookup(self, invoice_id, key):
+        name = os.path.basename(self.path(invoice_id, key))
+        with self._lock:
+            if name not in self._entries:
+                self.misses += 1
+                return None
+            try:
+                os.utime(self.path(invoice_id, key))
+            except FileNotFoundError:
+                self._forget(name)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(name)
+            self.hits += 1
+            return self.path(invoice_id, key)
+
+    def get(self, invoice_id, key):
+        path = self.lookup(invoice_id, key)
+        if path is None:
+            return None
+        try:
+            with open(path, "r") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, invoice_id, key, document):
+        path = self.path(invoice_id, key)
+        name = os.path.basename(path)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "w") as file:
+            file.write(document)
+        os.replace(temporary, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            self._add(invoice_id, name, size)
+            self._evict()
+        return path
+
+    # Record a file as the most recently used; an earlier render of the same invoice can never
+    # be hit again, so it is removed
+    def _add(self, invoice_id, name, size):
+        stale = self._by_invoice.get(invoice_id)
+        if stale is not None and stale != name:
+            self._remove(stale)
+        self._forget(name)
+        self._entries[name] = size
+        self._by_invoice[invoice_id] = name
+        self._total_bytes += size
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            self._remove(next(iter(self._entries)))
+
+    def _forget(self, name):
+        size = self._entries.pop(name, None)
+        if size is not None:
+            self._total_bytes -= size
+            invoice_id = int(CACHE_FILE_PATTERN.match(name).group(1))
+            if self._by_invoice.get(invoice_id) == name:
+                del self._by_invoice[invoice_id]
+
+    def _remove(self, name):
+        self._forget(name)
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+
+    # Path of the rendered invoice, rendering and storing it only if it is not cached
+    def render(self, invoice, preferences):
+        key = self.key(invoice, preferences)
+        path = self.lookup(invoice.id, key)
+        if path is None:
+            path = self.put(invoice.id, key, render_invoice_html(invoice, preferences, self.template_path))
+        return path
+
+
+# Worker-process state for batch rendering, set once per process
+_worker_preferences = {}
+_worker_template_path = "invoice.html"
+
+
+def _init_render_worker(preferences, template_path):
+    global _worker_preferences, _worker_template_path
+    _worker_preferences = preferences
+    _worker_template_path = template_path
+
+
+def _render_job(invoice):
+    return invoice.id, render_invoice_html(invoice, _worker_preferences, _worker_template_path)
+
+
+# Render Invoices across a process pool, yielding (invoice_id, html) in input order. With a cache,
+# invoices are taken RENDER_CHUNK_SIZE at a time and only those not already cached are rendered
+# (and stored); a chunk with only a handful of misses is rendered in-process, and the pool is only
+# started for the first chunk that needs it.
+def render_invoices(invoices, preferences, template_path="invoice.html", max_workers=None, chunksize=32, cache=None):
+    if cache is None:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_render_worker,
+                                 initargs=(preferences, template_path)) as executor:
+            yield from executor.map(_render_job, invoices, chunksize=chunksize)
+        return
+
+    invoices = iter(invoices)
+    with ExitStack() as stack:
+        executor = None
+        while True:
+            chunk = list(islice(invoices, RENDER_CHUNK_SIZE))
+            if not chunk:
+                return
+            # (invoice, key, cached path) for every invoice of the chunk, plus the invoices to render
+            entries, misses = [], []
+            for invoice in chunk:
+                key = cache.key(invoice, preferences)
+                path = cache.lookup(invoice.id, key)
+                entries.append((invoice, key, path))
+                if path is None:
+                    misses.append(invoice)
+
+            if len(misses) < INLINE_RENDER_LIMIT:
+                rendered = ((invoice.id, render_invoice_html(invoice, preferences, template_path))
+                            for invoice in misses)
+            else:
+                if executor is None:
+                    executor = stack.enter_context(ProcessPoolExecutor(
+                        max_workers=max_workers, initializer=_init_render_worker, initargs=(preferences, template_path)))
+                rendered = executor.map(_render_job, misses, chunksize=chunksize)
+            yield from _merge_cached(entries, rendered, preferences, template_path, cache)
+
+
+# Interleave freshly rendered misses (storing them) with cached documents, in input order
+def _merge_cached(entries, rendered, preferences, template_path, cache):
+    for invoice, key, path in entries:
+        document = None
+        if path is not None:
+            try:
+                with open(path, "r") as file:
+                    document = file.read()
+            except FileNotFoundError:
+                # Evicted since the lookup, e.g. by this batch outgrowing the cache
+                document = render_invoice_html(invoice, preferences, template_path)
+        else:
+            invoice_id, document = next(rendered)
+            cache.put(invoice_id, key, document)
+        yield invoice.id, document
+
+
+# Copy the stylesheet and images the template links to next to the rendered output
+def copy_invoice_assets(output_dir, template_path="invoice.html"):
+    source_dir = os.path.dirname(os.path.abspath(template_path))
+    for asset in INVOICE_ASSETS:
+        source = os.path.join(source_dir, asset)
+        target = os.path.join(os.path.abspath(output_dir), asset)
+        if os.path.exists(source) and source != target:
+            shutil.copy(source, target)
+
+
+def write_invoice_files(rendered, output_dir, template_path="invoice.html"):
+    os.makedirs(output_dir, exist_ok=True)
+    copy_invoice_assets(output_dir, template_path)
+    paths = []
+    for invoice_id, document in rendered:
+        path = os.path.join(output_dir, f"invoice_{invoice_id}.html")
+        with open(path, "w") as file:
+            file.write(document)
+        paths.append(path)
+    return paths
+
+
+# Stream rendered invoices into one printable document, one invoice per page
+def write_combined_invoice(rendered, path, template_path="invoice.html"):
+    output_dir = os.path.dirname(os.path.abspath(path))
+    os.makedirs(output_dir, exist_ok=True)
+    copy_invoice_assets(output_dir, template_path)
+    count = 0
+    with open(path, "w") as file:
+        for invoice_id, document in rendered:
+            body_start = document.index(">", document.index("<body")) + 1
+            body_end = document.rindex("</body>")
+            if count == 0:
+                head = document[:body_start]
+                file.write(head.replace("</head>", PAGE_BREAK_STYLE + "</head>", 1))
+                tail = document[body_end:]
+            file.write(f'<div class="invoice-page" id="invoice-{invoice_id}">')
+            file.write(document[body_start:body_end])
+            file.write("</div>\n")
+            count += 1
+        if count:
+            file.write(tail)
+    return count
+
+
+# Pass rendered invoices through, calling progress(count) after each one
+def _counted(rendered, progress):
+    for count, item in enumerate(rendered, 1):
+        yield item
+        progress(count)
+
+
+# Render the selected (or all filtered) invoices in parallel into output_dir and/or one combined
+# document; progress(rendered) is called as they are done
+def render_invoice_batch(repository, invoice_filter, preferences, invoice_ids=None, output_dir=None,
+                         combined_path=None, max_workers=None, template_path="invoice.html", cache=None,
+                         progress=None):
+    invoices = repository.iter_invoices(invoice_filter, invoice_ids)
+    rendered = render_invoices(invoices, preferences, template_path, max_workers=max_workers, cache=cache)
+    if progress:
+        rendered = _counted(rendered, progress)
+
+    if output_dir and combined_path:
+        rendered = list(rendered)
+    count = 0
+    if output_dir:
+        count = len(write_invoice_files(rendered, output_dir, template_path))
+    if combined_path:
+        count = write_combined_invoice(rendered, combined_path, template_path)
+    return count
@@ -0,0 +1,1492 @@
+import os
+import re
+import sqlite3
+import string
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import List, NamedTuple, Optional
+
+from instrumentation import connection_factory
+from money import DEFAULT_TAX_RATE, tax_cents
+
+DB_PATH = "invoices.db"
+
+# Paid invoices older than this many days are moved to the archive by archive_invoices()
+ARCHIVE_AFTER_DAYS = 365
+
+# Invoices moved to the archive per transaction
+ARCHIVE_BATCH_SIZE = 500
+
+# Day number stored for unknown dates in analytics rows (see analytics_invoice_rows())
+MISSING_DAY = -2147483648
+
+# Ids bound per IN (...) list, well under SQLite's limit on host parameters
+ID_BATCH_SIZE = 500
+
+# Number of invoices fetched per page of the invoice list
+INVOICE_PAGE_SIZE = 200
+
+# Catalog items as (name, unit price in cents)
+DEFAULT_LINE_ITEMS = [
+    ("38 Meter pump rental hourly (3 hr minimum)", 23000),
+    ("Meters of pumped concrete", 500),
+    ("Offsite wash out fee", 15000),
+    ("Travel time hourly", 23000),
+    ("Slurry", 4000),
+    ("Ferry fees incurred", 11305),
+]
+
+# Statements shared by the invoice_search triggers and the index rebuild
+SEARCH_ROW_INSERT = """INSERT INTO invoice_search (rowid, client_name, contact_name, email, billing_address, descriptions)
+        SELECT invoices.id, clients.name, clients.contact_name, clients.email, clients.billing_address,
+               (SELECT group_concat(description, ' ') FROM invoice_lines WHERE invoice_id = invoices.id)
+        FROM invoices LEFT JOIN clients ON clients.id = invoices.client_id
+        WHERE invoices.id = {invoice_id}"""
+
+SEARCH_DESCRIPTIONS_UPDATE = """UPDATE invoice_search
+        SET descriptions = (SELECT group_concat(description, ' ') FROM invoice_lines WHERE invoice_id = {invoice_id})
+        WHERE rowid = {invoice_id}"""
+
+# Add or subtract one invoice row ({row} is NEW or OLD) in the reporting summaries.
+# Missing amounts count as zero, as they do while older databases are being migrated.
+SUMMARY_ADD = """INSERT INTO client_month_totals
+            (client_id, month, invoice_count, subtotal_cents, tax_cents, total_cents, paid_cents, unpaid_cents)
+        VALUES ({row}.client_id, substr({row}.date, 1, 7), 1,
+                IFNULL({row}.subtotal_cents, 0), IFNULL({row}.tax_cents, 0), IFNULL({row}.total_cents, 0),
+                CASE WHEN {row}.status = 'paid' THEN IFNULL({row}.total_cents, 0) ELSE 0 END,
+                CASE WHEN {row}.status = 'paid' THEN 0 ELSE IFNULL({row}.total_cents, 0) END)
+        ON CONFLICT (client_id, month) DO UPDATE SET
+            invoice_count = invoice_count + 1,
+            subtotal_cents = subtotal_cents + excluded.subtotal_cents,
+            tax_cents = tax_cents + excluded.tax_cents,
+            total_cents = total_cents + excluded.total_cents,
+            paid_cents = paid_cents + excluded.paid_cents,
+            unpaid_cents = unpaid_cents + excluded.unpaid_cents;
+        INSERT INTO receivables_by_date (date, invoice_count, unpaid_cents)
+        SELECT {row}.date, 1, IFNULL({row}.total_cents, 0) WHERE {row}.status <> 'paid'
+        ON CONFLICT (date) DO UPDATE SET
+            invoice_count = invoice_count + 1,
+            unpaid_cents = unpaid_cents + excluded.unpaid_cents"""
+
+SUMMARY_SUBTRACT = """UPDATE client_month_totals SET
+            invoice_count = invoice_count - 1,
+            subtotal_cents = subtotal_cents - IFNULL({row}.subtotal_cents, 0),
+            tax_cents = tax_cents - IFNULL({row}.tax_cents, 0),
+            total_cents = total_cents - IFNULL({row}.total_cents, 0),
+            paid_cents = paid_cents - CASE WHEN {row}.status = 'paid' THEN IFNULL({row}.total_cents, 0) ELSE 0 END,
+            unpaid_cents = unpaid_cents - CASE WHEN {row}.status = 'paid' THEN 0 ELSE IFNULL({row}.total_cents, 0) END
+        WHERE client_id = {row}.client_id AND month = substr({row}.date, 1, 7);
+        DELETE FROM client_month_totals
+        WHERE client_id = {row}.client_id AND month = substr({row}.date, 1, 7) AND invoice_count = 0;
+        UPDATE receivables_by_date SET
+            invoice_count = invoice_count - 1,
+            unpaid_cents = unpaid_cents - IFNULL({row}.total_cents, 0)
+        WHERE date = {row}.date AND {row}.status <> 'paid';
+        DELETE FROM receivables_by_date WHERE date = {row}.date AND invoice_count = 0"""
+
+# Current UTC time as stored in created_at, updated_at and the change log
+NOW = "strftime('%Y-%m-%dT%H:%M:%fZ', 'now')"
+
+# Summary rows (client_id, month, count and amounts) of a set of invoices
+INVOICE_MONTH_TOTALS = """
+    SELECT client_id, substr(date, 1, 7) AS month, COUNT(*) AS invoice_count,
+           COALESCE(SUM(subtotal_cents), 0) AS subtotal_cents, COALESCE(SUM(tax_cents), 0) AS tax_cents,
+           COALESCE(SUM(total_cents), 0) AS total_cents,
+           COALESCE(SUM(CASE WHEN status = 'paid' THEN total_cents ELSE 0 END), 0) AS paid_cents,
+           COALESCE(SUM(CASE WHEN status = 'paid' THEN 0 ELSE total_cents END), 0) AS unpaid_cents
+    FROM invoices
+    {where}
+    GROUP BY client_id, substr(date, 1, 7)
+"""
+
+# Full recompute of the summaries, used by rebuild_summaries() and verify_summaries().
+# Archived invoices only count through archived_month_totals, so the archive is not read.
+CLIENT_MONTH_TOTALS_QUERY = f"""
+    SELECT client_id, month, SUM(invoice_count), SUM(subtotal_cents), SUM(tax_cents), SUM(total_cents),
+           SUM(paid_cents), SUM(unpaid_cents)
+    FROM ({INVOICE_MONTH_TOTALS.format(where="")}
+          UNION ALL
+          SELECT * FROM archived_month_totals)
+    GROUP BY client_id, month
+"""
+
+RECEIVABLES_BY_DATE_QUERY = """
+    SELECT date, COUNT(*), COALESCE(SUM(total_cents), 0)
+    FROM invoices
+    WHERE status <> 'paid'
+    GROUP BY date
+"""
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS invoices (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        client_id INTEGER,
+        line_items TEXT,
+        subtotal REAL,
+        date TEXT,
+        status TEXT DEFAULT 'Unpaid',
+        subtotal_cents INTEGER,
+        tax_cents INTEGER,
+        total_cents INTEGER,
+        created_at TEXT,
+        updated_at TEXT,
+        paid_at TEXT,
+        FOREIGN KEY (client_id) REFERENCES clients (id)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS line_items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        unit_price REAL,
+        unit_price_cents INTEGER
+    )''',
+    '''CREATE TABLE IF NOT EXISTS clients (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        billing_address TEXT,
+        contact_name TEXT,
+        phone_number TEXT,
+        email TEXT
+    )''',
+    '''CREATE TABLE IF NOT EXISTS invoice_lines (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        invoice_id INTEGER NOT NULL,
+        line_item_id INTEGER,
+        description TEXT,
+        qty REAL,
+        unit_price REAL,
+        total REAL,
+        unit_price_cents INTEGER,
+        total_cents INTEGER,
+        FOREIGN KEY (invoice_id) REFERENCES invoices (id) ON DELETE CASCADE,
+        FOREIGN KEY (line_item_id) REFERENCES line_items (id) ON DELETE SET NULL
+    )''',
+    # Reporting summaries maintained by the invoices_summary_* triggers; rebuild_summaries() recomputes them
+    '''CREATE TABLE IF NOT EXISTS client_month_totals (
+        client_id INTEGER NOT NULL,
+        month TEXT NOT NULL,
+        invoice_count INTEGER NOT NULL,
+        subtotal_cents INTEGER NOT NULL,
+        tax_cents INTEGER NOT NULL,
+        total_cents INTEGER NOT NULL,
+        paid_cents INTEGER NOT NULL,
+        unpaid_cents INTEGER NOT NULL,
+        PRIMARY KEY (client_id, month)
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS receivables_by_date (
+        date TEXT PRIMARY KEY,
+        invoice_count INTEGER NOT NULL,
+        unpaid_cents INTEGER NOT NULL
+    ) WITHOUT ROWID''',
+    # Append-only log of invoice inserts, updates and deletes (tombstones), written by the
+    # invoices_changes_* triggers; seq orders the changes and is what export watermarks refer to
+    '''CREATE TABLE IF NOT EXISTS invoice_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        invoice_id INTEGER NOT NULL,
+        change TEXT NOT NULL,
+        changed_at TEXT NOT NULL
+    )''',
+    # Last change log seq exported by each named sync. Log entries are kept until every sync
+    # that holds the log has seen them.
+    '''CREATE TABLE IF NOT EXISTS export_watermarks (
+        sync TEXT PRIMARY KEY,
+        seq INTEGER NOT NULL,
+        exported_at TEXT NOT NULL,
+        holds_log INTEGER NOT NULL DEFAULT 1
+    )''',
+    # Summary totals of the invoices moved to the archive; they still count in the reports
+    '''CREATE TABLE IF NOT EXISTS archived_month_totals (
+        client_id INTEGER NOT NULL,
+        month TEXT NOT NULL,
+        invoice_count INTEGER NOT NULL,
+        subtotal_cents INTEGER NOT NULL,
+        tax_cents INTEGER NOT NULL,
+        total_cents INTEGER NOT NULL,
+        paid_cents INTEGER NOT NULL,
+        unpaid_cents INTEGER NOT NULL,
+        PRIMARY KEY (client_id, month)
+    ) WITHOUT ROWID''',
+    # The invoices being moved by archive_invoices(), only ever filled inside its transactions.
+    # Their deletion is not a delete to the summary and change log triggers.
+    '''CREATE TABLE IF NOT EXISTS archiving (
+        invoice_id INTEGER PRIMARY KEY
+    )''',
+    # The batch archive_invoices() is moving. It outlives the separate commits to the archive and
+    # main databases, so a batch interrupted between them is finished by the next run.
+    '''CREATE TABLE IF NOT EXISTS archive_batch (
+        invoice_id INTEGER PRIMARY KEY
+    )''',
+]
+
+# Cold storage in a second database file next to the main one (see archive_path()), attached
+# as "archive" only when archived invoices are asked for. Archived invoices are read-only.
+ARCHIVE_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS archive.invoices (
+        id INTEGER PRIMARY KEY,
+        client_id INTEGER,
+        subtotal_cents INTEGER,
+        tax_cents INTEGER,
+        total_cents INTEGER,
+        date TEXT,
+        status TEXT,
+        created_at TEXT,
+        updated_at TEXT,
+        archived_at TEXT,
+        paid_at TEXT
+    )''',
+    '''CREATE TABLE IF NOT EXISTS archive.invoice_lines (
+        id INTEGER PRIMARY KEY,
+        invoice_id INTEGER NOT NULL,
+        line_item_id INTEGER,
+        description TEXT,
+        qty REAL,
+        unit_price_cents INTEGER,
+        total_cents INTEGER
+    )''',
+    "CREATE INDEX IF NOT EXISTS archive.idx_invoice_lines_invoice_id ON invoice_lines (invoice_id)",
+    "CREATE INDEX IF NOT EXISTS archive.idx_invoices_client_date ON invoices (client_id, date)",
+    "CREATE INDEX IF NOT EXISTS archive.idx_invoices_date ON invoices (date)",
+    # The search rows are copied as they were when the invoice was archived
+    """CREATE VIRTUAL TABLE IF NOT EXISTS archive.invoice_search USING fts5(
+        client_name, contact_name, email, billing_address, descriptions,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )""",
+]
+
+# Columns added to the archive tables after they were first released
+ARCHIVE_ADDED_COLUMNS = [
+    ("invoices", "paid_at", "TEXT"),
+]
+
+# Columns copied to the archive, and read back from both databases when archived invoices are included
+ARCHIVE_INVOICE_COLUMNS = ("id, client_id, subtotal_cents, tax_cents, total_cents, date, status, created_at, updated_at, "
+                           "paid_at")
+ARCHIVE_LINE_COLUMNS = "id, invoice_id, line_item_id, description, qty, unit_price_cents, total_cents"
+ARCHIVE_SEARCH_COLUMNS = "client_name, contact_name, email, billing_address, descriptions"
+
+# Hot and archived rows together, under the table names the hot-only queries use
+ALL_INVOICES = (f"(SELECT {ARCHIVE_INVOICE_COLUMNS} FROM main.invoices "
+                f"UNION ALL SELECT {ARCHIVE_INVOICE_COLUMNS} FROM archive.invoices) AS invoices")
+ALL_INVOICE_LINES = (f"(SELECT {ARCHIVE_LINE_COLUMNS} FROM main.invoice_lines "
+                     f"UNION ALL SELECT {ARCHIVE_LINE_COLUMNS} FROM archive.invoice_lines) AS invoice_lines")
+
+# Columns added after the tables were first released; older databases get them with ALTER TABLE.
+# The REAL money columns (subtotal, unit_price, total) are superseded by these integer cents.
+ADDED_COLUMNS = [
+    ("invoices", "subtotal_cents", "INTEGER"),
+    ("invoices", "tax_cents", "INTEGER"),
+    ("invoices", "total_cents", "INTEGER"),
+    ("line_items", "unit_price_cents", "INTEGER"),
+    ("invoice_lines", "unit_price_cents", "INTEGER"),
+    ("invoice_lines", "total_cents", "INTEGER"),
+    ("invoices", "created_at", "TEXT"),
+    ("invoices", "updated_at", "TEXT"),
+    ("invoices", "paid_at", "TEXT"),
+    ("export_watermarks", "holds_log", "INTEGER NOT NULL DEFAULT 1"),
+]
+
+# Indexes, full-text search and triggers, created once every column exists
+SCHEMA_OBJECTS = [
+    "CREATE INDEX IF NOT EXISTS idx_invoice_lines_invoice_id ON invoice_lines (invoice_id)",
+    # Finds the lines to unlink (ON DELETE SET NULL) when a catalog item is deleted
+    "CREATE INDEX IF NOT EXISTS idx_invoice_lines_line_item_id ON invoice_lines (line_item_id)",
+    # Indexes backing the invoice list filters and the per-client invoice lookups
+    "CREATE INDEX IF NOT EXISTS idx_invoices_status_date ON invoices (status, date)",
+    "CREATE INDEX IF NOT EXISTS idx_invoices_client_date ON invoices (client_id, date)",
+    "CREATE INDEX IF NOT EXISTS idx_invoices_date ON invoices (date)",
+    # Indexes backing the sortable invoice list columns (see INVOICE_SORT_KEYS)
+    "CREATE INDEX IF NOT EXISTS idx_invoices_subtotal ON invoices (subtotal_cents)",
+    "CREATE INDEX IF NOT EXISTS idx_invoices_tax ON invoices (tax_cents)",
+    "CREATE INDEX IF NOT EXISTS idx_invoices_total ON invoices (total_cents)",
+    "CREATE INDEX IF NOT EXISTS idx_clients_sort_name ON clients (COALESCE(name, '') COLLATE NOCASE)",
+    # Superseded: idx_invoices_client_date covers client_id lookups, and client names sort with
+    # missing names as ''
+    "DROP INDEX IF EXISTS idx_invoices_client_id",
+    "DROP INDEX IF EXISTS idx_clients_name",
+    # Full-text index with one row per invoice (rowid = invoice id), kept in sync by the triggers below
+    """CREATE VIRTUAL TABLE IF NOT EXISTS invoice_search USING fts5(
+        client_name, contact_name, email, billing_address, descriptions,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS invoices_search_insert AFTER INSERT ON invoices BEGIN
+        {SEARCH_ROW_INSERT.format(invoice_id="NEW.id")};
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS invoices_search_update AFTER UPDATE OF client_id ON invoices BEGIN
+        DELETE FROM invoice_search WHERE rowid = OLD.id;
+        {SEARCH_ROW_INSERT.format(invoice_id="NEW.id")};
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS invoices_search_delete AFTER DELETE ON invoices BEGIN
+        DELETE FROM invoice_search WHERE rowid = OLD.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS clients_search_update
+    AFTER UPDATE OF name, contact_name, email, billing_address ON clients BEGIN
+        UPDATE invoice_search
+        SET client_name = NEW.name, contact_name = NEW.contact_name, email = NEW.email,
+            billing_address = NEW.billing_address
+        WHERE rowid IN (SELECT id FROM invoices WHERE client_id = NEW.id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS clients_search_delete AFTER DELETE ON clients BEGIN
+        UPDATE invoice_search
+        SET client_name = NULL, contact_name = NULL, email = NULL, billing_address = NULL
+        WHERE rowid IN (SELECT id FROM invoices WHERE client_id = OLD.id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS invoice_lines_search_insert AFTER INSERT ON invoice_lines BEGIN
+        {SEARCH_DESCRIPTIONS_UPDATE.format(invoice_id="NEW.invoice_id")};
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS invoice_lines_search_update
+    AFTER UPDATE OF invoice_id, description ON invoice_lines BEGIN
+        {SEARCH_DESCRIPTIONS_UPDATE.format(invoice_id="OLD.invoice_id")};
+        {SEARCH_DESCRIPTIONS_UPDATE.format(invoice_id="NEW.invoice_id")};
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS invoice_lines_search_delete AFTER DELETE ON invoice_lines BEGIN
+        {SEARCH_DESCRIPTIONS_UPDATE.format(invoice_id="OLD.invoice_id")};
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS invoices_summary_insert AFTER INSERT ON invoices BEGIN
+        {SUMMARY_ADD.format(row="NEW")};
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS invoices_summary_update
+    AFTER UPDATE OF client_id, date, status, subtotal_cents, tax_cents, total_cents ON invoices BEGIN
+        {SUMMARY_SUBTRACT.format(row="OLD")};
+        {SUMMARY_ADD.format(row="NEW")};
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS invoices_summary_delete AFTER DELETE ON invoices
+    WHEN OLD.id NOT IN (SELECT invoice_id FROM archiving) BEGIN
+        {SUMMARY_SUBTRACT.format(row="OLD")};
+    END""",
+    # Change tracking. Setting the timestamps does not fire the other AFTER UPDATE triggers,
+    # which are all limited to the columns they depend on.
+    f"""CREATE TRIGGER IF NOT EXISTS invoices_changes_insert AFTER INSERT ON invoices BEGIN
+        UPDATE invoices SET created_at = {NOW}, updated_at = {NOW} WHERE id = NEW.id;
+        INSERT INTO invoice_changes (invoice_id, change, changed_at) VALUES (NEW.id, 'insert', {NOW});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS invoices_changes_update
+    AFTER UPDATE OF client_id, date, status, subtotal_cents, tax_cents, total_cents ON invoices BEGIN
+        UPDATE invoices SET updated_at = {NOW} WHERE id = NEW.id;
+        INSERT INTO invoice_changes (invoice_id, change, changed_at) VALUES (NEW.id, 'update', {NOW});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS invoices_changes_delete AFTER DELETE ON invoices
+    WHEN OLD.id NOT IN (SELECT invoice_id FROM archiving) BEGIN
+        INSERT INTO invoice_changes (invoice_id, change, changed_at) VALUES (OLD.id, 'delete', {NOW});
+    END""",
+    # When an invoice was marked paid in the application; unknown (NULL) for invoices created or
+    # imported as paid
+    f"""CREATE TRIGGER IF NOT EXISTS invoices_paid_at AFTER UPDATE OF status ON invoices
+    WHEN (NEW.status = 'paid') IS NOT (OLD.status = 'paid') BEGIN
+        UPDATE invoices SET paid_at = CASE WHEN NEW.status = 'paid' THEN {NOW} END WHERE id = NEW.id;
+    END""",
+    # Deleting a catalog item unlinks the lines that used it, which changes their invoices
+    f"""CREATE TRIGGER IF NOT EXISTS invoice_lines_changes_item AFTER UPDATE OF line_item_id ON invoice_lines
+    WHEN OLD.line_item_id IS NOT NEW.line_item_id BEGIN
+        UPDATE invoices SET updated_at = {NOW} WHERE id = NEW.invoice_id;
+        INSERT INTO invoice_changes (invoice_id, change, changed_at) VALUES (NEW.invoice_id, 'update', {NOW});
+    END""",
+    # Exports show the client name, so a rename changes every invoice of that client
+    f"""CREATE TRIGGER IF NOT EXISTS clients_changes_update AFTER UPDATE OF name ON clients
+    WHEN OLD.name IS NOT NEW.name BEGIN
+        INSERT INTO invoice_changes (invoice_id, change, changed_at)
+        SELECT id, 'update', {NOW} FROM invoices WHERE client_id = NEW.id;
+    END""",
+]
+
+# SQL expression turning a date or timestamp column into days since 1970-01-01
+def epoch_days(column):
+    return f"IFNULL(CAST(julianday(substr({column}, 1, 10)) - 2440587.5 AS INTEGER), {MISSING_DAY})"
+
+
+# Kind and name of an index or trigger statement in SCHEMA_OBJECTS
+SCHEMA_OBJECT_NAME = re.compile(r"\s*CREATE (INDEX|TRIGGER) IF NOT EXISTS (\w+)")
+
+# Triggers left in place by deferred_maintenance(): other connections may update or delete
+# invoices during a bulk load, and nothing could recover those changes afterwards. Inserts are
+# logged afterwards by track_new_invoices().
+KEPT_DURING_BULK_LOAD = ("invoices_changes_update", "invoices_changes_delete", "invoices_paid_at",
+                         "invoice_lines_changes_item", "clients_changes_update")
+
+# Weights of the invoice_search columns when ranking matches with bm25()
+SEARCH_WEIGHTS = (10.0, 5.0, 5.0, 2.0, 1.0)
+
+# Receivables aging buckets as (label, min days, max days) since the invoice date; None is open-ended
+AGING_BUCKETS = (
+    ("0-30 days", None, 30),
+    ("31-60 days", 31, 60),
+    ("61-90 days", 61, 90),
+    ("Over 90 days", 91, None),
+)
+
+
+# PRAGMA settings applied to every new connection
+class ConnectionProfile(NamedTuple):
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    cache_size: int = -65536  # negative values are KiB, so 64 MiB of page cache
+    mmap_size: int = 268435456
+    temp_store: str = "MEMORY"
+    busy_timeout: int = 5000  # milliseconds
+    cached_statements: int = 256
+
+
+# WAL lets readers run while a write is in progress, and synchronous=NORMAL only syncs at checkpoints
+DEFAULT_PROFILE = ConnectionProfile()
+
+# SQLite's stock settings (rollback journal, synchronous=FULL), for comparison or network filesystems
+SAFE_PROFILE = ConnectionProfile(journal_mode="DELETE", synchronous="FULL", cache_size=-2000, mmap_size=0,
+                                 temp_store="DEFAULT", cached_statements=128)
+
+PROFILES = {"default": DEFAULT_PROFILE, "safe": SAFE_PROFILE}
+
+
+# Hands out one tuned connection per thread for a database file. Connections are
+# reference counted per thread and closed when the last user on that thread releases them.
+class ConnectionFactory:
+    def __init__(self, path=DB_PATH, profile=DEFAULT_PROFILE):
+        self.path = path
+        self.profile = profile
+        self.schema_ready = False
+        self._local = threading.local()
+
+    def connect(self):
+        profile = self.profile
+        conn = sqlite3.connect(self.path, timeout=profile.busy_timeout / 1000,
+                               cached_statements=profile.cached_statements, factory=connection_factory())
+        conn.execute(f"PRAGMA journal_mode = {profile.journal_mode}")
+        conn.execute(f"PRAGMA synchronous = {profile.synchronous}")
+        conn.execute(f"PRAGMA cache_size = {int(profile.cache_size)}")
+        conn.execute(f"PRAGMA mmap_size = {int(profile.mmap_size)}")
+        conn.execute(f"PRAGMA temp_store = {profile.temp_store}")
+        conn.execute(f"PRAGMA busy_timeout = {int(profile.busy_timeout)}")
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def acquire(self):
+        if getattr(self._local, "conn", None) is None:
+            self._local.conn = self.connect()
+            self._local.users = 0
+        self._local.users += 1
+        return self._local.conn
+
+    def release(self):
+        self._local.users -= 1
+        if self._local.users == 0:
+            self._local.conn.close()
+            self._local.conn = None
+
+
+_factories = {}
+_factories_lock = threading.Lock()
+
+
+# Shared factory per (path, profile), so every repository on a thread reuses that thread's connection
+def get_connection_factory(path=DB_PATH, profile=DEFAULT_PROFILE):
+    with _factories_lock:
+        factory = _factories.get((path, profile))
+        if factory is None:
+            factory = _factories[(path, profile)] = ConnectionFactory(path, profile)
+        return factory
+
+
+# Clients without a name list as '', the way the client name sort orders them
+SUMMARY_COLUMNS = ("invoices.id, COALESCE(clients.name, ''), invoices.subtotal_cents, invoices.tax_cents, invoices.total_cents, "
+                   "invoices.date, invoices.status, invoices.client_id")
+SUMMARY_SOURCE = "FROM invoices JOIN clients ON invoices.client_id = clients.id"
+ALL_SUMMARY_SOURCE = f"FROM {ALL_INVOICES} JOIN clients ON invoices.client_id = clients.id"
+
+
+# The archive database that goes with a database file: invoices.db -> invoices_archive.db
+def archive_path(db_path):
+    stem, extension = os.path.splitext(db_path)
+    return f"{stem}_archive{extension or '.db'}"
+
+
+# SQL expression rendering an integer cents column as a dollar amount, e.g. 1234.50
+def dollars(column):
+    return f"CASE WHEN {column} IS NOT NULL THEN printf('%.2f', {column} / 100.0) END"
+
+
+class Client(NamedTuple):
+    id: int
+    name: str
+    billing_address: str
+    contact_name: str
+    phone_number: str
+    email: str
+
+
+# Money fields are integer cents throughout
+class LineItem(NamedTuple):
+    id: int
+    name: str
+    unit_price_cents: int
+
+
+class InvoiceLine(NamedTuple):
+    line_item_id: Optional[int]
+    description: str
+    qty: float
+    unit_price_cents: int
+    total_cents: int
+
+
+# One row of the invoice list
+class InvoiceSummary(NamedTuple):
+    id: int
+    client_name: str
+    subtotal_cents: int
+    tax_cents: int
+    total_cents: int
+    date: str
+    status: str
+    client_id: int
+
+
+class Invoice(NamedTuple):
+    id: int
+    client_id: int
+    subtotal_cents: int
+    tax_cents: int
+    total_cents: int
+    date: str
+    status: str
+    client: Client
+    lines: List[InvoiceLine]
+
+
+# One month of the revenue report, summed over clients
+class MonthTotals(NamedTuple):
+    month: str
+    invoice_count: int
+    subtotal_cents: int
+    tax_cents: int
+    total_cents: int
+    paid_cents: int
+    unpaid_cents: int
+
+
+class ClientTotals(NamedTuple):
+    client_id: int
+    client_name: str
+    invoice_count: int
+    subtotal_cents: int
+    tax_cents: int
+    total_cents: int
+    paid_cents: int
+    unpaid_cents: int
+
+
+class AgingBucket(NamedTuple):
+    label: str
+    invoice_count: int
+    unpaid_cents: int
+
+
+# SQLite's NOCASE collation only folds ASCII letters
+_NOCASE = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+# Sortable invoice list columns: the (SQL expression, InvoiceSummary field) pairs that order them.
+# Every order ends in invoices.id so it is total and can be paged by keyset.
+INVOICE_SORT_KEYS = {
+    "id": (("invoices.id", "id"),),
+    "client_name": (("COALESCE(clients.name, '') COLLATE NOCASE", "client_name"), ("invoices.client_id", "client_id"),
+                    ("invoices.id", "id")),
+    "subtotal": (("invoices.subtotal_cents", "subtotal_cents"), ("invoices.id", "id")),
+    "tax": (("invoices.tax_cents", "tax_cents"), ("invoices.id", "id")),
+    "total": (("invoices.total_cents", "total_cents"), ("invoices.id", "id")),
+    "date": (("invoices.date", "date"), ("invoices.id", "id")),
+    "status": (("invoices.status", "status"), ("invoices.date", "date"), ("invoices.id", "id")),
+}
+
+
+# Order of the invoice list; the default is newest first
+class InvoiceSort(NamedTuple):
+    column: str = "date"
+    descending: bool = True
+
+    # Keyset position of a row under this order, as passed to list_invoices(after=...)
+    def key(self, row):
+        values = []
+        for expression, field in INVOICE_SORT_KEYS[self.column]:
+            value = getattr(row, field)
+            # Matches COALESCE(..., '') COLLATE NOCASE, so rows without a name still compare
+            if expression.endswith("COLLATE NOCASE"):
+                value = (value or "").translate(_NOCASE)
+            values.append(value)
+        return tuple(values)
+
+    # Ordered by SUMMARY_COLUMNS position rather than expression, so that with archived invoices
+    # included SQLite merges the two databases' ordered rows instead of sorting them all
+    def order_by(self):
+        direction = " DESC" if self.descending else ""
+        terms = []
+        for expression, field in INVOICE_SORT_KEYS[self.column]:
+            position = str(InvoiceSummary._fields.index(field) + 1)
+            if expression.endswith("COLLATE NOCASE"):
+                position += " COLLATE NOCASE"
+            terms.append(position + direction)
+        return "ORDER BY " + ", ".join(terms)
+
+    # Condition selecting the rows that come after the keyset position
+    def after_clause(self):
+        expressions = [expression for expression, field in INVOICE_SORT_KEYS[self.column]]
+        operator = "<" if self.descending else ">"
+        return f"({', '.join(expressions)}) {operator} ({', '.join('?' * len(expressions))})"
+
+
+# Status, date range and search filter shared by the invoice list, exports and batch rendering
+class InvoiceFilter(NamedTuple):
+    status: str = "All"
+    from_date: str = ""
+    to_date: str = ""
+    search: str = ""
+    include_archived: bool = False
+
+    # FTS5 query for the search text: every word must match the start of a token
+    def match_expression(self):
+        return " ".join(f'"{word}"*' for word in re.findall(r"\w+", self.search))
+
+    # With a schema, searches only that database's search index, for a query over its invoices alone
+    def where_clause(self, schema=None):
+        where = "WHERE 1=1"
+        params = []
+
+        if self.status != "All":
+            where += " AND invoices.status = ?"
+            params.append(self.status.lower())
+
+        if self.from_date:
+            where += " AND invoices.date >= ?"
+            params.append(self.from_date)
+
+        if self.to_date:
+            where += " AND invoices.date <= ?"
+            params.append(self.to_date)
+
+        match = self.match_expression()
+        if match and schema:
+            where += f" AND invoices.id IN (SELECT rowid FROM {schema}.invoice_search WHERE invoice_search MATCH ?)"
+            params.append(match)
+        elif match and self.include_archived:
+            where += """ AND invoices.id IN (SELECT rowid FROM main.invoice_search WHERE invoice_search MATCH ?
+                                          UNION ALL
+                                          SELECT rowid FROM archive.invoice_search WHERE invoice_search MATCH ?)"""
+            params.extend([match, match])
+        elif match:
+            where += " AND invoices.id IN (SELECT rowid FROM invoice_search WHERE invoice_search MATCH ?)"
+            params.append(match)
+
+        return where, params
+
+
+# Parse the legacy "Item: 2.0 @ $230 = $460.00" line_items blob into tuples
+def parse_line_items_blob(blob):
+    lines = []
+    for line in (blob or "").strip().split('\n'):
+        if ':' not in line:
+            continue
+        item, details = line.rsplit(':', 1)
+        if '@' not in details or '=' not in details:
+            continue
+        quantity, rest = details.split('@', 1)
+        price, total = rest.split('=', 1)
+        try:
+            lines.append((
+                item.strip(),
+                float(quantity),
+                float(price.strip().replace('$', '')),
+                float(total.strip().replace('$', ''))
+            ))
+        except ValueError:
+            continue
+    return lines
+
+
+# All persistence for clients, catalog line items and invoices; usable without Tk.
+# The connection is taken by open() (or entering the repository as a context manager)
+# from the per-thread pool of the connection factory and belongs to the opening thread.
+class InvoiceRepository:
+    def __init__(self, path=DB_PATH, profile=DEFAULT_PROFILE):
+        self.path = path
+        self.profile = profile
+        self.factory = get_connection_factory(path, profile)
+        self.conn = None
+        self._transaction_depth = 0
+
+    def open(self):
+        if self.conn is None:
+            self.conn = self.factory.acquire()
+            if not self.factory.schema_ready:
+                self.ensure_schema()
+                self.factory.schema_ready = True
+        return self
+
+    def close(self):
+        if self.conn is not None:
+            self.factory.release()
+            self.conn = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # Group statements into one transaction; nested blocks commit with the outermost one
+    @contextmanager
+    def transaction(self):
+        self._transaction_depth += 1
+        try:
+            yield self.conn
+        except BaseException:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                self.conn.rollback()
+            raise
+        self._transaction_depth -= 1
+        if self._transaction_depth == 0:
+            self.conn.commit()
+
+    def ensure_schema(self):
+        with self.transaction():
+            for statement in SCHEMA:
+                self.conn.execute(statement)
+            self.add_missing_columns(ADDED_COLUMNS)
+            for statement in SCHEMA_OBJECTS:
+                self.conn.execute(statement)
+            self.migrate_line_items_blobs()
+            self.build_search_index()
+            self.migrate_money_to_cents()
+            self.build_summaries()
+            self.start_change_tracking()
+            self.prepare_archiving()
+
+    def add_missing_columns(self, columns, schema="main"):
+        for table, column, declaration in columns:
+            existing = {row[1] for row in self.conn.execute(f"PRAGMA {schema}.table_info({table})")}
+            if column not in existing:
+                self.conn.execute(f"ALTER TABLE {schema}.{table} ADD COLUMN {column} {declaration}")
+
+    # One-time migration of line_items blobs into the invoice_lines table
+    def migrate_line_items_blobs(self):
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] >= 1:
+            return
+
+        catalog = {name: item_id for item_id, name in self.conn.execute("SELECT id, name FROM line_items")}
+        rows = []
+        for invoice_id, blob in self.conn.execute("SELECT id, line_items FROM invoices WHERE line_items IS NOT NULL"):
+            for description, qty, unit_price, total in parse_line_items_blob(blob):
+                if qty:
+                    rows.append((invoice_id, catalog.get(description), description, qty, unit_price, total))
+
+        self.conn.executemany("""
+            INSERT INTO invoice_lines (invoice_id, line_item_id, description, qty, unit_price, total)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
+        self.conn.execute("UPDATE invoices SET line_items = NULL")
+        self.conn.execute("PRAGMA user_version = 1")
+
+    # One-time fill of the full-text index for invoices that predate it
+    def build_search_index(self):
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] >= 2:
+            return
+
+        self.rebuild_search_index()
+        self.conn.execute("PRAGMA user_version = 2")
+
+    # One-time conversion of REAL money columns to integer cents. Existing invoices keep
+    # their stored subtotal and get tax at the GST rate they were always printed with.
+    def migrate_money_to_cents(self):
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] >= 3:
+            return
+
+        self.conn.execute("""
+            UPDATE line_items
+            SET unit_price_cents = CAST(ROUND(unit_price * 100) AS INTEGER), unit_price = NULL
+            WHERE unit_price IS NOT NULL
+        """)
+        self.conn.execute("""
+            UPDATE invoice_lines
+            SET unit_price_cents = CAST(ROUND(unit_price * 100) AS INTEGER),
+                total_cents = CAST(ROUND(total * 100) AS INTEGER),
+                unit_price = NULL, total = NULL
+            WHERE unit_price IS NOT NULL OR total IS NOT NULL
+        """)
+        self.conn.execute("""
+            UPDATE invoices
+            SET subtotal_cents = CAST(ROUND(COALESCE(subtotal, 0) * 100) AS INTEGER), subtotal = NULL
+            WHERE subtotal_cents IS NULL
+        """)
+        rows = []
+        for invoice_id, subtotal in self.conn.execute("SELECT id, subtotal_cents FROM invoices WHERE tax_cents IS NULL"):
+            tax = tax_cents(subtotal, DEFAULT_TAX_RATE)
+            rows.append((tax, subtotal + tax, invoice_id))
+        self.conn.executemany("UPDATE invoices SET tax_cents = ?, total_cents = ? WHERE id = ?", rows)
+        self.conn.execute("PRAGMA user_version = 3")
+
+    # One-time fill of the reporting summaries for invoices that predate them
+    def build_summaries(self):
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] >= 4:
+            return
+
+        self.rebuild_summaries()
+        self.conn.execute("PRAGMA user_version = 4")
+
+    # One-time start of change tracking. Existing invoices are dated from their invoice date, and
+    # changes logged by the earlier migrations are dropped: a sync's first export is a full one.
+    def start_change_tracking(self):
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] >= 5:
+            return
+
+        self.conn.execute("""
+            UPDATE invoices
+            SET created_at = COALESCE(created_at, date || 'T00:00:00.000Z'),
+                updated_at = COALESCE(updated_at, date || 'T00:00:00.000Z')
+            WHERE created_at IS NULL OR updated_at IS NULL
+        """)
+        self.conn.execute("DELETE FROM invoice_changes")
+        self.conn.execute("PRAGMA user_version = 5")
+
+    # One-time replacement of the delete triggers that predate archiving with ones that skip it
+    def prepare_archiving(self):
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] >= 6:
+            return
+
+        for statement in SCHEMA_OBJECTS:
+            match = SCHEMA_OBJECT_NAME.match(statement)
+            if match and match.group(2) in ("invoices_summary_delete", "invoices_changes_delete"):
+                self.conn.execute(f"DROP TRIGGER {match.group(2)}")
+                self.conn.execute(statement)
+        self.conn.execute("PRAGMA user_version = 6")
+
+    # Invoices inserted while the insert trigger was dropped (see deferred_maintenance) have no
+    # timestamps yet; date them now and log them as inserts
+    def track_new_invoices(self):
+        with self.transaction():
+            self.conn.execute(f"""
+                INSERT INTO invoice_changes (invoice_id, change, changed_at)
+                SELECT id, 'insert', {NOW} FROM invoices WHERE created_at IS NULL
+            """)
+            self.conn.execute(f"UPDATE invoices SET created_at = {NOW}, updated_at = {NOW} WHERE created_at IS NULL")
+
+    def rebuild_summaries(self):
+        with self.transaction():
+            self.conn.execute("DELETE FROM client_month_totals")
+            self.conn.execute(f"INSERT INTO client_month_totals {CLIENT_MONTH_TOTALS_QUERY}")
+            self.conn.execute("DELETE FROM receivables_by_date")
+            self.conn.execute(f"INSERT INTO receivables_by_date {RECEIVABLES_BY_DATE_QUERY}")
+
+    # Rows where the stored summaries differ from a full recompute, as (table, stored row, recomputed row)
+    def verify_summaries(self):
+        mismatches = []
+        for table, query, key_length in (("client_month_totals", CLIENT_MONTH_TOTALS_QUERY, 2),
+                                         ("receivables_by_date", RECEIVABLES_BY_DATE_QUERY, 1)):
+            stored = {row[:key_length]: row for row in self.conn.execute(f"SELECT * FROM {table}")}
+            expected = {row[:key_length]: row for row in self.conn.execute(query)}
+            for key in sorted(stored.keys() | expected.keys(), key=str):
+                if stored.get(key) != expected.get(key):
+                    mismatches.append((table, stored.get(key), expected.get(key)))
+        return mismatches
+
+    def rebuild_search_index(self):
+        with self.transaction():
+            self.conn.execute("DELETE FROM invoice_search")
+            self.conn.execute(SEARCH_ROW_INSERT.format(invoice_id="invoices.id"))
+
+    # Clients
+
+    def list_clients(self):
+        return [Client._make(row) for row in self.conn.execute("SELECT * FROM clients")]
+
+    def add_client(self, name, billing_address, contact_name, phone_number, email):
+        with self.transaction():
+            cursor = self.conn.execute("""
+                INSERT INTO clients (name, billing_address, contact_name, phone_number, email)
+                VALUES (?, ?, ?, ?, ?)
+            """, (name, billing_address, contact_name, phone_number, email))
+        return cursor.lastrowid
+
+    # Bulk insert of (name, billing_address, contact_name, phone_number, email) rows
+    def add_clients(self, rows):
+        with self.transaction():
+            self.conn.executemany("""
+                INSERT INTO clients (name, billing_address, contact_name, phone_number, email)
+                VALUES (?, ?, ?, ?, ?)
+            """, rows)
+
+    def update_client(self, client_id, name, billing_address, contact_name, phone_number, email):
+        with self.transaction():
+            self.conn.execute("""
+                UPDATE clients
+                SET name=?, billing_address=?, contact_name=?, phone_number=?, email=?
+                WHERE id=?
+            """, (name, billing_address, contact_name, phone_number, email, client_id))
+
+    def delete_client(self, client_id):
+        with self.transaction():
+            self.conn.execute("DELETE FROM clients WHERE id=?", (client_id,))
+
+    # Archived invoices are only counted when the client has none left in the main database
+    def count_client_invoices(self, client_id):
+        count = self.conn.execute("SELECT COUNT(*) FROM invoices WHERE client_id=?", (client_id,)).fetchone()[0]
+        if count == 0 and self.has_archive():
+            self.attach_archive()
+            count = self.conn.execute("SELECT COUNT(*) FROM archive.invoices WHERE client_id=?",
+                                      (client_id,)).fetchone()[0]
+        return count
+
+    # Catalog line items
+
+    def list_line_items(self):
+        return [LineItem._make(row) for row in self.conn.execute("SELECT id, name, unit_price_cents FROM line_items")]
+
+    def add_line_item(self, name, unit_price_cents):
+        with self.transaction():
+            cursor = self.conn.execute("INSERT INTO line_items (name, unit_price_cents) VALUES (?, ?)",
+                                       (name, unit_price_cents))
+        return cursor.lastrowid
+
+    # Bulk insert of (name, unit_price_cents) rows
+    def add_line_items(self, rows):
+        with self.transaction():
+            self.conn.executemany("INSERT INTO line_items (name, unit_price_cents) VALUES (?, ?)", rows)
+
+    def update_line_item(self, line_item_id, name, unit_price_cents):
+        with self.transaction():
+            self.conn.execute("UPDATE line_items SET name=?, unit_price_cents=? WHERE id=?",
+                              (name, unit_price_cents, line_item_id))
+
+    def delete_line_item(self, line_item_id):
+        with self.transaction():
+            self.conn.execute("DELETE FROM line_items WHERE id=?", (line_item_id,))
+
+    def add_default_line_items(self):
+        with self.transaction():
+            self.conn.executemany("INSERT INTO line_items (name, unit_price_cents) VALUES (?, ?)", DEFAULT_LINE_ITEMS)
+
+    # Invoices
+
+    # FROM clause of the invoice list queries for a filter
+    def summary_source(self, invoice_filter):
+        if invoice_filter.include_archived:
+            self.attach_archive()
+            return ALL_SUMMARY_SOURCE
+        return SUMMARY_SOURCE
+
+    # "SELECT columns" over the invoices matching a filter joined to their clients (and, with
+    # include_lines, to their lines), plus its params: one SELECT over the main database or, with
+    # archived invoices included, one per database joined by UNION ALL. Each side joins the lines
+    # of its own database through their invoice_id index, where a join to ALL_INVOICE_LINES would
+    # read every line. condition, with condition_params, narrows each side further.
+    def _invoice_rows(self, invoice_filter, columns, include_lines=False, condition="", condition_params=()):
+        schemas = ["main"]
+        if invoice_filter.include_archived:
+            self.attach_archive()
+            schemas.append("archive")
+        selects, params = [], []
+        for schema in schemas:
+            where, where_params = invoice_filter.where_clause(schema)
+            lines = (f"LEFT JOIN {schema}.invoice_lines AS invoice_lines ON invoice_lines.invoice_id = invoices.id"
+                     if include_lines else "")
+            selects.append(f"""
+                SELECT {columns}
+                FROM {schema}.invoices AS invoices JOIN clients ON invoices.client_id = clients.id {lines}
+                {where} {condition}
+            """)
+            params += where_params + list(condition_params)
+        return " UNION ALL ".join(selects), params
+
+    # One page of the invoice list in the given order, continuing after the sort.key() of the last row shown
+    def list_invoices(self, invoice_filter, after=None, limit=INVOICE_PAGE_SIZE, sort=InvoiceSort()):
+        where, params = invoice_filter.where_clause()
+        query = f"SELECT {SUMMARY_COLUMNS} {self.summary_source(invoice_filter)} {where}"
+
+        if after:
+            query += f" AND {sort.after_clause()}"
+            params.extend(after)
+
+        query += f" {sort.order_by()} LIMIT ?"
+        params.append(limit)
+
+        return [InvoiceSummary._make(row) for row in self.conn.execute(query, params)]
+
+    # Best full-text matches for the filter's search text, most relevant first
+    def search_invoices(self, invoice_filter, limit=INVOICE_PAGE_SIZE):
+        match = invoice_filter.match_expression()
+        if not match:
+            return []
+
+        where, params = invoice_filter._replace(search="").where_clause()
+        weights = ', '.join(map(str, SEARCH_WEIGHTS))
+        schemas = ["main"]
+        if invoice_filter.include_archived:
+            self.attach_archive()
+            schemas.append("archive")
+        # Each database ranks its own matches, found through its own search index
+        query = " UNION ALL ".join(f"""
+            SELECT {SUMMARY_COLUMNS}, bm25(invoice_search, {weights}) AS relevance
+            FROM {schema}.invoices AS invoices JOIN clients ON invoices.client_id = clients.id
+            JOIN {schema}.invoice_search AS invoice_search ON invoice_search.rowid = invoices.id
+            {where} AND invoice_search MATCH ?
+        """ for schema in schemas) + " ORDER BY relevance LIMIT ?"
+        params = (params + [match]) * len(schemas) + [limit]
+        return [InvoiceSummary._make(row[:-1]) for row in self.conn.execute(query, params)]
+
+    # A single invoice list row, or None if it does not match the filter
+    def get_invoice_summary(self, invoice_id, invoice_filter=InvoiceFilter()):
+        where, params = invoice_filter.where_clause()
+        row = self.conn.execute(f"SELECT {SUMMARY_COLUMNS} {self.summary_source(invoice_filter)} {where} AND invoices.id = ?",
+                                params + [invoice_id]).fetchone()
+        return InvoiceSummary._make(row) if row else None
+
+    # {invoice_id: InvoiceSummary} for those of invoice_ids that still match the filter
+    def get_invoice_summaries(self, invoice_ids, invoice_filter=InvoiceFilter()):
+        where, params = invoice_filter.where_clause()
+        source = self.summary_source(invoice_filter)
+        invoice_ids = list(invoice_ids)
+        summaries = {}
+        for start in range(0, len(invoice_ids), ID_BATCH_SIZE):
+            chunk = invoice_ids[start:start + ID_BATCH_SIZE]
+            for row in self.conn.execute(f"""
+                SELECT {SUMMARY_COLUMNS} {source} {where}
+                AND invoices.id IN ({', '.join('?' * len(chunk))})
+            """, params + chunk):
+                summaries[row[0]] = InvoiceSummary._make(row)
+        return summaries
+
+    # Ids of every invoice matching a filter, as the invoice list would show them
+    def invoice_ids(self, invoice_filter):
+        where, params = invoice_filter.where_clause()
+        return [row[0] for row in self.conn.execute(f"SELECT invoices.id {self.summary_source(invoice_filter)} {where}",
+                                                    params)]
+
+    # Those of invoice_ids still in the main database, in their order; archived invoices (and ones
+    # since deleted) are left out, as they cannot be changed
+    def current_invoice_ids(self, invoice_ids):
+        invoice_ids = list(invoice_ids)
+        current = set()
+        for start in range(0, len(invoice_ids), ID_BATCH_SIZE):
+            chunk = invoice_ids[start:start + ID_BATCH_SIZE]
+            current.update(row[0] for row in self.conn.execute(
+                f"SELECT id FROM main.invoices WHERE id IN ({', '.join('?' * len(chunk))})", chunk))
+        return [invoice_id for invoice_id in invoice_ids if invoice_id in current]
+
+    def get_invoice_lines(self, invoice_id, include_archived=False):
+        lines = "invoice_lines"
+        if include_archived:
+            self.attach_archive()
+            lines = ALL_INVOICE_LINES
+        return [InvoiceLine._make(row) for row in self.conn.execute(f"""
+            SELECT line_item_id, description, qty, unit_price_cents, total_cents
+            FROM {lines}
+            WHERE invoice_id=?
+            ORDER BY id
+        """, (invoice_id,))]
+
+    def get_invoice(self, invoice_id, include_archived=False):
+        invoices = list(self.iter_invoices(InvoiceFilter(include_archived=include_archived), invoice_ids=[invoice_id]))
+        return invoices[0] if invoices else None
+
+    # Invoices with their client and lines, fetched in one joined query and ordered by date. Given
+    # invoice_ids, they are first put in that order and then read ID_BATCH_SIZE at a time.
+    def iter_invoices(self, invoice_filter, invoice_ids=None):
+        columns = """
+            invoices.id, invoices.client_id, invoices.subtotal_cents, invoices.tax_cents,
+            invoices.total_cents, invoices.date, invoices.status,
+            clients.id, clients.name, clients.billing_address, clients.contact_name,
+            clients.phone_number, clients.email,
+            invoice_lines.id, invoice_lines.line_item_id, invoice_lines.description,
+            invoice_lines.qty, invoice_lines.unit_price_cents, invoice_lines.total_cents
+        """
+        order_by = " ORDER BY invoices.date, invoices.id, invoice_lines.id"
+        if invoice_ids is None:
+            batches = [self._invoice_rows(invoice_filter, columns, include_lines=True)]
+        else:
+            invoice_ids = list(invoice_ids)
+            ordered = []
+            for start in range(0, len(invoice_ids), ID_BATCH_SIZE):
+                chunk = invoice_ids[start:start + ID_BATCH_SIZE]
+                ordered.extend(self.conn.execute(*self._invoice_rows(
+                    invoice_filter, "invoices.date, invoices.id",
+                    condition=f"AND invoices.id IN ({', '.join('?' * len(chunk))})", condition_params=chunk)))
+            ordered = [invoice_id for date, invoice_id in sorted(ordered, key=lambda row: (row[0] or "", row[1]))]
+            batches = (self._invoice_rows(invoice_filter, columns, include_lines=True,
+                                          condition=f"AND invoices.id IN ({', '.join('?' * len(chunk))})",
+                                          condition_params=chunk)
+                       for chunk in (ordered[start:start + ID_BATCH_SIZE]
+                                     for start in range(0, len(ordered), ID_BATCH_SIZE)))
+
+        for batch_query, batch_params in batches:
+            cursor = self.conn.execute(batch_query + order_by, batch_params)
+            for invoice_id, rows in groupby(cursor, key=lambda row: row[0]):
+                rows = list(rows)
+                first = rows[0]
+                lines = [InvoiceLine._make(row[14:]) for row in rows if row[13] is not None]
+                yield Invoice(*first[:7], client=Client._make(first[7:13]), lines=lines)
+
+    def _save_invoice_lines(self, invoice_id, lines):
+        self.conn.execute("DELETE FROM invoice_lines WHERE invoice_id=?", (invoice_id,))
+        self.conn.executemany("""
+            INSERT INTO invoice_lines (invoice_id, line_item_id, description, qty, unit_price_cents, total_cents)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [(invoice_id,) + tuple(line) for line in lines])
+
+    # (subtotal, tax, total) in cents for a set of lines
+    @staticmethod
+    def invoice_amounts(lines, tax_rate):
+        subtotal = sum(line.total_cents for line in lines)
+        tax = tax_cents(subtotal, tax_rate)
+        return subtotal, tax, subtotal + tax
+
+    def create_invoice(self, client_id, lines, date=None, status="unpaid", tax_rate=DEFAULT_TAX_RATE):
+        date = date or datetime.now().strftime("%Y-%m-%d")
+        with self.transaction():
+            cursor = self.conn.execute("""
+                INSERT INTO invoices (client_id, subtotal_cents, tax_cents, total_cents, date, status)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (client_id, *self.invoice_amounts(lines, tax_rate), date, status))
+            invoice_id = cursor.lastrowid
+            self._save_invoice_lines(invoice_id, lines)
+        return invoice_id
+
+    # Bulk insert of invoices given as (client_id, date, status, subtotal_cents, tax_cents, total_cents, lines);
+    # all their lines go in with one executemany
+    def add_invoices(self, invoices):
+        line_rows = []
+        with self.transaction():
+            for client_id, date, status, subtotal, tax, total, lines in invoices:
+                cursor = self.conn.execute("""
+                    INSERT INTO invoices (client_id, subtotal_cents, tax_cents, total_cents, date, status)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (client_id, subtotal, tax, total, date, status))
+                line_rows.extend((cursor.lastrowid,) + tuple(line) for line in lines)
+            self.conn.executemany("""
+                INSERT INTO invoice_lines (invoice_id, line_item_id, description, qty, unit_price_cents, total_cents)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, line_rows)
+
+    # Drop the indexes and the search, summary and insert-logging triggers from SCHEMA_OBJECTS
+    # while bulk loading; afterwards recreate them, log the new invoices and rebuild the search
+    # index and summaries the triggers would have maintained row by row
+    @contextmanager
+    def deferred_maintenance(self):
+        names = [match.groups() for match in map(SCHEMA_OBJECT_NAME.match, SCHEMA_OBJECTS)
+                 if match and match.group(2) not in KEPT_DURING_BULK_LOAD]
+        with self.transaction():
+            for kind, name in names:
+                self.conn.execute(f"DROP {kind} IF EXISTS {name}")
+        try:
+            yield self
+        finally:
+            with self.transaction():
+                for statement in SCHEMA_OBJECTS:
+                    self.conn.execute(statement)
+                self.track_new_invoices()
+                self.rebuild_search_index()
+                self.rebuild_summaries()
+
+    # Tax is recomputed at tax_rate, so an edited invoice uses the current rate
+    def update_invoice(self, invoice_id, client_id, lines, tax_rate=DEFAULT_TAX_RATE):
+        with self.transaction():
+            cursor = self.conn.execute("""
+                UPDATE invoices
+                SET client_id=?, subtotal_cents=?, tax_cents=?, total_cents=?
+                WHERE id=?
+            """, (client_id, *self.invoice_amounts(lines, tax_rate), invoice_id))
+            if cursor.rowcount == 0:
+                raise ValueError(f"Invoice {invoice_id} is archived or no longer exists and cannot be edited")
+            self._save_invoice_lines(invoice_id, lines)
+
+    def set_invoice_status(self, invoice_id, status):
+        with self.transaction():
+            self.conn.execute("UPDATE invoices SET status=? WHERE id=?", (status, invoice_id))
+
+    def delete_invoice(self, invoice_id):
+        with self.transaction():
+            self.conn.execute("DELETE FROM invoices WHERE id=?", (invoice_id,))
+
+    # Bulk versions of the above in one transaction; they return how many invoices changed
+    def set_invoices_status(self, invoice_ids, status):
+        with self.transaction():
+            cursor = self.conn.executemany("UPDATE invoices SET status=? WHERE id=? AND status<>?",
+                                           [(status, invoice_id, status) for invoice_id in invoice_ids])
+        return cursor.rowcount
+
+    def delete_invoices(self, invoice_ids):
+        with self.transaction():
+            cursor = self.conn.executemany("DELETE FROM invoices WHERE id=?",
+                                           [(invoice_id,) for invoice_id in invoice_ids])
+        return cursor.rowcount
+
+    # Archive
+
+    def has_archive(self):
+        return os.path.exists(archive_path(self.path))
+
+    # Attach the archive database as "archive", creating it on first use. Like any ATTACH this
+    # cannot happen inside a transaction; the connection keeps it attached until it is closed.
+    def attach_archive(self):
+        if any(row[1] == "archive" for row in self.conn.execute("PRAGMA database_list")):
+            return
+        self.conn.execute("ATTACH DATABASE ? AS archive", (archive_path(self.path),))
+        self.conn.execute(f"PRAGMA archive.journal_mode = {self.profile.journal_mode}")
+        self.conn.execute(f"PRAGMA archive.synchronous = {self.profile.synchronous}")
+        with self.transaction():
+            for statement in ARCHIVE_SCHEMA:
+                self.conn.execute(statement)
+            self.add_missing_columns(ARCHIVE_ADDED_COLUMNS, schema="archive")
+
+    # Move paid invoices dated more than older_than_days before as_of (default today) to the
+    # archive, batch_size invoices at a time so the main database is never locked for long.
+    # Their totals move to archived_month_totals, so the reports do not change, and no delete is
+    # logged for the incremental export. SQLite does not commit the two WAL databases atomically,
+    # so each batch is copied to the archive in one transaction and only then deleted from main,
+    # in another, for the invoices whose copy is there and still current. A run interrupted
+    # between the two leaves the invoices in main, and the next run finishes the batch.
+    # progress(archived) is called after each batch; returns the number of invoices archived.
+    def archive_invoices(self, older_than_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE, as_of=None,
+                         progress=None):
+        as_of = datetime.strptime(as_of, "%Y-%m-%d") if as_of else datetime.now()
+        cutoff = (as_of - timedelta(days=older_than_days)).strftime("%Y-%m-%d")
+        self.attach_archive()
+        archived = 0
+        while True:
+            if not self.conn.execute("SELECT 1 FROM main.archive_batch LIMIT 1").fetchone():
+                with self.transaction():
+                    # Oldest first in (status, date) index order; moved rows leave the index, so
+                    # each batch starts at the first one still to be archived without rereading
+                    # the others
+                    count = self.conn.execute("""
+                        INSERT INTO main.archive_batch (invoice_id)
+                        SELECT id FROM main.invoices WHERE status = 'paid' AND date < ? ORDER BY date, id LIMIT ?
+                    """, (cutoff, batch_size)).rowcount
+                if count == 0:
+                    break
+            self._copy_archive_batch()
+            archived += self._delete_archived_batch()
+            self._drop_unarchived_copies()
+            if progress:
+                progress(archived)
+        return archived
+
+    # First step of an archive batch, committed to the archive database only. Copies replace
+    # what is there, so a batch copied again after an interruption picks up any changes.
+    def _copy_archive_batch(self):
+        batch = "(SELECT invoice_id FROM main.archive_batch)"
+        with self.transaction():
+            self.conn.execute(f"""
+                INSERT OR REPLACE INTO archive.invoices ({ARCHIVE_INVOICE_COLUMNS}, archived_at)
+                SELECT {ARCHIVE_INVOICE_COLUMNS}, {NOW} FROM main.invoices WHERE id IN {batch}
+            """)
+            self.conn.execute(f"DELETE FROM archive.invoice_lines WHERE invoice_id IN {batch}")
+            self.conn.execute(f"""
+                INSERT INTO archive.invoice_lines ({ARCHIVE_LINE_COLUMNS})
+                SELECT {ARCHIVE_LINE_COLUMNS} FROM main.invoice_lines WHERE invoice_id IN {batch}
+            """)
+            self.conn.execute(f"DELETE FROM archive.invoice_search WHERE rowid IN {batch}")
+            self.conn.execute(f"""
+                INSERT INTO archive.invoice_search (rowid, {ARCHIVE_SEARCH_COLUMNS})
+                SELECT rowid, {ARCHIVE_SEARCH_COLUMNS} FROM main.invoice_search WHERE rowid IN {batch}
+            """)
+
+    # Second step, committed to the main database only: the batch's invoices whose archive copy
+    # is the current version (the GUI may have changed or deleted them since it was taken) leave
+    # main and the batch. Returns how many did.
+    def _delete_archived_batch(self):
+        archived = "(SELECT invoice_id FROM main.archiving)"
+        with self.transaction():
+            self.conn.execute("""
+                INSERT INTO main.archiving (invoice_id)
+                SELECT invoices.id
+                FROM main.archive_batch
+                JOIN main.invoices ON invoices.id = archive_batch.invoice_id
+                JOIN archive.invoices AS copies ON copies.id = invoices.id
+                WHERE invoices.status = 'paid' AND copies.updated_at IS invoices.updated_at
+            """)
+            self.conn.execute(f"""
+                INSERT INTO main.archived_month_totals
+                {INVOICE_MONTH_TOTALS.format(where=f"WHERE id IN {archived}")}
+                ON CONFLICT (client_id, month) DO UPDATE SET
+                    invoice_count = invoice_count + excluded.invoice_count,
+                    subtotal_cents = subtotal_cents + excluded.subtotal_cents,
+                    tax_cents = tax_cents + excluded.tax_cents,
+                    total_cents = total_cents + excluded.total_cents,
+                    paid_cents = paid_cents + excluded.paid_cents,
+                    unpaid_cents = unpaid_cents + excluded.unpaid_cents
+            """)
+            # Dropping their search rows first saves the line triggers, which run as the lines
+            # are deleted along with their invoices, from reindexing them row by row
+            self.conn.execute(f"DELETE FROM main.invoice_search WHERE rowid IN {archived}")
+            count = self.conn.execute(f"DELETE FROM main.invoices WHERE id IN {archived}").rowcount
+            self.conn.execute(f"DELETE FROM main.invoice_lines WHERE invoice_id IN {archived}")
+            self.conn.execute(f"DELETE FROM main.archive_batch WHERE invoice_id IN {archived}")
+            self.conn.execute("DELETE FROM main.archiving")
+        return count
+
+    # Last step: what is left of the batch was not archived, so its copies are dropped from the
+    # archive before the batch is cleared
+    def _drop_unarchived_copies(self):
+        batch = "(SELECT invoice_id FROM main.archive_batch)"
+        with self.transaction():
+            self.conn.execute(f"DELETE FROM archive.invoices WHERE id IN {batch}")
+            self.conn.execute(f"DELETE FROM archive.invoice_lines WHERE invoice_id IN {batch}")
+            self.conn.execute(f"DELETE FROM archive.invoice_search WHERE rowid IN {batch}")
+        with self.transaction():
+            self.conn.execute("DELETE FROM main.archive_batch")
+
+    # Reports, read from the summary tables
+
+    def revenue_by_month(self):
+        return [MonthTotals._make(row) for row in self.conn.execute("""
+            SELECT month, SUM(invoice_count), SUM(subtotal_cents), SUM(tax_cents), SUM(total_cents),
+                   SUM(paid_cents), SUM(unpaid_cents)
+            FROM client_month_totals
+            GROUP BY month
+            ORDER BY month DESC
+        """)]
+
+    def revenue_by_client(self, limit=100):
+        return [ClientTotals._make(row) for row in self.conn.execute("""
+            SELECT totals.client_id, clients.name, totals.invoice_count, totals.subtotal_cents, totals.tax_cents,
+                   totals.total_cents, totals.paid_cents, totals.unpaid_cents
+            FROM (
+                SELECT client_id, SUM(invoice_count) AS invoice_count, SUM(subtotal_cents) AS subtotal_cents,
+                       SUM(tax_cents) AS tax_cents, SUM(total_cents) AS total_cents,
+                       SUM(paid_cents) AS paid_cents, SUM(unpaid_cents) AS unpaid_cents
+                FROM client_month_totals
+                GROUP BY client_id
+            ) AS totals
+            LEFT JOIN clients ON clients.id = totals.client_id
+            ORDER BY totals.total_cents DESC
+            LIMIT ?
+        """, (limit,))]
+
+    # Unpaid totals bucketed by days since the invoice date
+    def receivables_aging(self, as_of=None):
+        as_of = as_of or datetime.now().strftime("%Y-%m-%d")
+        buckets = []
+        for label, min_days, max_days in AGING_BUCKETS:
+            where, params = "WHERE 1=1", []
+            if min_days is not None:
+                where += " AND julianday(?) - julianday(date) >= ?"
+                params += [as_of, min_days]
+            if max_days is not None:
+                where += " AND julianday(?) - julianday(date) <= ?"
+                params += [as_of, max_days]
+            count, unpaid = self.conn.execute(f"""
+                SELECT COALESCE(SUM(invoice_count), 0), COALESCE(SUM(unpaid_cents), 0)
+                FROM receivables_by_date
+                {where}
+            """, params).fetchone()
+            buckets.append(AgingBucket(label, count, unpaid))
+        return buckets
+
+    # Export rows (optionally one per invoice line) ordered by date and id, plus the params. Amounts
+    # are formatted as dollars by SQLite.
+    def _export_query(self, invoice_filter, include_lines, condition="", condition_params=()):
+        columns = ("invoices.id, clients.name, invoices.subtotal_cents, invoices.tax_cents, invoices.total_cents, "
+                   "invoices.date, invoices.status")
+        output = (f"id, name, {dollars('subtotal_cents')}, {dollars('tax_cents')}, {dollars('total_cents')}, "
+                  "date, status")
+        order = "ORDER BY date, id"
+        if include_lines:
+            columns += """, invoice_lines.id AS line_id, invoice_lines.description, invoice_lines.qty,
+                          invoice_lines.unit_price_cents, invoice_lines.total_cents AS line_total_cents"""
+            output += f", description, qty, {dollars('unit_price_cents')}, {dollars('line_total_cents')}"
+            order += ", line_id"
+        rows, params = self._invoice_rows(invoice_filter, columns, include_lines, condition, condition_params)
+        return f"SELECT {output} FROM ({rows}) {order}", params
+
+    # Export rows as a lazily fetched cursor, plus their count
+    def export_rows(self, invoice_filter, include_lines=False):
+        total = sum(row[0] for row in self.conn.execute(*self._invoice_rows(invoice_filter, "COUNT(*)", include_lines)))
+        return self.conn.execute(*self._export_query(invoice_filter, include_lines)), total
+
+    # Export rows of the given invoices, ID_BATCH_SIZE invoices per query
+    def export_rows_for_ids(self, invoice_ids, include_lines=False, include_archived=False):
+        invoice_ids = sorted(invoice_ids)
+        for start in range(0, len(invoice_ids), ID_BATCH_SIZE):
+            chunk = invoice_ids[start:start + ID_BATCH_SIZE]
+            yield from self.conn.execute(*self._export_query(
+                InvoiceFilter(include_archived=include_archived), include_lines,
+                f"AND invoices.id IN ({', '.join('?' * len(chunk))})", chunk))
+
+    # Change tracking
+
+    def get_watermark(self, sync):
+        row = self.conn.execute("SELECT seq FROM export_watermarks WHERE sync = ?", (sync,)).fetchone()
+        return row[0] if row else None
+
+    # Record what a sync has exported up to, and drop the log entries every sync holding the log
+    # has seen. A sync that does not hold it (holds_log=False) never keeps entries from being
+    # dropped; when it falls behind them, invoice_changes_since() asks it to start over.
+    def set_watermark(self, sync, seq, holds_log=True):
+        with self.transaction():
+            self.conn.execute(f"""
+                INSERT INTO export_watermarks (sync, seq, exported_at, holds_log) VALUES (?, ?, {NOW}, ?)
+                ON CONFLICT (sync) DO UPDATE SET
+                    seq = excluded.seq, exported_at = excluded.exported_at, holds_log = excluded.holds_log
+            """, (sync, seq, holds_log))
+            self.conn.execute("""
+                DELETE FROM invoice_changes
+                WHERE seq <= COALESCE((SELECT MIN(seq) FROM export_watermarks WHERE holds_log), ?)
+            """, (seq,))
+
+    # Last seq handed out by the change log, counting entries since dropped
+    def last_change_seq(self):
+        row = self.conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'invoice_changes'").fetchone()
+        return row[0] if row else 0
+
+    def reset_watermark(self, sync):
+        with self.transaction():
+            self.conn.execute("DELETE FROM export_watermarks WHERE sync = ?", (sync,))
+
+    # Invoices changed since the sync's watermark, as (seq to advance the watermark to,
+    # {invoice_id: first change since the watermark}), or None in place of the changes when the
+    # sync has no watermark yet, or does not hold the log and entries it had not seen were dropped,
+    # and needs a full export. Rows changed while this is read may be reported again next time,
+    # never missed.
+    def invoice_changes_since(self, sync):
+        row = self.conn.execute("SELECT seq, holds_log FROM export_watermarks WHERE sync = ?", (sync,)).fetchone()
+        since, holds_log = row if row else (None, True)
+        upto = max(since or 0, self.last_change_seq())
+        if since is None:
+            return upto, None
+        if not holds_log:
+            # Entries are only dropped from the start of the log, and seqs are never reused
+            first = self.conn.execute("SELECT MIN(seq) FROM invoice_changes").fetchone()[0]
+            if (upto + 1 if first is None else first) > since + 1:
+                return upto, None
+        changes = {}
+        for invoice_id, change in self.conn.execute(
+                "SELECT invoice_id, change FROM invoice_changes WHERE seq > ? AND seq <= ? ORDER BY seq", (since, upto)):
+            changes.setdefault(invoice_id, change)
+        return upto, changes
+
+    # Analytics snapshot rows (see analytics.py): the rows with an id above after_id, then those of
+    # invoice_ids at or below it, with dates as day numbers and statuses as 1 for paid, 0 otherwise
+
+    def _analytics_rows(self, columns, source, id_column, after_id, invoice_ids):
+        yield from self.conn.execute(f"SELECT {columns} FROM {source} WHERE id > ? ORDER BY id", (after_id,))
+        invoice_ids = sorted(invoice_ids)
+        for start in range(0, len(invoice_ids), ID_BATCH_SIZE):
+            chunk = invoice_ids[start:start + ID_BATCH_SIZE]
+            yield from self.conn.execute(f"""
+                SELECT {columns} FROM {source}
+                WHERE {id_column} IN ({', '.join('?' * len(chunk))}) AND id <= ?
+            """, chunk + [after_id])
+
+    # (id, client_id, date, paid, subtotal_cents, tax_cents, total_cents, paid_at) rows
+    def analytics_invoice_rows(self, after_id=0, invoice_ids=(), include_archived=False):
+        if include_archived:
+            self.attach_archive()
+        columns = f"""id, client_id, {epoch_days("date")}, status = 'paid', IFNULL(subtotal_cents, 0),
+                      IFNULL(tax_cents, 0), IFNULL(total_cents, 0), {epoch_days("paid_at")}"""
+        return self._analytics_rows(columns, ALL_INVOICES if include_archived else "invoices", "id",
+                                    after_id, invoice_ids)
+
+    # (id, invoice_id, line_item_id or -1, qty, unit_price_cents, total_cents) rows
+    def analytics_line_rows(self, after_id=0, invoice_ids=(), include_archived=False):
+        if include_archived:
+            self.attach_archive()
+        columns = ("id, invoice_id, IFNULL(line_item_id, -1), IFNULL(qty, 0), IFNULL(unit_price_cents, 0), "
+                   "IFNULL(total_cents, 0)")
+        return self._analytics_rows(columns, ALL_INVOICE_LINES if include_archived else "invoice_lines",
+                                    "invoice_id", after_id, invoice_ids)
@@ -0,0 +1,124 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import analytics
+from benchmark import benchmarks, generate_database
+from repository import InvoiceRepository, InvoiceFilter, InvoiceLine, MISSING_DAY
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+@unittest.skipIf(np is None, "analytics needs NumPy")
+class AnalyticsRefreshTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "invoices.db")
+        generate_database(self.path, clients=20, items=10, invoices=500)
+        self.repository = InvoiceRepository(self.path)
+        self.repository.open()
+
+    def tearDown(self):
+        self.repository.close()
+        shutil.rmtree(self.directory)
+
+    def full_load(self):
+        snapshot = analytics.AnalyticsSnapshot.empty(None)
+        snapshot.load(self.repository)
+        return snapshot
+
+    def assertSameSnapshot(self, snapshot, expected):
+        for table in ("invoices", "lines"):
+            for name, values in getattr(expected, table).items():
+                np.testing.assert_array_equal(getattr(snapshot, table)[name], values, f"{table}.{name}")
+        self.assertEqual(snapshot.month_totals(), expected.month_totals())
+        self.assertEqual(snapshot.client_totals(), expected.client_totals())
+        self.assertEqual(snapshot.item_totals(), expected.item_totals())
+        self.assertEqual(snapshot.payment_delays(), expected.payment_delays())
+
+    def test_incremental_refresh_matches_full_load(self):
+        snapshot = self.full_load()
+        unpaid = [row.id for row in self.repository.list_invoices(InvoiceFilter("Unpaid"), limit=6)]
+        client_id = self.repository.list_clients()[0].id
+        line = InvoiceLine(None, "Consulting", 2.0, 5000, 10000)
+
+        self.repository.create_invoice(client_id, [line], date="2024-01-02")
+        self.repository.update_invoice(unpaid[0], client_id, [line, line])
+        self.repository.set_invoices_status(unpaid[1:3], "paid")
+        self.repository.delete_invoices(unpaid[3:])
+        self.repository.archive_invoices(older_than_days=365 * 3, as_of="2024-01-01")
+
+        read = snapshot.refresh(self.repository)
+        self.assertLess(read, len(snapshot))
+        self.assertSameSnapshot(snapshot, self.full_load())
+        # Nothing changed since, so the next refresh reads nothing
+        self.assertEqual(snapshot.refresh(self.repository), 0)
+
+    def test_saved_snapshot_refreshes(self):
+        snapshot_path = os.path.join(self.directory, "analytics.npz")
+        snapshot, loaded, seconds = analytics.open_snapshot(self.path, snapshot_path)
+        self.assertEqual(loaded, len(snapshot))
+
+        client_id = self.repository.list_clients()[0].id
+        self.repository.create_invoice(client_id, [InvoiceLine(None, "Consulting", 1.0, 5000, 5000)])
+        snapshot, loaded, seconds = analytics.open_snapshot(self.path, snapshot_path)
+        self.assertEqual(loaded, 1)
+        self.assertSameSnapshot(snapshot, self.full_load())
+
+    def test_saving_over_the_mapped_file(self):
+        snapshot_path = os.path.join(self.directory, "analytics.npz")
+        analytics.open_snapshot(self.path, snapshot_path)
+        snapshot = analytics.load_snapshot(snapshot_path)
+        self.assertIsInstance(snapshot.invoices["id"], np.memmap)
+        expected = snapshot.month_totals()
+
+        snapshot.save(snapshot_path)
+        self.assertFalse(os.path.exists(snapshot_path + ".tmp"))
+        self.assertIsInstance(snapshot.invoices["id"], np.memmap)
+        self.assertEqual(snapshot.invoices["id"].filename, os.path.abspath(snapshot_path))
+        self.assertEqual(snapshot.month_totals(), expected)
+        self.assertSameSnapshot(analytics.load_snapshot(snapshot_path), self.full_load())
+
+    def test_benchmarks_leave_the_watermark_alone(self):
+        cases = {name: fn for name, fn, runs in benchmarks(self.repository, self.path, "default", random.Random(0), 1,
+                                                           self.directory)}
+        self.assertIsNone(self.repository.get_watermark(analytics.ANALYTICS_SYNC))
+        cases["analytics_load"]()
+        cases["analytics_reports"]()
+        self.assertIsNone(self.repository.get_watermark(analytics.ANALYTICS_SYNC))
+
+
+@unittest.skipIf(np is None, "analytics needs NumPy")
+class AnalyticsTotalsTest(unittest.TestCase):
+    # A snapshot of invoices given as (client_id, date, paid, total_cents) with no tax and no lines
+    def snapshot(self, rows):
+        client_ids, dates, paid, totals = (np.array(column) for column in zip(*rows))
+        invoices = {"id": np.arange(1, len(rows) + 1, dtype="i8"), "client_id": client_ids.astype("i8"),
+                    "date": dates.astype("i4"), "paid": paid.astype("i1"), "subtotal_cents": totals.astype("i8"),
+                    "tax_cents": np.zeros(len(rows), "i8"), "total_cents": totals.astype("i8"),
+                    "paid_date": np.full(len(rows), MISSING_DAY, "i4")}
+        snapshot = analytics.AnalyticsSnapshot.empty(None)
+        snapshot.invoices = invoices
+        return snapshot
+
+    def test_totals_are_exact_cents(self):
+        big = 2 ** 53 + 1
+        snapshot = self.snapshot([(1, 19000, 1, big), (1, 19000, 0, big), (1, 19000, 1, 1)])
+        month = snapshot.month_totals()[0]
+        self.assertEqual((month.total_cents, month.paid_cents, month.unpaid_cents), (2 * big + 1, big + 1, big))
+        self.assertEqual(snapshot.client_totals()[0].total_cents, 2 * big + 1)
+
+    def test_undated_invoices_are_in_no_month(self):
+        snapshot = self.snapshot([(1, 19000, 1, 100), (1, MISSING_DAY, 0, 50)])
+        self.assertEqual([(month.month, month.invoice_count, month.total_cents) for month in snapshot.month_totals()],
+                         [("2022-01", 1, 100)])
+        self.assertEqual(snapshot.client_totals()[0].total_cents, 150)
+
+
+if __name__ == "__main__":
+    unittest.main()
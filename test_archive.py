@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from repository import InvoiceRepository, InvoiceFilter, InvoiceLine, InvoiceSort
+
+
+class ArchiveTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "invoices.db")
+        self.repository = InvoiceRepository(self.path)
+        self.repository.open()
+        self.acme = self.repository.add_client("Acme Logistics", "1 Main St", "Ann", "555-0100", "ann@example.com")
+        globex = self.repository.add_client("Globex Supply", "2 High St", "Bob", "555-0101", "bob@example.com")
+        self.widget = self.repository.add_line_item("Widget", 1250)
+        self.old_invoice = self.repository.create_invoice(
+            self.acme, [InvoiceLine(self.widget, "Widget", 2.0, 1250, 2500)], date="2019-03-01", status="paid")
+        self.new_invoice = self.repository.create_invoice(
+            globex, [InvoiceLine(self.widget, "Widget", 1.0, 1250, 1250)], date="2023-11-15")
+        self.globex = globex
+
+    def tearDown(self):
+        self.repository.close()
+        shutil.rmtree(self.directory)
+
+    def test_archived_invoices_stay_visible(self):
+        repository = self.repository
+        self.assertEqual(repository.archive_invoices(older_than_days=365, as_of="2024-01-01"), 1)
+
+        self.assertEqual([row.id for row in repository.list_invoices(InvoiceFilter())], [self.new_invoice])
+        archived = InvoiceFilter(include_archived=True)
+        self.assertEqual([row.id for row in repository.list_invoices(archived)], [self.new_invoice, self.old_invoice])
+        self.assertEqual([row.id for row in repository.list_invoices(archived._replace(status="Paid"))],
+                         [self.old_invoice])
+
+        self.assertEqual(repository.search_invoices(InvoiceFilter(search="acme")), [])
+        self.assertEqual([row.id for row in repository.search_invoices(archived._replace(search="acme"))],
+                         [self.old_invoice])
+        self.assertEqual([row.id for row in repository.list_invoices(archived._replace(search="acme"))],
+                         [self.old_invoice])
+
+        self.assertIsNone(repository.get_invoice(self.old_invoice))
+        invoice = repository.get_invoice(self.old_invoice, include_archived=True)
+        self.assertEqual((invoice.client.name, invoice.status, invoice.lines),
+                         ("Acme Logistics", "paid", [InvoiceLine(self.widget, "Widget", 2.0, 1250, 2500)]))
+        self.assertEqual(repository.count_client_invoices(self.acme), 1)
+
+    def test_interrupted_batch_loses_no_invoice(self):
+        repository = self.repository
+        line = InvoiceLine(self.widget, "Widget", 1.0, 1250, 1250)
+        edited, deleted, kept = (repository.create_invoice(self.globex, [line], date="2019-05-01", status="paid")
+                                 for _ in range(3))
+        old_invoices = [self.old_invoice, edited, deleted, kept]
+
+        # Stop after the copy to the archive is committed, before anything leaves main
+        with mock.patch.object(InvoiceRepository, "_delete_archived_batch", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                repository.archive_invoices(older_than_days=365, as_of="2024-01-01")
+        self.assertEqual(repository.conn.execute("SELECT COUNT(*) FROM archive.invoices").fetchone()[0], 4)
+        self.assertEqual({row.id for row in repository.list_invoices(InvoiceFilter(status="Paid"))},
+                         set(old_invoices))
+        self.assertEqual(repository.verify_summaries(), [])
+
+        # Changed in the meantime, as from the GUI
+        repository.set_invoice_status(edited, "unpaid")
+        repository.delete_invoice(deleted)
+        months_before = repository.revenue_by_month()
+
+        self.assertEqual(repository.archive_invoices(older_than_days=365, as_of="2024-01-01"), 2)
+        self.assertEqual([row.id for row in repository.list_invoices(InvoiceFilter())], [self.new_invoice, edited])
+        # Each invoice once, and the one deleted meanwhile not brought back from its copy
+        listed = [row.id for row in repository.list_invoices(InvoiceFilter(include_archived=True),
+                                                             sort=InvoiceSort("id", descending=False))]
+        self.assertEqual(listed, sorted([self.old_invoice, edited, kept, self.new_invoice]))
+        self.assertEqual(repository.conn.execute("SELECT COUNT(*) FROM archive_batch").fetchone()[0], 0)
+        self.assertEqual(repository.verify_summaries(), [])
+        self.assertEqual(repository.revenue_by_month(), months_before)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+
+from export import DEFAULT_SYNC, export_invoice_changes_csv
+from repository import InvoiceRepository, InvoiceLine
+
+
+class InvoiceChangesExportTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "invoices.db")
+        self.csv_path = os.path.join(self.directory, "changes.csv")
+        self.repository = InvoiceRepository(self.path)
+        self.repository.open()
+        self.client = self.repository.add_client("Acme Logistics", "1 Main St", "Ann", "555-0100", "ann@example.com")
+        self.line = InvoiceLine(None, "Consulting", 1.0, 10000, 10000)
+        self.invoices = [self.repository.create_invoice(self.client, [self.line], date=date)
+                         for date in ("2019-03-01", "2023-11-15", "2023-12-01")]
+
+    def tearDown(self):
+        self.repository.close()
+        shutil.rmtree(self.directory)
+
+    # (counts, [(change, invoice id)]) of the next export
+    def export(self):
+        counts = export_invoice_changes_csv(self.path, self.csv_path)
+        with open(self.csv_path, newline="") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0][:2], ["Change", "Invoice ID"])
+        return counts, [(row[0], int(row[1])) for row in rows[1:]]
+
+    def test_full_then_incremental(self):
+        counts, rows = self.export()
+        self.assertEqual(counts, {"created": 3, "updated": 0, "deleted": 0})
+        self.assertEqual(sorted(rows), [("created", invoice_id) for invoice_id in self.invoices])
+
+        self.assertEqual(self.export(), ({"created": 0, "updated": 0, "deleted": 0}, []))
+
+        first, second, third = self.invoices
+        self.repository.set_invoice_status(first, "paid")
+        self.repository.delete_invoice(second)
+        fourth = self.repository.create_invoice(self.client, [self.line], date="2024-01-02")
+        counts, rows = self.export()
+        self.assertEqual(counts, {"created": 1, "updated": 1, "deleted": 1})
+        self.assertEqual(sorted(rows), [("created", fourth), ("deleted", second), ("updated", first)])
+
+        # Archiving moves an invoice without changing it, so the other side has nothing to apply
+        self.assertEqual(self.repository.archive_invoices(older_than_days=365, as_of="2024-01-01"), 1)
+        self.assertEqual(self.export(), ({"created": 0, "updated": 0, "deleted": 0}, []))
+
+        # A full export after a reset still includes the archived invoice
+        self.repository.reset_watermark(DEFAULT_SYNC)
+        counts, rows = self.export()
+        self.assertEqual(counts, {"created": 3, "updated": 0, "deleted": 0})
+        self.assertEqual(sorted(rows), [("created", first), ("created", third), ("created", fourth)])
+
+    def test_deleting_a_catalog_item_updates_its_invoices(self):
+        widget = self.repository.add_line_item("Widget", 1250)
+        invoice = self.repository.create_invoice(self.client, [InvoiceLine(widget, "Widget", 1.0, 1250, 1250)])
+        self.export()
+
+        self.repository.delete_line_item(widget)
+        self.assertEqual(self.repository.get_invoice_lines(invoice), [InvoiceLine(None, "Widget", 1.0, 1250, 1250)])
+        counts, rows = self.export()
+        self.assertEqual(counts, {"created": 0, "updated": 1, "deleted": 0})
+        self.assertEqual(rows, [("updated", invoice)])
+        # The lines to unlink are found through an index
+        plan = [row[3] for row in self.repository.conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM invoice_lines WHERE line_item_id = ?", (widget,))]
+        self.assertIn("SEARCH invoice_lines USING COVERING INDEX idx_invoice_lines_line_item_id (line_item_id=?)",
+                      plan)
+
+
+if __name__ == "__main__":
+    unittest.main()
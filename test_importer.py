@@ -0,0 +1,60 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import importer
+from importer import import_file
+from repository import InvoiceRepository
+
+
+class JsonArrayImportTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "invoices.db")
+        self.json_path = os.path.join(self.directory, "clients.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    # (imported client names, [(record number, error)] of the rejects) after importing text
+    def import_clients(self, text):
+        with open(self.json_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        result = import_file(self.path, "clients", self.json_path)
+        with InvoiceRepository(self.path) as repository:
+            names = [client.name for client in repository.list_clients()]
+        rejects = []
+        if result.rejects_path:
+            with open(result.rejects_path, encoding="utf-8") as f:
+                rejects = [(reject["_line"], reject["_error"]) for reject in map(json.loads, f)]
+        self.assertEqual((result.imported, result.rejected), (len(names), len(rejects)))
+        return sorted(names), rejects
+
+    def test_malformed_records_are_rejected_and_skipped(self):
+        text = ('[{"name": "Acme"}, {"name": "Bad", "note": "a ] and , in a string" oops},'
+                ' {"name": "Nested", "tags": [1, {"x": }]}, {"name": "Globex"}'
+                ' {"name": "Missing comma"}, {"name": "Initech"}]')
+        names, rejects = self.import_clients(text)
+        self.assertEqual(names, ["Acme", "Globex", "Initech"])
+        self.assertEqual([number for number, error in rejects], [2, 3, 5])
+        self.assertTrue(all(error.startswith("invalid JSON") for number, error in rejects), rejects)
+
+    def test_oversized_record_is_rejected_without_reading_on(self):
+        big = json.dumps({"name": "Big", "notes": "x" * 5000})
+        text = '[{"name": "Acme"}, ' + big + ', {"name": "Globex"}]'
+        with mock.patch.object(importer, "JSON_READ_SIZE", 64), mock.patch.object(importer, "JSON_MAX_RECORD_SIZE", 1000):
+            names, rejects = self.import_clients(text)
+        self.assertEqual(names, ["Acme", "Globex"])
+        self.assertEqual(rejects, [(2, "record is longer than 1,000 characters")])
+
+    def test_unclosed_array_keeps_what_was_read(self):
+        names, rejects = self.import_clients('[{"name": "Acme"}, {"name": "Glo')
+        self.assertEqual(names, ["Acme"])
+        self.assertEqual([number for number, error in rejects], [2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from money import DEFAULT_TAX_RATE, tax_cents
+from repository import InvoiceRepository, InvoiceFilter, InvoiceLine
+
+# The tables as the first release of the application created them: invoice lines in a text blob
+# and money in REAL dollars
+BASELINE_SCHEMA = [
+    '''CREATE TABLE invoices (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        client_id INTEGER,
+        line_items TEXT,
+        subtotal REAL,
+        date TEXT,
+        status TEXT DEFAULT 'Unpaid',
+        FOREIGN KEY (client_id) REFERENCES clients (id)
+    )''',
+    '''CREATE TABLE line_items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        unit_price REAL
+    )''',
+    '''CREATE TABLE clients (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        billing_address TEXT,
+        contact_name TEXT,
+        phone_number TEXT,
+        email TEXT
+    )''',
+]
+
+
+class BaselineMigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "invoices.db")
+        conn = sqlite3.connect(self.path)
+        for statement in BASELINE_SCHEMA:
+            conn.execute(statement)
+        conn.execute("INSERT INTO clients (name, billing_address, contact_name, phone_number, email) "
+                     "VALUES ('Acme Logistics', '1 Main St', 'Ann', '555-0100', 'ann@example.com')")
+        conn.execute("INSERT INTO line_items (name, unit_price) VALUES ('Widget', 12.5), ('Gadget', 3.1)")
+        conn.execute("INSERT INTO invoices (client_id, line_items, subtotal, date, status) VALUES "
+                     "(1, 'Widget: 2.0 @ $12.5 = $25.00\nGadget: 0.0 @ $3.1 = $0.00\nGadget: 3.0 @ $3.1 = $9.30\n', "
+                     "34.3, '2021-06-01', 'unpaid')")
+        conn.commit()
+        conn.close()
+        self.repository = InvoiceRepository(self.path)
+        self.repository.open()
+
+    def tearDown(self):
+        self.repository.close()
+        shutil.rmtree(self.directory)
+
+    def test_migrates_baseline_database(self):
+        repository = self.repository
+        self.assertEqual(repository.conn.execute("PRAGMA user_version").fetchone()[0], 6)
+        self.assertEqual([(item.name, item.unit_price_cents) for item in repository.list_line_items()],
+                         [("Widget", 1250), ("Gadget", 310)])
+        # Lines with no quantity were never printed and are not migrated
+        self.assertEqual(repository.get_invoice_lines(1), [InvoiceLine(1, "Widget", 2.0, 1250, 2500),
+                                                           InvoiceLine(2, "Gadget", 3.0, 310, 930)])
+        self.assertIsNone(repository.conn.execute("SELECT line_items FROM invoices").fetchone()[0])
+        summary = repository.get_invoice_summary(1)
+        tax = tax_cents(3430, DEFAULT_TAX_RATE)
+        self.assertEqual((summary.client_name, summary.subtotal_cents, summary.tax_cents, summary.total_cents),
+                         ("Acme Logistics", 3430, tax, 3430 + tax))
+        self.assertEqual([row.id for row in repository.search_invoices(InvoiceFilter(search="gadg"))], [1])
+        self.assertEqual(repository.verify_summaries(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
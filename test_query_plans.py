@@ -0,0 +1,166 @@
+import itertools
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+from benchmark import generate_database
+from repository import InvoiceRepository, InvoiceFilter, InvoiceSort, INVOICE_SORT_KEYS, archive_path
+
+# EXPLAIN QUERY PLAN checks of the statements behind the invoice list, search, line lookups, bulk
+# actions, archiving, rendering, exports, reports and the analytics snapshot: none of them may walk
+# a whole invoice table without an index.
+
+# A full pass over the invoices or invoice_lines table of either database
+TABLE_SCAN = re.compile(r"^SCAN (\w+\.)?(invoice(_line)?s)$")
+# A subquery evaluated into rows of its own; scanning those rows reads no table
+SUBQUERY = re.compile(r"^(CO-ROUTINE|MATERIALIZE) (\w+)$")
+
+# The invoice-list filters: every status, date range and search combination, hot and with archives
+FILTERS = [InvoiceFilter(status, from_date, to_date, search, include_archived)
+           for status, (from_date, to_date), search, include_archived in itertools.product(
+               ("All", "Paid", "Unpaid"), (("", ""), ("2021-01-01", ""), ("2021-01-01", "2021-12-31")),
+               ("", "acme"), (False, True))]
+
+
+class QueryPlanTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.directory, "plans.db")
+        generate_database(cls.path, clients=200, items=50, invoices=5000)
+        cls.repository = InvoiceRepository(cls.path)
+        cls.repository.__enter__()
+        cls.archive_plans = cls.capture_plans(lambda: cls.repository.archive_invoices(
+            older_than_days=365 * 3, batch_size=500, as_of="2024-01-01"))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.repository.__exit__(None, None, None)
+        shutil.rmtree(cls.directory)
+
+    # Run call() and return (statement, plan lines) for each statement it executed. Statements
+    # are traced with their parameters bound; the ones run by triggers are left out.
+    @classmethod
+    def capture_plans(cls, call):
+        conn = cls.repository.conn
+        statements = []
+        conn.set_trace_callback(statements.append)
+        try:
+            call()
+        finally:
+            conn.set_trace_callback(None)
+        return [(statement, [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + statement)])
+                for statement in statements
+                if statement.lstrip().split(None, 1)[0].upper() in ("SELECT", "INSERT", "UPDATE", "DELETE")]
+
+    # The invoice list sorted by id may read the table in rowid order, stopping after a page
+    def assertIndexed(self, plans, allow_rowid_walk=False):
+        self.assertTrue(plans)
+        for statement, plan in plans:
+            subqueries = {match.group(2) for match in map(SUBQUERY.match, plan) if match}
+            scans = [line for line in plan
+                     if TABLE_SCAN.match(line) and line.split()[1] not in subqueries
+                     and not (allow_rowid_walk and line in ("SCAN invoices", "SCAN main.invoices"))]
+            self.assertEqual(scans, [], f"{' '.join(statement.split())}\n" + "\n".join(plan))
+
+    def test_list_invoices(self):
+        for invoice_filter, column, descending in itertools.product(FILTERS, INVOICE_SORT_KEYS, (False, True)):
+            sort = InvoiceSort(column, descending)
+            with self.subTest(invoice_filter=invoice_filter, sort=sort):
+                first_page = self.repository.list_invoices(invoice_filter, limit=20, sort=sort)
+                if not first_page:
+                    continue
+                after = sort.key(first_page[-1])
+                plans = self.capture_plans(lambda: self.repository.list_invoices(invoice_filter, limit=20, sort=sort))
+                plans += self.capture_plans(lambda: self.repository.list_invoices(invoice_filter, after, 20, sort))
+                self.assertIndexed(plans, allow_rowid_walk=column == "id")
+
+    def test_search_invoices(self):
+        for invoice_filter in FILTERS:
+            if invoice_filter.search:
+                with self.subTest(invoice_filter=invoice_filter):
+                    self.assertIndexed(self.capture_plans(lambda: self.repository.search_invoices(invoice_filter)))
+
+    def test_invoice_lines(self):
+        invoice_id = self.repository.list_invoices(InvoiceFilter(), limit=1)[0].id
+        archived_id = self.repository.conn.execute("SELECT MIN(id) FROM archive.invoices").fetchone()[0]
+        self.assertIndexed(self.capture_plans(lambda: self.repository.get_invoice_lines(invoice_id)))
+        self.assertIndexed(self.capture_plans(lambda: self.repository.get_invoice_lines(archived_id, True)))
+
+    def test_count_client_invoices(self):
+        client_id = self.repository.list_invoices(InvoiceFilter(), limit=1)[0].client_id
+        self.assertIndexed(self.capture_plans(lambda: self.repository.count_client_invoices(client_id)))
+        # A client with no invoices left in the main database is also counted in the archive
+        new_client = self.repository.add_client("Plan Test Client", "", "", "", "")
+        self.assertIndexed(self.capture_plans(lambda: self.repository.count_client_invoices(new_client)))
+
+    def test_bulk_actions(self):
+        invoice_ids = [row.id for row in self.repository.list_invoices(InvoiceFilter("Unpaid"), limit=5)]
+        self.assertIndexed(self.capture_plans(lambda: self.repository.set_invoices_status(invoice_ids, "paid")))
+        self.assertIndexed(self.capture_plans(lambda: self.repository.delete_invoices(invoice_ids)))
+
+    def test_invoice_ids(self):
+        for invoice_filter in FILTERS:
+            with self.subTest(invoice_filter=invoice_filter):
+                self.assertIndexed(self.capture_plans(lambda: self.repository.invoice_ids(invoice_filter)))
+
+    # What rendering and printing a selection reads, hot and with archives
+    def test_iter_invoices(self):
+        invoice_ids = [row.id for row in self.repository.list_invoices(InvoiceFilter(), limit=50)]
+        for invoice_filter in FILTERS:
+            with self.subTest(invoice_filter=invoice_filter):
+                self.assertIndexed(self.capture_plans(
+                    lambda: list(self.repository.iter_invoices(invoice_filter, invoice_ids))))
+        self.assertIndexed(self.capture_plans(
+            lambda: list(self.repository.iter_invoices(InvoiceFilter(from_date="2023-01-01", to_date="2023-01-31")))))
+
+    def test_export_rows(self):
+        for invoice_filter, include_lines in itertools.product(FILTERS, (False, True)):
+            with self.subTest(invoice_filter=invoice_filter, include_lines=include_lines):
+                self.assertIndexed(self.capture_plans(
+                    lambda: self.repository.export_rows(invoice_filter, include_lines)[0].fetchmany(10)))
+
+    # The incremental change export: the log since the watermark, then the changed invoices
+    def test_invoice_changes(self):
+        self.repository.set_watermark("plans", self.repository.last_change_seq())
+        invoice_ids = [row.id for row in self.repository.list_invoices(InvoiceFilter("Unpaid"), limit=5)]
+        self.repository.set_invoices_status(invoice_ids[:3], "paid")
+        for include_lines, include_archived in itertools.product((False, True), (False, True)):
+            with self.subTest(include_lines=include_lines, include_archived=include_archived):
+                plans = self.capture_plans(lambda: self.repository.invoice_changes_since("plans"))
+                plans += self.capture_plans(lambda: list(self.repository.export_rows_for_ids(
+                    invoice_ids, include_lines, include_archived)))
+                self.assertIndexed(plans)
+
+    def test_reports(self):
+        self.assertIndexed(self.capture_plans(lambda: (self.repository.revenue_by_month(),
+                                                       self.repository.revenue_by_client(),
+                                                       self.repository.receivables_aging("2024-01-01"))))
+
+    # Analytics snapshot loads read every row in id order; refreshes only the new and changed ones
+    def test_analytics_rows(self):
+        last_id = self.repository.conn.execute("SELECT MAX(id) FROM invoices").fetchone()[0]
+        last_line = self.repository.conn.execute("SELECT MAX(id) FROM invoice_lines").fetchone()[0]
+        invoice_ids = [row.id for row in self.repository.list_invoices(InvoiceFilter(), limit=5)]
+        for include_archived in (False, True):
+            with self.subTest(include_archived=include_archived):
+                self.assertIndexed(self.capture_plans(lambda: (
+                    list(self.repository.analytics_invoice_rows(include_archived=include_archived)),
+                    list(self.repository.analytics_line_rows(include_archived=include_archived)))))
+                self.assertIndexed(self.capture_plans(lambda: (
+                    list(self.repository.analytics_invoice_rows(last_id, invoice_ids, include_archived)),
+                    list(self.repository.analytics_line_rows(last_line, invoice_ids, include_archived)))))
+
+    def test_archive_batches(self):
+        self.assertTrue(os.path.exists(archive_path(self.path)))
+        self.assertIndexed(self.archive_plans)
+        batch_selects = [plan for statement, plan in self.archive_plans if "main.archive_batch (invoice_id)" in statement]
+        self.assertTrue(batch_selects)
+        for plan in batch_selects:
+            self.assertEqual([line for line in plan if "TEMP B-TREE" in line], [], "\n".join(plan))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from benchmark import generate_database
+from rendering import render_invoice_batch
+from repository import InvoiceRepository, InvoiceFilter
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "invoice.html")
+
+
+class BatchRenderTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, "invoices.db")
+        generate_database(path, clients=5, items=5, invoices=40)
+        self.repository = InvoiceRepository(path)
+        self.repository.open()
+
+    def tearDown(self):
+        self.repository.close()
+        shutil.rmtree(self.directory)
+
+    def test_selected_ids_are_read_in_batches_in_date_order(self):
+        everything = [invoice.id for invoice in self.repository.iter_invoices(InvoiceFilter())]
+        selected = sorted(everything, reverse=True) + [10 ** 9]
+        with mock.patch("repository.ID_BATCH_SIZE", 7):
+            self.assertEqual([invoice.id for invoice in self.repository.iter_invoices(InvoiceFilter(), selected)],
+                             everything)
+            paid = [invoice.id for invoice in self.repository.iter_invoices(InvoiceFilter(status="Paid"), selected)]
+        self.assertEqual(paid, [invoice.id for invoice in self.repository.iter_invoices(InvoiceFilter(status="Paid"))])
+
+    def test_batch_reports_progress(self):
+        progress = []
+        combined_path = os.path.join(self.directory, "out", "invoices.html")
+        count = render_invoice_batch(self.repository, InvoiceFilter(), {}, combined_path=combined_path,
+                                     max_workers=2, template_path=TEMPLATE_PATH, progress=progress.append)
+        self.assertEqual(count, 40)
+        self.assertEqual(progress, list(range(1, 41)))
+        with open(combined_path) as f:
+            self.assertEqual(f.read().count('class="invoice-page"'), 40)
+
+
+if __name__ == "__main__":
+    unittest.main()
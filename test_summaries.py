@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from repository import InvoiceRepository, InvoiceLine
+
+
+class SummaryMaintenanceTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.repository = InvoiceRepository(os.path.join(self.directory, "invoices.db"))
+        self.repository.open()
+        self.acme = self.repository.add_client("Acme Logistics", "1 Main St", "Ann", "555-0100", "ann@example.com")
+        self.globex = self.repository.add_client("Globex Supply", "2 High St", "Bob", "555-0101", "bob@example.com")
+        self.widget = self.repository.add_line_item("Widget", 1250)
+        self.repository.create_invoice(self.acme, [InvoiceLine(self.widget, "Widget", 2.0, 1250, 2500)],
+                                       date="2019-03-01", status="paid")
+        self.invoice = self.repository.create_invoice(self.globex, [InvoiceLine(self.widget, "Widget", 1.0, 1250, 1250)],
+                                                      date="2023-11-15")
+
+    def tearDown(self):
+        self.repository.close()
+        shutil.rmtree(self.directory)
+
+    def test_summaries_follow_every_change(self):
+        repository = self.repository
+        self.assertEqual(repository.verify_summaries(), [])
+
+        repository.update_invoice(self.invoice, self.acme, [InvoiceLine(self.widget, "Widget", 4.0, 1250, 5000)])
+        self.assertEqual(repository.verify_summaries(), [])
+
+        repository.set_invoice_status(self.invoice, "paid")
+        self.assertEqual(repository.verify_summaries(), [])
+
+        third = repository.create_invoice(self.globex, [InvoiceLine(None, "Consulting", 1.0, 9900, 9900)],
+                                          date="2023-12-01")
+        repository.delete_invoice(third)
+        self.assertEqual(repository.verify_summaries(), [])
+
+        months_before = repository.revenue_by_month()
+        self.assertEqual(repository.archive_invoices(older_than_days=365, as_of="2024-01-01"), 1)
+        self.assertEqual(repository.verify_summaries(), [])
+        self.assertEqual(repository.revenue_by_month(), months_before)
+
+
+if __name__ == "__main__":
+    unittest.main()